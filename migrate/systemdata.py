@@ -8,6 +8,11 @@ from sqlalchemy.exc import ProgrammingError
 from nccrd.db.models import Adaptaion,Mitigation,Submission
 
 from nccrd.db import Base, engine
+from nccrd.db.facets import rebuild_facets
+from nccrd.db.indexes import ensure_indexes
+from nccrd.db.rollups import rebuild_funding_rollups
+from nccrd.db.search import refresh_search_vectors
+from nccrd.db.versions import REGIONS, SUBMISSIONS, bump_data_version
 
 logger = logging.getLogger(__name__)
 
@@ -42,9 +47,14 @@ def init_database_schema():
             Base.metadata.create_all(engine)
             # command.stamp(alembic_cfg, 'head')
             logger.info('Created the database schema.')
+
+        with engine.begin() as conn:
+            upgrade_database_schema(conn)
         
         create_static_system_data(Base.metadata, engine.connect())
         # This will trigger the creation of static system data
+
+        locate_existing_submissions()
         
     except Exception as e:
         logger.error(f'Error initializing database schema: {e}')
@@ -52,6 +62,83 @@ def init_database_schema():
     finally:
         os.chdir(cwd)
 
+# Idempotent DDL that brings the tables of an existing database up to date
+# with the ORM models, since create_all does not alter existing tables
+SCHEMA_UPGRADES = [
+    # reverse geocoded regions of a submission's geo_location
+    'ALTER TABLE nccrd.submission ADD COLUMN IF NOT EXISTS province_id INTEGER',
+    'ALTER TABLE nccrd.submission ADD COLUMN IF NOT EXISTS district_id INTEGER',
+    'ALTER TABLE nccrd.submission ADD COLUMN IF NOT EXISTS local_district_id INTEGER',
+    # geo_location bounding box, for spatial search
+    'ALTER TABLE nccrd.submission ADD COLUMN IF NOT EXISTS geo_xmin DOUBLE PRECISION',
+    'ALTER TABLE nccrd.submission ADD COLUMN IF NOT EXISTS geo_ymin DOUBLE PRECISION',
+    'ALTER TABLE nccrd.submission ADD COLUMN IF NOT EXISTS geo_xmax DOUBLE PRECISION',
+    'ALTER TABLE nccrd.submission ADD COLUMN IF NOT EXISTS geo_ymax DOUBLE PRECISION',
+    """
+    UPDATE nccrd.submission SET
+        geo_xmin = (geo_location->'coordinates'->>0)::float,
+        geo_xmax = (geo_location->'coordinates'->>0)::float,
+        geo_ymin = (geo_location->'coordinates'->>1)::float,
+        geo_ymax = (geo_location->'coordinates'->>1)::float
+    WHERE geo_xmin IS NULL AND geo_location->>'type' = 'Point'
+    """,
+    # full-text search document
+    'ALTER TABLE nccrd.submission ADD COLUMN IF NOT EXISTS search_vector TSVECTOR',
+    # row version, for optimistic concurrency control
+    'ALTER TABLE nccrd.submission ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1',
+    # normalized intervention_measurement; values are InterventionType member names
+    'ALTER TABLE nccrd.submission ADD COLUMN IF NOT EXISTS intervention_type VARCHAR(16)',
+    """
+    UPDATE nccrd.submission SET intervention_type = CASE lower(trim(intervention_measurement))
+        WHEN 'mitigation' THEN 'MITIGATION'
+        WHEN 'adaptation' THEN 'ADAPTATION'
+        WHEN 'cross cutting' THEN 'CROSS_CUTTING'
+    END
+    WHERE intervention_type IS NULL AND intervention_measurement IS NOT NULL
+    """,
+] + [
+    # summary tables are keyed on intervention_type rather than intervention_measurement;
+    # their contents are rebuilt by upgrade_database_schema
+    f"""
+    DO $$ BEGIN
+        IF EXISTS (
+            SELECT FROM information_schema.columns WHERE table_schema = 'nccrd'
+            AND table_name = '{table}' AND column_name = 'intervention_measurement'
+        ) THEN
+            ALTER TABLE nccrd.{table} RENAME COLUMN intervention_measurement TO intervention_type;
+        END IF;
+    END $$
+    """
+    for table in ('submission_facets', 'facet_count', 'submission_funding', 'funding_rollup')
+]
+
+
+def upgrade_database_schema(connection):
+    """Apply the schema upgrades to an existing database."""
+    # create any tables added since the schema was created
+    Base.metadata.create_all(connection)
+    for ddl in SCHEMA_UPGRADES:
+        connection.execute(text(ddl))
+    refresh_search_vectors(connection)
+    rebuild_facets(connection)
+    rebuild_funding_rollups(connection)
+    # indexes are created after the backfills above
+    ensure_indexes(connection)
+    # have running API processes discard anything cached from before the backfills
+    bump_data_version(connection, SUBMISSIONS)
+    logger.info('Upgraded the database schema.')
+
+
+def locate_existing_submissions():
+    """Reverse geocode the submissions that have no region ids, e.g. those
+    created before the province, district and local district ids were
+    added; this needs the region data to be loaded."""
+    from nccrd.api.lib.geocoding import locate_unlocated_submissions
+
+    count = locate_unlocated_submissions()
+    logger.info(f'Located {count} submissions without region ids.')
+
+
 #Create the static system data
 # @event.listens_for(Base.metadata, 'after_create')
 def create_static_system_data(target, connection, **kw):
@@ -109,6 +196,14 @@ def create_static_system_data(target, connection, **kw):
     gdf_country = gpd.read_file('./region_data/south_africa_South_Africa_Country_Boundary.geojson')
     gdf_country["geometry"] = gdf_country["geometry"].apply(lambda geom: geom.wkt)
     gdf_country.to_sql('country', con=connection, schema='nccrd', if_exists='replace', index=False)
+
+    # to_sql(if_exists='replace') drops the indexes on the region tables
+    ensure_indexes(connection, [Province.__table__, District.__table__, LocalDistrict.__table__, Country.__table__])
+
+    # running API processes reload their region caches when they see
+    # the new version (see nccrd.db.region_cache)
+    bump_data_version(connection, REGIONS)
+    connection.commit()
         #
     # Create default submissions
     # Submission.create_default_submissions()
@@ -1,10 +1,22 @@
-from fastapi import FastAPI, Request, Response
+import asyncio
+import logging
+
+from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 
-from nccrd.api.routers import submission,region
-from nccrd.db import Session
+from nccrd.api.lib.geocoding import build_spatial_indexes
+from nccrd.api.lib.geometry import build_geojson_levels
+from nccrd.api.routers import submission,region,internal
+from nccrd.db.indexes import check_indexes
+from nccrd.db.region_cache import region_cache
 from nccrd.version import VERSION
 
+logger = logging.getLogger(__name__)
+
+# how often each API process checks whether the region data has been reloaded
+REGION_POLL_SECONDS = 30
+
 app = FastAPI(
     title="NCCRD API",
     version=VERSION,
@@ -14,6 +26,7 @@ app = FastAPI(
 
 app.include_router(submission.router, prefix='/submission', tags=['Submission'])
 app.include_router(region.router, prefix='/region', tags=['Region'])
+app.include_router(internal.router, prefix='/internal', tags=['Internal'])
 
 # app.include_router(survey.router, prefix='/survey', tags=['Survey'])
 # app.include_router(survey_download.router, prefix='/survey/download', tags=['Survey', 'Download'])
@@ -29,15 +42,46 @@ app.add_middleware(
 )
 
 
-@app.middleware('http')
-async def db_middleware(request: Request, call_next):
+# build the region geometry and spatial indexes used by the API whenever
+# the region cache is loaded, so that requests don't have to
+region_cache.on_load(build_geojson_levels)
+region_cache.on_load(build_spatial_indexes)
+
+
+@app.on_event('startup')
+def load_region_cache():
+    # warm the region cache; if the region tables are not yet
+    # available, it is loaded on first use instead
+    try:
+        region_cache.load()
+    except Exception as e:
+        logger.warning(f'Could not load the region cache at startup: {e}')
+
+
+@app.on_event('startup')
+def report_missing_indexes():
+    # missing indexes are created by migrate/systemdata.py
     try:
-        response: Response = await call_next(request)
-        if 200 <= response.status_code < 400:
-            Session.commit()
-        else:
-            Session.rollback()
-    finally:
-        Session.remove()
-
-    return response
+        check_indexes()
+    except Exception as e:
+        logger.warning(f'Could not check the database indexes at startup: {e}')
+
+
+async def _poll_region_data():
+    while True:
+        await asyncio.sleep(REGION_POLL_SECONDS)
+        try:
+            await run_in_threadpool(region_cache.reload_if_changed)
+        except Exception as e:
+            logger.warning(f'Could not check the region data version: {e}')
+
+
+@app.on_event('startup')
+async def watch_region_data():
+    # keep a reference to the task, so that it is not garbage collected
+    app.state.region_poller = asyncio.create_task(_poll_region_data())
+
+
+@app.on_event('shutdown')
+async def stop_watching_region_data():
+    app.state.region_poller.cancel()
@@ -0,0 +1,25 @@
+from typing import Optional
+
+from fastapi import HTTPException, Request
+from starlette.status import HTTP_304_NOT_MODIFIED
+
+
+def version_etag(version: int) -> str:
+    """Return the entity tag of a record with a version column."""
+    return f'"{version}"'
+
+
+def etag_matches(header: Optional[str], etag: str) -> bool:
+    """Return True if an If-None-Match / If-Match header value lists
+    `etag` or is '*'. Weak tags are compared by their opaque value."""
+    if not header:
+        return False
+    tags = [tag.strip() for tag in header.split(',')]
+    return '*' in tags or etag.removeprefix('W/') in (tag.removeprefix('W/') for tag in tags)
+
+
+def check_not_modified(request: Request, etag: str) -> None:
+    """Raise a 304 Not Modified response if the request's If-None-Match
+    header matches `etag`."""
+    if etag_matches(request.headers.get('if-none-match'), etag):
+        raise HTTPException(HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
@@ -0,0 +1,223 @@
+import csv
+import io
+import json
+import threading
+from datetime import date, datetime
+from enum import Enum
+from typing import Dict, Iterator, List, Optional, Tuple
+from uuid import UUID
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sqlalchemy import JSON, Boolean, DateTime, Float, Integer, select
+from sqlalchemy.engine import RowMapping
+
+from nccrd.db import engine
+from nccrd.db.models import Adaptaion, Mitigation, Submission
+from nccrd.db.versions import SUBMISSIONS, get_data_version
+
+EXPORT_BATCH_SIZE = 1000
+
+# Export columns with few distinct, often repeated values, which
+# are dictionary-encoded in the columnar (Parquet / Arrow) exports
+CATEGORICAL_COLUMNS = {
+    'intervention_measurement',
+    'intervention_type',
+    'implementation_status',
+    'funding_type',
+    'estimated_budget_cost',
+    'submission_status',
+    'platfrom',
+    'mitigation_sector',
+    'mitigation_subsector',
+    'mitigation_secondary',
+    'mitigation_project_type',
+    'mitigation_project_subtype',
+    'mitigation_carbon_credit',
+    'mitigation_cdm_voluntary',
+    'mitigation_cdm_executive_board_status',
+    'adaptation_sector',
+    'adaptation_hazard',
+}
+
+
+class ExportFormat(str, Enum):
+    NDJSON = 'ndjson'
+    CSV = 'csv'
+    PARQUET = 'parquet'
+    ARROW = 'arrow'
+
+
+def _export_columns() -> list:
+    # submission columns, followed by the mitigation and adaptation
+    # columns prefixed with the name of their table
+    columns = [
+        col.label(col.name) for col in Submission.__table__.columns
+        if col.name not in ('_id', 'search_vector')
+    ]
+    for model, prefix in ((Mitigation, 'mitigation_'), (Adaptaion, 'adaptation_')):
+        columns += [
+            col.label(prefix + col.name) for col in model.__table__.columns
+            if col.name not in ('id', 'submission_id')
+        ]
+    return columns
+
+
+def export_column_names() -> List[str]:
+    return [col.name for col in _export_columns()]
+
+
+def export_batches(include_deleted: bool = False) -> Iterator[List[RowMapping]]:
+    """Yield all submissions, flattened together with their mitigation and
+    adaptation details, in batches of EXPORT_BATCH_SIZE rows.
+
+    Rows are read through a server-side cursor, on a connection of the
+    generator's own, so memory use does not depend on the size of the table.
+    """
+    stmt = (
+        select(*_export_columns()).
+        select_from(
+            Submission.__table__.
+            outerjoin(Mitigation.__table__, Mitigation.submission_id == Submission.id).
+            outerjoin(Adaptaion.__table__, Adaptaion.submission_id == Submission.id)
+        ).
+        order_by(Submission._id)
+    )
+    if not include_deleted:
+        stmt = stmt.where(Submission.deleted.isnot(True))
+
+    with engine.connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=EXPORT_BATCH_SIZE).execute(stmt)
+        for partition in result.mappings().partitions():
+            yield partition
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, UUID):
+        return str(value)
+    raise TypeError(f'Cannot serialize {type(value).__name__}')
+
+
+def _csv_value(value):
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def stream_ndjson(include_deleted: bool = False) -> Iterator[bytes]:
+    for batch in export_batches(include_deleted):
+        yield ''.join(
+            json.dumps(dict(row), default=_json_default) + '\n'
+            for row in batch
+        ).encode()
+
+
+def stream_csv(include_deleted: bool = False) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(export_column_names())
+    for batch in export_batches(include_deleted):
+        writer.writerows([_csv_value(value) for value in row.values()] for row in batch)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue().encode()
+
+
+def _arrow_type(column) -> pa.DataType:
+    if column.name in CATEGORICAL_COLUMNS:
+        return pa.dictionary(pa.int32(), pa.string())
+    if isinstance(column.type, Boolean):
+        return pa.bool_()
+    if isinstance(column.type, Integer):
+        return pa.int64()
+    if isinstance(column.type, Float):
+        return pa.float64()
+    if isinstance(column.type, DateTime):
+        return pa.timestamp('us')
+    return pa.string()
+
+
+def _arrow_schema() -> pa.Schema:
+    return pa.schema([(col.name, _arrow_type(col)) for col in _export_columns()])
+
+
+def _arrow_string(value) -> Optional[str]:
+    # as written by the NDJSON and CSV exports
+    if value is None:
+        return None
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    if isinstance(value, Enum):
+        return value.value
+    return str(value)
+
+
+def _arrow_batch(rows: List[RowMapping], schema: pa.Schema) -> pa.RecordBatch:
+    arrays = []
+    for field in schema:
+        values = [row[field.name] for row in rows]
+        if pa.types.is_dictionary(field.type):
+            arrays.append(pa.array([_arrow_string(v) for v in values], pa.string()).dictionary_encode())
+        elif pa.types.is_string(field.type):
+            arrays.append(pa.array([_arrow_string(v) for v in values], pa.string()))
+        else:
+            arrays.append(pa.array(values, field.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def _write_snapshot(format: ExportFormat) -> bytes:
+    schema = _arrow_schema()
+    sink = io.BytesIO()
+    if format == ExportFormat.PARQUET:
+        writer = pq.ParquetWriter(sink, schema, compression='zstd')
+    else:
+        writer = pa.ipc.new_stream(sink, schema)
+    with writer:
+        for batch in export_batches():
+            writer.write_batch(_arrow_batch(batch, schema))
+    return sink.getvalue()
+
+
+class ColumnarSnapshots:
+    """Cache of the latest Parquet and Arrow IPC exports of the (non-deleted)
+    submissions.
+
+    Each snapshot is labelled with the `submissions` data version (see
+    nccrd.db.versions) read before it was built, and is rebuilt once a
+    change to any submission has been committed, by any process. Only one
+    snapshot of each format is built at a time; concurrent requests for a
+    stale snapshot wait for that build rather than starting their own.
+    """
+
+    def __init__(self):
+        self._build_locks = {format: threading.Lock() for format in (ExportFormat.PARQUET, ExportFormat.ARROW)}
+        self._snapshots: Dict[ExportFormat, Tuple[int, bytes]] = {}
+
+    def get(self, format: ExportFormat) -> bytes:
+        with engine.connect() as conn:
+            version = get_data_version(conn, SUBMISSIONS)
+
+        if (snapshot := self._current(format, version)) is not None:
+            return snapshot
+
+        with self._build_locks[format]:
+            # the snapshot may have been rebuilt while we were waiting
+            if (snapshot := self._current(format, version)) is not None:
+                return snapshot
+            snapshot = _write_snapshot(format)
+            self._snapshots[format] = version, snapshot
+            return snapshot
+
+    def _current(self, format: ExportFormat, version: int) -> Optional[bytes]:
+        # a snapshot labelled with a later version than `version` is at
+        # least as recent as the data at `version`
+        if (cached := self._snapshots.get(format)) and cached[0] >= version:
+            return cached[1]
+
+
+columnar_snapshots = ColumnarSnapshots()
@@ -0,0 +1,174 @@
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+import shapely
+from shapely import STRtree
+from shapely.errors import GEOSException
+from shapely.geometry import shape
+from shapely.geometry.base import BaseGeometry
+from sqlalchemy import select
+
+from nccrd.api.lib.geometry import RegionLayer, layer_shapes
+from nccrd.db import SessionFactory
+from nccrd.db.models import Submission
+from nccrd.db.region_cache import RegionData, region_cache
+
+LOCATE_BATCH_SIZE = 500
+
+
+@dataclass
+class Location:
+    """The regions containing a point. Each region is given as a dict
+    of the form {"id": ..., "code": ..., "name": ...}."""
+    province: Optional[dict] = None
+    district: Optional[dict] = None
+    local_district: Optional[dict] = None
+
+
+class _SpatialIndex:
+    """An STRtree over the (prepared) polygons of a region layer, for
+    point-in-polygon lookups."""
+
+    def __init__(self, layer: RegionLayer, data: RegionData):
+        shapes = layer_shapes(layer, data)
+        self.properties = [props for props, _ in shapes]
+        self.geometries = np.array([geometry for _, geometry in shapes], dtype=object)
+        shapely.prepare(self.geometries)
+        self.tree = STRtree(self.geometries)
+
+    def find(self, lon: float, lat: float) -> Optional[dict]:
+        # bounding box pre-filter, followed by an exact test against the candidates
+        candidates = self.tree.query(shapely.points(lon, lat))
+        if len(candidates):
+            hits = candidates[shapely.contains_xy(self.geometries[candidates], lon, lat)]
+            if len(hits):
+                return self.properties[hits[0]]
+
+
+_INDEXED_LAYERS = (RegionLayer.LOCAL_DISTRICT, RegionLayer.DISTRICT)
+
+
+def _spatial_index(layer: RegionLayer, data: RegionData) -> _SpatialIndex:
+    return data.derive(f'index:{layer.value}', lambda data: _SpatialIndex(layer, data))
+
+
+def build_spatial_indexes(data: RegionData) -> None:
+    """Build the spatial indexes used by :func:`locate`, for a newly loaded
+    region snapshot. The API registers this with :meth:`RegionCache.on_load`."""
+    for layer in _INDEXED_LAYERS:
+        _spatial_index(layer, data)
+
+
+def _province_lookup(data: RegionData) -> dict:
+    # district and local district records may refer to
+    # a province by either its name or its code
+    lookup = {}
+    for p in data.provinces:
+        item = {"id": p.FID, "code": p.PR_MDB_C, "name": p.PR_NAME}
+        lookup[p.PR_MDB_C] = item
+        lookup[p.PR_NAME] = item
+    return lookup
+
+
+def _named_item(properties: Optional[dict]) -> Optional[dict]:
+    if properties:
+        return {"id": properties["id"], "code": properties["code"], "name": properties["name"]}
+
+
+def locate(lon: float, lat: float) -> Location:
+    """Reverse geocode a point to the province, district and local
+    district (municipality) containing it.
+
+    Lookups are served from in-memory spatial indexes of the district and
+    local district layers, built once per load of the region cache; if
+    they have not been built, this builds them, so it should not be called
+    on the event loop.
+    """
+    data = region_cache.data
+    local_district = _spatial_index(RegionLayer.LOCAL_DISTRICT, data).find(lon, lat)
+    district = _spatial_index(RegionLayer.DISTRICT, data).find(lon, lat)
+
+    province = None
+    if region := local_district or district:
+        province = data.derive('provinces', _province_lookup).get(region["province"])
+
+    return Location(
+        province=province,
+        district=_named_item(district),
+        local_district=_named_item(local_district),
+    )
+
+
+def geo_location_geometry(geo_location: Optional[dict]) -> Optional[BaseGeometry]:
+    """Return the shapely geometry for a GeoJSON geometry, or None if
+    it is missing, invalid or empty."""
+    if not geo_location:
+        return None
+    try:
+        geometry = shape(geo_location)
+    except (AttributeError, KeyError, IndexError, TypeError, ValueError, GEOSException):
+        return None
+    if not geometry.is_empty:
+        return geometry
+
+
+def locate_geo_location(geo_location: Optional[dict]) -> dict:
+    """Return the values of the Submission location columns - the
+    geo_location bounding box and the province, district and local
+    district ids - for a GeoJSON `geo_location`."""
+    location = Location()
+    bounds = (None, None, None, None)
+    if geometry := geo_location_geometry(geo_location):
+        bounds = geometry.bounds
+        point = geometry if geometry.geom_type == 'Point' else geometry.representative_point()
+        location = locate(point.x, point.y)
+
+    return dict(
+        zip(('geo_xmin', 'geo_ymin', 'geo_xmax', 'geo_ymax'), bounds),
+        province_id=location.province["id"] if location.province else None,
+        district_id=location.district["id"] if location.district else None,
+        local_district_id=location.local_district["id"] if location.local_district else None,
+    )
+
+
+def locate_submission(submission: Submission) -> None:
+    """Set the geo_location bounding box and the province, district and
+    local district ids of a submission from its `geo_location`."""
+    for key, value in locate_geo_location(submission.geo_location).items():
+        setattr(submission, key, value)
+
+
+def locate_unlocated_submissions(batch_size: int = LOCATE_BATCH_SIZE) -> int:
+    """Set the province, district and local district ids of the submissions
+    that have a `geo_location` but none of these ids, e.g. those created
+    before the ids were added. Each batch is committed in its own
+    transaction, so the derived facet counts are updated too.
+
+    :return: the number of submissions that were processed
+    """
+    region_cache.load()
+    processed = 0
+    last_id = None
+    with SessionFactory() as db:
+        while True:
+            query = select(Submission).where(
+                Submission.geo_location.isnot(None),
+                Submission.province_id.is_(None),
+                Submission.district_id.is_(None),
+                Submission.local_district_id.is_(None),
+            ).order_by(Submission._id).limit(batch_size)
+            # submissions located outside of all regions remain
+            # unlocated, so continue after the previous batch
+            if last_id is not None:
+                query = query.where(Submission._id > last_id)
+
+            submissions = db.scalars(query).all()
+            if not submissions:
+                return processed
+
+            for submission in submissions:
+                locate_submission(submission)
+            last_id = submissions[-1]._id
+            db.commit()
+            processed += len(submissions)
@@ -0,0 +1,119 @@
+import json
+from bisect import bisect_right
+from enum import Enum
+from typing import List, Tuple
+
+import shapely
+from shapely import wkt
+from shapely.geometry.base import BaseGeometry
+
+from nccrd.db.models import Country, District, LocalDistrict
+from nccrd.db.region_cache import RegionData, region_cache
+
+
+class RegionLayer(str, Enum):
+    DISTRICT = 'district'
+    LOCAL_DISTRICT = 'local_district'
+    COUNTRY = 'country'
+
+
+# Simplification tolerances (in degrees) at which GeoJSON is served;
+# 0 is the full-precision geometry
+SIMPLIFY_TOLERANCES = (0.0, 0.0005, 0.002, 0.01, 0.05)
+
+
+def _district_properties(d: District) -> dict:
+    return {"id": d.FID, "code": d.DISTRICT, "name": d.DISTRICT_N, "province": d.PROVINCE}
+
+
+def _local_district_properties(ld: LocalDistrict) -> dict:
+    return {"id": ld.FID, "code": ld.CAT_B, "name": ld.MUNICNAME, "district": ld.DISTRICT, "province": ld.PROVINCE}
+
+
+def _country_properties(c: Country) -> dict:
+    return {"id": c.gid, "code": c.shapeiso, "name": c.shape0}
+
+
+_layer_sources = {
+    RegionLayer.DISTRICT: ('districts', _district_properties),
+    RegionLayer.LOCAL_DISTRICT: ('local_districts', _local_district_properties),
+    RegionLayer.COUNTRY: ('countries', _country_properties),
+}
+
+
+def layer_shapes(layer: RegionLayer, data: RegionData = None) -> List[Tuple[dict, BaseGeometry]]:
+    """Return (properties, geometry) pairs for every feature in a region
+    layer, parsing the stored WKT only once per load of the region cache.
+
+    :param layer: the region layer
+    :param data: the region snapshot to use; defaults to the current one
+    """
+
+    def build(data: RegionData):
+        attr, properties = _layer_sources[layer]
+        return [
+            (properties(row), wkt.loads(row.geometry))
+            for row in getattr(data, attr)
+            if row.geometry
+        ]
+
+    return (data or region_cache.data).derive(f'shapes:{layer.value}', build)
+
+
+def tolerance_for_zoom(zoom: int) -> float:
+    """Return the simplification tolerance appropriate to a web map zoom
+    level, i.e. the size in degrees of one 256px tile pixel."""
+    return 360 / (256 * 2 ** zoom)
+
+
+def select_tolerance(tolerance: float) -> float:
+    """Return the largest served tolerance not exceeding `tolerance`."""
+    return SIMPLIFY_TOLERANCES[bisect_right(SIMPLIFY_TOLERANCES, tolerance) - 1]
+
+
+def simplify(geometry: BaseGeometry, tolerance: float) -> BaseGeometry:
+    """Simplify a geometry and snap its coordinates to a grid proportional
+    to `tolerance`, which drops the meaningless trailing digits."""
+    if not tolerance:
+        return geometry
+    geometry = geometry.simplify(tolerance, preserve_topology=True)
+    return shapely.set_precision(geometry, tolerance / 4)
+
+
+def _geojson_builder(layer: RegionLayer, level: float):
+    def build(data: RegionData) -> bytes:
+        return json.dumps({
+            "type": "FeatureCollection",
+            "features": [
+                {
+                    "type": "Feature",
+                    "id": properties["id"],
+                    "properties": properties,
+                    "geometry": json.loads(shapely.to_geojson(simplify(geometry, level))),
+                }
+                for properties, geometry in layer_shapes(layer, data)
+            ],
+        }, separators=(',', ':')).encode()
+
+    return build
+
+
+def build_geojson_levels(data: RegionData) -> None:
+    """Generate the GeoJSON of every region layer at every served
+    tolerance, for a newly loaded region snapshot. The API registers this
+    with :meth:`RegionCache.on_load`."""
+    for layer in RegionLayer:
+        for level in SIMPLIFY_TOLERANCES:
+            data.derive(f'geojson:{layer.value}:{level}', _geojson_builder(layer, level))
+
+
+def simplified_geojson(layer: RegionLayer, tolerance: float) -> bytes:
+    """Return a serialized GeoJSON FeatureCollection for a region layer,
+    simplified to the nearest served tolerance not exceeding `tolerance`.
+
+    Each tolerance level of a layer is generated once per load of the
+    region cache, by :func:`build_geojson_levels`, before the new region
+    data is put in use; it is generated here only if that failed.
+    """
+    level = select_tolerance(tolerance)
+    return region_cache.derive(f'geojson:{layer.value}:{level}', _geojson_builder(layer, level))
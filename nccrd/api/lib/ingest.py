@@ -0,0 +1,73 @@
+import uuid
+from datetime import datetime
+from typing import Iterable, List, Optional
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from nccrd.api.lib.geocoding import locate_geo_location
+from nccrd.api.models import SubmissionCreate
+from nccrd.db.changes import mark_submissions_changed
+from nccrd.db.models import Adaptaion, InterventionType, Mitigation, Submission
+
+BULK_BATCH_SIZE = 500
+# the largest JSON array request body, and the longest NDJSON line, that is
+# read into memory; NDJSON bodies are streamed, and may be of any size
+BULK_MAX_BYTES = 20 * 1024 * 1024
+
+
+def intervention_error(submission: SubmissionCreate) -> Optional[str]:
+    """Return an error message if the mitigation / adaptation details
+    required by the submission's intervention type are missing."""
+    intervention_type = InterventionType.parse(submission.intervention_measurement)
+    if intervention_type and intervention_type.has_mitigation and not submission.mitigation_data:
+        return "Mitigation data must be provided for 'Mitigation' or 'Cross Cutting' interventions."
+    if intervention_type and intervention_type.has_adaptation and not submission.adaptation_data:
+        return "Adaptation data must be provided for 'Adaptation' or 'Cross Cutting' interventions."
+
+
+def insert_submissions(db: Session, submissions: Iterable[SubmissionCreate]) -> List[uuid.UUID]:
+    """Insert submissions, with their mitigation and adaptation records,
+    using one multi-row insert per table. Submission UUIDs are generated
+    here rather than by the database, so that child rows can refer to
+    them without a round trip.
+
+    The caller is responsible for validating the submissions (see
+    :func:`intervention_error`) and for committing the transaction.
+
+    :return: the UUIDs of the new submissions, in order
+    """
+    now = datetime.utcnow()
+    submission_rows = []
+    mitigation_rows = []
+    adaptation_rows = []
+
+    for submission in submissions:
+        submission_id = uuid.uuid4()
+        intervention_type = InterventionType.parse(submission.intervention_measurement)
+
+        submission_rows.append(dict(
+            submission.dict(exclude={'mitigation_data', 'adaptation_data'}),
+            **locate_geo_location(submission.geo_location),
+            id=submission_id,
+            intervention_type=intervention_type,
+            submission_status='Pending',
+            issubmitted=True,
+            createdby=1,
+            createdate=now,
+        ))
+        if intervention_type and intervention_type.has_mitigation and submission.mitigation_data:
+            mitigation_rows.append(dict(submission.mitigation_data.dict(), submission_id=submission_id))
+        if intervention_type and intervention_type.has_adaptation and submission.adaptation_data:
+            adaptation_rows.append(dict(submission.adaptation_data.dict(), submission_id=submission_id))
+
+    if submission_rows:
+        db.execute(insert(Submission), submission_rows)
+    if mitigation_rows:
+        db.execute(insert(Mitigation), mitigation_rows)
+    if adaptation_rows:
+        db.execute(insert(Adaptaion), adaptation_rows)
+
+    submission_ids = [row['id'] for row in submission_rows]
+    mark_submissions_changed(db, submission_ids)
+    return submission_ids
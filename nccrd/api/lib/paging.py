@@ -1,25 +1,86 @@
+import base64
+import json
+from datetime import date, datetime
+from enum import Enum
 from math import ceil
-from typing import Callable, Generic, List, TypeVar
+from typing import Any, Callable, Generic, List, Optional, Sequence, TypeVar
+from uuid import UUID
 
 from fastapi import HTTPException, Query
 from pydantic import BaseModel
 from pydantic.generics import GenericModel
-from sqlalchemy import func, select, text
+from sqlalchemy import func, select, text, tuple_
 from sqlalchemy.engine import Row
 from sqlalchemy.exc import CompileError
-from sqlalchemy.sql import Select
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import ClauseElement, ColumnElement, Executable, Select
 from starlette.status import HTTP_422_UNPROCESSABLE_ENTITY
 
-from nccrd.db import Base, Session
+from nccrd.db import Base
 
 ModelT = TypeVar('ModelT', bound=BaseModel)
 
 
 class Page(GenericModel, Generic[ModelT]):
     items: List[ModelT]
-    total: int
-    page: int
-    pages: int
+    total: Optional[int]
+    estimated: bool = False
+    has_more: Optional[bool]
+    page: Optional[int]
+    pages: Optional[int]
+    next: Optional[str] = None
+
+
+def _encode_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {'dt': value.isoformat()}
+    if isinstance(value, date):
+        return {'d': value.isoformat()}
+    if isinstance(value, UUID):
+        return {'uuid': str(value)}
+    return value
+
+
+def _decode_value(value: Any) -> Any:
+    if isinstance(value, dict):
+        (kind, v), = value.items()
+        return {'dt': datetime.fromisoformat, 'd': date.fromisoformat, 'uuid': UUID}[kind](v)
+    return value
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """Encode the keyset values of the last row of a page as an opaque cursor."""
+    return base64.urlsafe_b64encode(
+        json.dumps([_encode_value(v) for v in values], separators=(',', ':')).encode()
+    ).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> List[Any]:
+    """Decode a cursor produced by :func:`encode_cursor`."""
+    try:
+        return [_decode_value(v) for v in json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))]
+    except (ValueError, TypeError, KeyError):
+        raise HTTPException(HTTP_422_UNPROCESSABLE_ENTITY, 'Invalid cursor')
+
+
+class CountMode(str, Enum):
+    EXACT = 'exact'
+    ESTIMATE = 'estimate'
+    NONE = 'none'
+    WINDOW = 'window'
+
+
+class _Explain(Executable, ClauseElement):
+    inherit_cache = False
+
+    def __init__(self, statement: Select):
+        self.statement = statement
+
+
+@compiles(_Explain, 'postgresql')
+def _compile_explain(element, compiler, **kw):
+    return 'EXPLAIN (FORMAT JSON) ' + compiler.process(element.statement, **kw)
 
 
 class Paginator:
@@ -28,55 +89,124 @@ class Paginator:
             page: int = Query(1, ge=1, title='Page number'),
             size: int = Query(50, ge=0, title='Page size; 0=unlimited'),
             sort: str = Query('id', title='Sort column'),
+            cursor: str = Query(None, title='Page cursor; the `next` value of the previous page'),
+            count: CountMode = Query(CountMode.EXACT, title='Total count strategy'),
     ):
         self.page = page
         self.size = size
         self.sort = sort
+        self.cursor = cursor
+        self.count = count
 
     def paginate(
             self,
             query: Select,
             item_factory: Callable[[Row], ModelT],
             *,
+            db: Session,
             sort: str = None,
             sort_model: Base = None,
+            keyset: Sequence[ColumnElement] = None,
     ) -> Page[ModelT]:
         """Return a page of API models of type ModelT.
 
+        The total size of the result set is determined according to the
+        'count' request param:
+
+        - exact: by a separate ``select count(*)`` over the query
+        - estimate: from the planner's row estimate for the query
+        - none: not at all; ``has_more`` is determined by fetching one more
+          row than the page size
+        - window: by a ``count(*) over ()`` window function in the page
+          query itself; with keyset pagination, the count is only
+          reported for the first page (the window covers only the rows
+          following the cursor)
+
         :param query: the select query for the total (unpaged) result set
         :param item_factory: a callable that takes a row from the result set
             and produces an object of type ModelT
+        :param db: the session in which to execute the query
         :param sort: a custom sort column/clause; overrides the 'sort' request
             param and the API default
         :param sort_model: the ORM class associated with a given sort column,
             in case the query selects from multiple tables
+        :param keyset: columns that uniquely and stably order the result set;
+            if given, the result set is paged by cursor (keyset pagination)
+            rather than by page number, and the 'sort' and 'page' request
+            params are ignored
         """
-        total = Session.execute(
-            select(func.count()).
-            select_from(query.subquery())
-        ).scalar_one()
+        total = None
+        if self.count == CountMode.EXACT:
+            total = db.execute(
+                select(func.count()).
+                select_from(query.subquery())
+            ).scalar_one()
+        elif self.count == CountMode.ESTIMATE:
+            total = self._estimate_count(query, db)
+
+        page_query = query
+        if self.count == CountMode.WINDOW:
+            page_query = page_query.add_columns(func.count().over().label('_total'))
+
+        keys = []
+        if keyset:
+            # select the keyset values alongside each row, so that
+            # the cursor can be taken from the last row of the page
+            keys = [col.label(f'_keyset_{i}') for i, col in enumerate(keyset)]
+            page_query = page_query.add_columns(*keys).order_by(*keyset)
+            if self.cursor:
+                values = decode_cursor(self.cursor)
+                if len(values) != len(keyset):
+                    raise HTTPException(HTTP_422_UNPROCESSABLE_ENTITY, 'Invalid cursor')
+                page_query = page_query.where(tuple_(*keyset) > tuple_(*values))
+        else:
+            try:
+                sort_col = text(sort) if sort else self.sort
+                if sort_model:
+                    sort_col = getattr(sort_model, sort_col)
+            except AttributeError:
+                raise HTTPException(HTTP_422_UNPROCESSABLE_ENTITY, 'Invalid sort column')
+            page_query = page_query.order_by(sort_col)
+            if self.size:
+                page_query = page_query.offset(self.size * (self.page - 1))
+
+        if self.size:
+            # fetch one extra row to find out if there are more
+            page_query = page_query.limit(self.size + 1)
 
         try:
-            sort_col = text(sort) if sort else self.sort
-            if sort_model:
-                sort_col = getattr(sort_model, sort_col)
-
-            limit = self.size or total
-
-            items = [
-                item_factory(row) for row in Session.execute(
-                    query.
-                    order_by(sort_col).
-                    offset(limit * (self.page - 1)).
-                    limit(limit)
-                )
-            ]
-        except (AttributeError, CompileError):
+            rows = db.execute(page_query).all()
+        except CompileError:
             raise HTTPException(HTTP_422_UNPROCESSABLE_ENTITY, 'Invalid sort column')
 
+        has_more = bool(self.size) and len(rows) > self.size
+        if has_more:
+            rows = rows[:self.size]
+
+        if self.count == CountMode.WINDOW and rows and not (keyset and self.cursor):
+            total = rows[0]._total
+
+        if keyset:
+            page = pages = None
+        else:
+            page = self.page
+            pages = None
+            if total is not None:
+                pages = ceil(total / self.size) if self.size else min(total, 1)
+
         return Page(
-            items=items,
+            items=[item_factory(row) for row in rows],
             total=total,
-            page=self.page,
-            pages=ceil(total / limit) if limit else 0,
+            estimated=self.count == CountMode.ESTIMATE,
+            has_more=has_more,
+            page=page,
+            pages=pages,
+            next=encode_cursor([rows[-1]._mapping[key.name] for key in keys]) if keys and has_more else None,
         )
+
+    @staticmethod
+    def _estimate_count(query: Select, db: Session) -> int:
+        plan = db.execute(_Explain(query)).scalar_one()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows'])
@@ -0,0 +1,123 @@
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable, Iterable, Optional, Set, Tuple
+from uuid import UUID
+
+from nccrd.db.changes import on_submissions_committed
+
+RESPONSE_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+ANY_SUBMISSION = 'any'
+"""Tag for responses that may be affected by a change to any submission,
+including the creation of a new one (e.g. a page that reports a total)."""
+
+
+class ResponseCache:
+    """A size-bounded, in-memory LRU cache of serialized responses.
+
+    Each entry is tagged with the ids of the submissions it depends on, and
+    is discarded when a change to any of them is committed in this process.
+    Entries tagged with :data:`ANY_SUBMISSION` are discarded on every change.
+    When the cache exceeds `max_bytes`, the least recently used entries are
+    evicted.
+
+    Invalidation is per process: with multiple worker processes, a worker
+    only sees the changes committed through itself. Keys must therefore
+    include a database-derived version of what the response depends on -
+    e.g. the submission's ETag, or the `submissions` data version (see
+    nccrd.db.versions) - so that a change committed through another
+    process makes for a new key.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[Hashable, Tuple[bytes, Set]] = OrderedDict()
+        self._keys_by_tag: Dict[object, Set[Hashable]] = {}
+        self._size = 0
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable) -> Tuple[Optional[bytes], int]:
+        """Return the cached response for `key` (or None), together with
+        the cache generation, to be passed to :meth:`put` when caching a
+        newly built response.
+
+        :param key: the route and its parameters
+        """
+        with self._lock:
+            if (entry := self._entries.get(key)) is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0], self._generation
+            self.misses += 1
+            return None, self._generation
+
+    def put(self, key: Hashable, content: bytes, tags: Iterable, generation: int) -> None:
+        """Cache a response built after a call to :meth:`get`.
+
+        :param key: the route and its parameters
+        :param content: the serialized response
+        :param tags: the ids of the submissions the response depends on,
+            and/or :data:`ANY_SUBMISSION`
+        :param generation: the generation returned by :meth:`get`
+        """
+        with self._lock:
+            # don't cache the response if a write was committed while building it
+            if generation != self._generation or len(content) > self.max_bytes:
+                return
+            self._discard(key)
+            self._entries[key] = content, (tags := set(tags))
+            for tag in tags:
+                self._keys_by_tag.setdefault(tag, set()).add(key)
+            self._size += len(content)
+            while self._size > self.max_bytes:
+                self._discard(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, submission_ids: Set[UUID]) -> None:
+        """Discard the responses that depend on any of the given submissions."""
+        with self._lock:
+            self._generation += 1
+            for tag in (ANY_SUBMISSION, *submission_ids):
+                for key in self._keys_by_tag.get(tag, set()).copy():
+                    self._discard(key)
+                    self.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._keys_by_tag.clear()
+            self._size = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else None,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+    def _discard(self, key: Hashable) -> None:
+        if (entry := self._entries.pop(key, None)) is not None:
+            content, tags = entry
+            self._size -= len(content)
+            for tag in tags:
+                keys = self._keys_by_tag[tag]
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_tag[tag]
+
+
+response_cache = ResponseCache(RESPONSE_CACHE_MAX_BYTES)
+on_submissions_committed(response_cache.invalidate)
@@ -0,0 +1,198 @@
+import fcntl
+import logging
+import math
+import os
+import shutil
+import tempfile
+import threading
+from typing import Optional, Tuple
+
+import mapbox_vector_tile
+import numpy as np
+import shapely
+from shapely import STRtree
+
+from nccrd.api.lib.geometry import RegionLayer, layer_shapes
+from nccrd.db.region_cache import RegionData, region_cache
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS = 6378137.0
+MAX_LATITUDE = 85.0511287798
+MERCATOR_ORIGIN = math.pi * EARTH_RADIUS
+
+TILE_EXTENT = 4096
+TILE_BUFFER = 64
+
+TILE_CACHE_DIR = os.path.join(tempfile.gettempdir(), 'nccrd-tiles')
+TILE_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+
+def to_web_mercator(geometry):
+    """Project a lon/lat geometry onto the web mercator (EPSG:3857) plane."""
+
+    def project(coords):
+        lon = coords[:, 0]
+        lat = np.clip(coords[:, 1], -MAX_LATITUDE, MAX_LATITUDE)
+        return np.column_stack((
+            np.radians(lon) * EARTH_RADIUS,
+            np.log(np.tan(np.pi / 4 + np.radians(lat) / 2)) * EARTH_RADIUS,
+        ))
+
+    return shapely.transform(geometry, project)
+
+
+def tile_bounds(z: int, x: int, y: int) -> Tuple[float, float, float, float]:
+    """Return the web mercator bounds (minx, miny, maxx, maxy) of an XYZ tile."""
+    size = 2 * MERCATOR_ORIGIN / 2 ** z
+    minx = -MERCATOR_ORIGIN + x * size
+    maxy = MERCATOR_ORIGIN - y * size
+    return minx, maxy - size, minx + size, maxy
+
+
+def _mercator_layer(layer: RegionLayer, data: RegionData):
+    shapes = layer_shapes(layer, data)
+    properties = [
+        {key: value for key, value in props.items() if value is not None}
+        for props, _ in shapes
+    ]
+    geometries = np.array([to_web_mercator(geometry) for _, geometry in shapes], dtype=object)
+    return properties, geometries, STRtree(geometries)
+
+
+def render_tile(layer: RegionLayer, z: int, x: int, y: int, data: RegionData) -> bytes:
+    """Render a Mapbox Vector Tile for a region layer from a region snapshot.
+
+    Features are selected using a spatial index over the projected layer
+    geometry, clipped to the (buffered) tile and simplified to the tile's
+    resolution.
+    """
+    properties, geometries, tree = data.derive(
+        f'mercator:{layer.value}', lambda data: _mercator_layer(layer, data)
+    )
+
+    minx, miny, maxx, maxy = bounds = tile_bounds(z, x, y)
+    resolution = (maxx - minx) / TILE_EXTENT
+    buffer = resolution * TILE_BUFFER
+    clip_bounds = (minx - buffer, miny - buffer, maxx + buffer, maxy + buffer)
+
+    features = []
+    for i in tree.query(shapely.box(*clip_bounds)):
+        geometry = shapely.clip_by_rect(geometries[i], *clip_bounds)
+        if geometry.is_empty:
+            continue
+        features.append({
+            'geometry': geometry.simplify(resolution, preserve_topology=True),
+            'properties': properties[i],
+        })
+
+    return mapbox_vector_tile.encode(
+        [{'name': layer.value, 'features': features}],
+        default_options={'quantize_bounds': bounds, 'extents': TILE_EXTENT},
+    )
+
+
+class TileCache:
+    """A size-bounded on-disk cache of rendered tiles, shared by the API
+    processes of a host.
+
+    Tiles are stored under a subdirectory named for the fingerprint of the
+    region data they were rendered from, and each process reads and writes
+    only the subdirectory of the region data it has loaded itself. Processes
+    that have loaded different region data, e.g. while a reload is being
+    picked up, therefore don't interfere with each other. Tiles of region
+    data that is no longer in use are never read again, so they are the first
+    to be evicted.
+
+    Since all processes write to the cache, its size is measured on disk:
+    a process rescans the cache after writing `max_bytes / 16` bytes to it,
+    and if the cache exceeds `max_bytes`, evicts the least recently used
+    tiles down to 90% of `max_bytes`.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._scan_bytes = max_bytes // 16
+        # scan on the first write, to account for tiles cached before this process started
+        self._unscanned_bytes = self._scan_bytes
+
+    def get(self, fingerprint: str, key: str) -> Optional[bytes]:
+        path = os.path.join(self.directory, fingerprint, key)
+        try:
+            with open(path, 'rb') as f:
+                content = f.read()
+            os.utime(path)
+            return content
+        except FileNotFoundError:
+            return None
+
+    def put(self, fingerprint: str, key: str, content: bytes) -> None:
+        path = os.path.join(self.directory, fingerprint, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self._unscanned_bytes += len(content)
+            if self._unscanned_bytes < self._scan_bytes:
+                return
+            self._unscanned_bytes = 0
+        self._enforce_max_bytes()
+
+    def clear(self) -> None:
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def _files(self):
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name == '.lock':
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    yield path, os.stat(path)
+                except FileNotFoundError:
+                    pass
+
+    def _enforce_max_bytes(self) -> None:
+        with open(os.path.join(self.directory, '.lock'), 'a') as lock:
+            try:
+                # if another process is already evicting, leave it to that process
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return
+
+            files = list(self._files())
+            size = sum(stat.st_size for _, stat in files)
+            if size <= self.max_bytes:
+                return
+
+            # evict down to 90% of capacity, so that we don't evict on every scan
+            target = self.max_bytes * 0.9
+            for path, stat in sorted(files, key=lambda f: f[1].st_mtime):
+                if size <= target:
+                    break
+                try:
+                    os.remove(path)
+                    size -= stat.st_size
+                except FileNotFoundError:
+                    pass
+            logger.info(f'Tile cache evicted down to {size} bytes.')
+
+
+tile_cache = TileCache(TILE_CACHE_DIR, TILE_CACHE_MAX_BYTES)
+
+
+def get_tile(layer: RegionLayer, z: int, x: int, y: int) -> bytes:
+    """Return a region layer tile, from the tile cache if possible."""
+    # the tile is cached under the fingerprint of the snapshot it is rendered
+    # from, so both must be taken from the same snapshot
+    data = region_cache.data
+    key = os.path.join(layer.value, str(z), str(x), f'{y}.mvt')
+    if (content := tile_cache.get(data.fingerprint, key)) is None:
+        content = render_tile(layer, z, x, y, data)
+        tile_cache.put(data.fingerprint, key, content)
+    return content
@@ -0,0 +1,198 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import shutil
+import tempfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from fastapi import HTTPException, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from starlette.status import HTTP_400_BAD_REQUEST, HTTP_413_REQUEST_ENTITY_TOO_LARGE
+
+from nccrd.lib.templates import WorkbookTemplate
+from nccrd.lib.workbook import WorkbookError, parse_workbook_measured
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_MAX_BYTES = 20 * 1024 * 1024
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+PARSE_WORKERS = min(4, os.cpu_count() or 1)
+PARSE_QUEUE_LIMIT = 4 * PARSE_WORKERS
+
+BATCH_MAX_FILES = 200
+BATCH_MAX_BYTES = 200 * 1024 * 1024
+WORKBOOK_EXTENSIONS = ('.xlsx', '.xlsm')
+
+
+_executor = None
+_slots = asyncio.Semaphore(PARSE_QUEUE_LIMIT)
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        # spawn rather than fork, since the API process runs threads
+        _executor = ProcessPoolExecutor(PARSE_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+    return _executor
+
+
+async def spool_upload(
+        file: UploadFile,
+        max_bytes: int = UPLOAD_MAX_BYTES,
+        directory: str = None,
+) -> Tuple[str, int]:
+    """Copy an upload to a temporary file, without holding it in memory.
+
+    :param directory: where to create the file; defaults to the system
+        temp directory
+    :return: the path of the temporary file, which the caller must remove,
+        and its size
+    :raises HTTPException: 413, if the upload exceeds `max_bytes`
+    """
+    suffix = os.path.splitext(file.filename or '')[1]
+    fd, path = tempfile.mkstemp(prefix='nccrd-upload-', suffix=suffix, dir=directory)
+    size = 0
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            while chunk := await file.read(UPLOAD_CHUNK_BYTES):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise HTTPException(
+                        HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                        f'The upload exceeds the maximum size of {max_bytes} bytes.'
+                    )
+                f.write(chunk)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path, size
+
+
+async def parse_workbook_file(template: WorkbookTemplate, path: str) -> Tuple[dict, dict]:
+    """Parse a workbook file in the worker process pool.
+
+    :return: the parsed payload, and the parse time and peak memory use
+    """
+    # bound the number of parses queued for the pool, so that
+    # a burst of uploads cannot queue up unbounded work
+    async with _slots:
+        return await asyncio.get_running_loop().run_in_executor(
+            _get_executor(), parse_workbook_measured, path, template.name, template.version
+        )
+
+
+async def parse_upload(template: WorkbookTemplate, file: UploadFile) -> Tuple[dict, dict]:
+    """Spool an uploaded workbook to disk and parse it in the worker process
+    pool, off the event loop.
+
+    :return: the parsed payload, and upload statistics: its size, parse
+        time and peak parse memory use
+    """
+    path, size = await spool_upload(file)
+    try:
+        submission_data, stats = await parse_workbook_file(template, path)
+    finally:
+        os.remove(path)
+    stats = dict(bytes=size, **stats)
+    logger.info(f'Parsed {file.filename}: {stats}')
+    return submission_data, stats
+
+
+@dataclass
+class BatchWorkbook:
+    """A workbook of a batch upload: an uploaded file, or a member of an
+    uploaded zip archive, of `size` bytes. If it could not be read, `error`
+    says why."""
+    name: str
+    path: Optional[str] = None
+    size: int = 0
+    error: Optional[str] = None
+
+
+def extract_workbooks(zip_path: str, directory: str, max_files: int, max_bytes: int) -> List[BatchWorkbook]:
+    """Extract the workbooks in a zip archive into `directory`. Other files,
+    directories and Office lock files are skipped.
+
+    :raises WorkbookError: if the archive is invalid, or holds more than
+        `max_files` workbooks or more than `max_bytes` uncompressed
+    """
+    try:
+        with zipfile.ZipFile(zip_path) as archive:
+            members = [
+                member for member in archive.infolist()
+                if not member.is_dir()
+                and member.filename.lower().endswith(WORKBOOK_EXTENSIONS)
+                and not os.path.basename(member.filename).startswith('~$')
+                and not member.filename.startswith('__MACOSX/')
+            ]
+            if len(members) > max_files:
+                raise WorkbookError(f'The archive holds more than {max_files} workbooks.')
+            if sum(member.file_size for member in members) > max_bytes:
+                raise WorkbookError(f'The archive holds more than {max_bytes} bytes of workbooks.')
+
+            workbooks = []
+            for member in members:
+                # don't use member names in paths, which may point outside `directory`
+                fd, path = tempfile.mkstemp(suffix=os.path.splitext(member.filename)[1], dir=directory)
+                with archive.open(member) as src, os.fdopen(fd, 'wb') as dst:
+                    shutil.copyfileobj(src, dst)
+                workbooks.append(BatchWorkbook(member.filename, path, member.file_size))
+            return workbooks
+
+    except zipfile.BadZipFile as e:
+        raise WorkbookError(f'Invalid zip archive: {e}')
+
+
+async def _spool_batch_file(file: UploadFile, max_bytes: int, budget: int, directory: str) -> Tuple[str, int]:
+    try:
+        return await spool_upload(file, min(max_bytes, budget), directory)
+    except HTTPException as e:
+        if e.status_code == HTTP_413_REQUEST_ENTITY_TOO_LARGE and budget < max_bytes:
+            raise HTTPException(
+                HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                f'The batch exceeds the maximum size of {BATCH_MAX_BYTES} bytes.'
+            )
+        raise
+
+
+async def spool_batch(files: List[UploadFile], directory: str) -> List[BatchWorkbook]:
+    """Spool the workbooks of a batch upload - given as workbook files and/or
+    zip archives of workbooks - into `directory`. At most BATCH_MAX_BYTES
+    are written to `directory` at any time, counting both uploaded and
+    extracted workbooks.
+
+    :raises HTTPException: 400, if the batch holds more than BATCH_MAX_FILES
+        workbooks; 413, if a file or the batch is too large
+    """
+    workbooks = []
+    budget = BATCH_MAX_BYTES
+    for file in files:
+        name = file.filename or f'file {len(workbooks) + 1}'
+        if name.lower().endswith('.zip'):
+            path, size = await _spool_batch_file(file, BATCH_MAX_BYTES, budget, directory)
+            try:
+                # the archive is still on disk while it is being extracted
+                extracted = await run_in_threadpool(
+                    extract_workbooks, path, directory, BATCH_MAX_FILES - len(workbooks), budget - size
+                )
+            except WorkbookError as e:
+                workbooks.append(BatchWorkbook(name, error=str(e)))
+            else:
+                workbooks += extracted
+                budget -= sum(workbook.size for workbook in extracted)
+            finally:
+                os.remove(path)
+        elif name.lower().endswith(WORKBOOK_EXTENSIONS):
+            path, size = await _spool_batch_file(file, UPLOAD_MAX_BYTES, budget, directory)
+            workbooks.append(BatchWorkbook(name, path, size))
+            budget -= size
+        else:
+            workbooks.append(BatchWorkbook(name, error='Not a workbook (.xlsx / .xlsm) or zip archive.'))
+
+        if len(workbooks) > BATCH_MAX_FILES:
+            raise HTTPException(HTTP_400_BAD_REQUEST, f'A batch may hold at most {BATCH_MAX_FILES} workbooks.')
+    return workbooks
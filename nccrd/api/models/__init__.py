@@ -1,2 +1,5 @@
-from .submission import SubmissionModel,SubmissionCreate,SubmissionUpdate,SubmissionResponse,AdaptationResponse,MitigationResponse
-from .region import CountryModel, ProvinceModel, DistrictModel, LocalDistrictModel,NamedItemModel
+from .submission import SubmissionModel,SubmissionCreate,SubmissionUpdate,SubmissionResponse,AdaptationResponse,MitigationResponse, \
+    SubmissionSearchResult, FacetValueModel, FacetsModel, \
+    FundingRollupModel
+from .region import CountryModel, ProvinceModel, DistrictModel, LocalDistrictModel,NamedItemModel, \
+    DistrictNodeModel, ProvinceNodeModel, LocationModel
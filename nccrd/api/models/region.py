@@ -1,6 +1,6 @@
 from pydantic import BaseModel, Field
 from datetime import datetime
-from typing import Optional, Dict,Any
+from typing import Optional, Dict,Any, List
 from uuid import UUID
 
 class ProvinceModel(BaseModel):
@@ -53,3 +53,14 @@ class NamedItemModel(BaseModel):
     id: int
     code: str
     name: str
+
+class DistrictNodeModel(NamedItemModel):
+    local_districts: List[NamedItemModel]
+
+class ProvinceNodeModel(NamedItemModel):
+    districts: List[DistrictNodeModel]
+
+class LocationModel(BaseModel):
+    province: Optional[NamedItemModel]
+    district: Optional[NamedItemModel]
+    local_district: Optional[NamedItemModel]
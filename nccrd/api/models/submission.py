@@ -1,8 +1,10 @@
 from pydantic import BaseModel, Field
 from datetime import datetime
-from typing import Optional, Dict,Any
+from typing import Optional, Dict,Any,List,Union
 from uuid import UUID
 
+from nccrd.db.models import InterventionType
+
 # Schemas for Mitigation data
 class MitigationCreate(BaseModel):
     sector: str = Field(..., description="Primary sector for the mitigation intervention")
@@ -258,6 +260,7 @@ class SubmissionUpdate(BaseModel):
     deletedby: Optional[int] = None
     deletedate: Optional[datetime] = None
     deleted: Optional[bool] = None
+    version: Optional[int] = Field(None, description="The version being updated, if not given by an If-Match header")
 
     mitigation_data: Optional[MitigationCreate] = None
     adaptation_data: Optional[AdaptaionCreate] = None
@@ -315,6 +318,7 @@ class SubmissionModel(BaseModel):
     id: UUID
     title: str
     intervention_measurement: str
+    intervention_type: Optional[InterventionType] = None
     description: Optional[str] = None
     implementation_status: Optional[str] = None
     implementation_organization: Optional[str] = None
@@ -327,6 +331,9 @@ class SubmissionModel(BaseModel):
     funding_amount: Optional[float] = None
     estimated_budget_cost: Optional[str] = None
     geo_location: Optional[Dict] = None
+    province_id: Optional[int] = None
+    district_id: Optional[int] = None
+    local_district_id: Optional[int] = None
     project_manager_name: Optional[str] = None
     project_manager_organization: Optional[str] = None
     project_manager_position: Optional[str] = None
@@ -344,11 +351,35 @@ class SubmissionModel(BaseModel):
     deletedby: Optional[int] = None
     deletedate: Optional[datetime] = None
     deleted: Optional[bool] = False
+    version: Optional[int] = None
 
     class Config:
         orm_mode = True
 
 
+class SubmissionSearchResult(SubmissionModel):
+    rank: float = Field(..., description="Relevance of the submission to the search query")
+
+
+class FacetValueModel(BaseModel):
+    value: Optional[Union[int, str]] = Field(..., description="Facet value; null for submissions without one")
+    name: Optional[str] = Field(None, description="Display name, for region facets")
+    count: int
+
+
+class FacetsModel(BaseModel):
+    total: int = Field(..., description="Number of submissions matching all the filters")
+    facets: Dict[str, List[FacetValueModel]]
+
+
+class FundingRollupModel(BaseModel):
+    group: Dict[str, Optional[Union[int, str]]] = Field(..., description="Values of the group_by dimensions")
+    submissions: int
+    funded_submissions: int = Field(..., description="Number of submissions with a funding amount")
+    funding_total: float
+    funding_average: Optional[float] = Field(..., description="Average over the funded submissions")
+
+
 
 class MitigationResponse(BaseModel):
     sector: Optional[str]
@@ -399,6 +430,7 @@ class SubmissionResponse(BaseModel):
     id: UUID
     title: Optional[str]
     intervention_measurement: Optional[str]
+    intervention_type: Optional[InterventionType]
     description: Optional[str]
     implementation_status: Optional[str]
     implementation_organization: Optional[str]
@@ -411,6 +443,9 @@ class SubmissionResponse(BaseModel):
     funding_amount: Optional[float]
     estimated_budget_cost: Optional[str]
     geo_location: Optional[Any]  # Can be a dict (GeoJSON)
+    province_id: Optional[int]
+    district_id: Optional[int]
+    local_district_id: Optional[int]
     project_manager_name: Optional[str]
     project_manager_organization: Optional[str]
     project_manager_position: Optional[str]
@@ -428,6 +463,7 @@ class SubmissionResponse(BaseModel):
     deletedby: Optional[int]
     deletedate: Optional[datetime]
     deleted: Optional[bool]
+    version: Optional[int]
     mitigation: Optional[MitigationResponse] = None
     adaptation: Optional[AdaptationResponse] = None
 
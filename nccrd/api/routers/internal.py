@@ -0,0 +1,43 @@
+from fastapi import APIRouter, Depends
+
+from nccrd.api.lib.auth import Authorize
+from nccrd.api.lib.response_cache import response_cache
+from nccrd.const import NCCRDScope
+from nccrd.db import async_pool_metrics, pool_metrics
+
+router = APIRouter()
+
+
+@router.get(
+    "/db_pool",
+    summary="Get live database connection pool statistics",
+    dependencies=[Depends(Authorize(NCCRDScope.PROJECT_ADMIN))],
+)
+async def get_db_pool_stats():
+    """
+    Return the size, checked in / checked out / overflow connection counts
+    and connection wait times of the sync and async connection pools.
+
+    Example:
+      GET /db_pool
+    """
+    return {
+        "sync": pool_metrics.snapshot(),
+        "async": async_pool_metrics.snapshot(),
+    }
+
+
+@router.get(
+    "/response_cache",
+    summary="Get submission response cache statistics",
+    dependencies=[Depends(Authorize(NCCRDScope.PROJECT_ADMIN))],
+)
+async def get_response_cache_stats():
+    """
+    Return the size and hit / miss / eviction / invalidation counts of
+    the submission response cache of this process.
+
+    Example:
+      GET /response_cache
+    """
+    return response_cache.stats()
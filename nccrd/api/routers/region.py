@@ -1,29 +1,42 @@
+import json
 from typing import List, Optional, Union
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Path, Query, Request, Response
 from fastapi.responses import JSONResponse
-from fastapi.responses import JSONResponse
-from sqlalchemy.orm import Session
-from nccrd.db import get_db
-from nccrd.api.models import NamedItemModel
-from nccrd.db.models import Province, District, LocalDistrict, Country
+from nccrd.api.lib.auth import Authorize
+from nccrd.api.lib.etag import check_not_modified
+from nccrd.api.lib.geocoding import locate
+from nccrd.api.lib.geometry import RegionLayer, simplified_geojson, tolerance_for_zoom
+from nccrd.api.lib.tiles import get_tile
+from nccrd.api.models import LocationModel, NamedItemModel, ProvinceNodeModel
+from nccrd.const import NCCRDScope
+from nccrd.db import SessionFactory
+from nccrd.db.region_cache import RegionData, region_cache
+from nccrd.db.versions import REGIONS, bump_data_version
 
 router = APIRouter()
 
 
+def region_etag(request: Request) -> str:
+    """Return the ETag of the current region data, responding with 304
+    Not Modified if it matches the request's If-None-Match header."""
+    etag = f'"{region_cache.data.fingerprint}"'
+    check_not_modified(request, etag)
+    return etag
+
+
 @router.get(
     "/names/provinces",
     response_model=List[NamedItemModel],
     summary="List all provinces"
 )
-async def list_province_names(db: Session = Depends(get_db)):
+async def list_province_names(etag: str = Depends(region_etag)):
     """
     Return all province names.
 
     Example:
       GET /names/provinces
     """
-    provinces = db.query(Province).order_by(Province.PR_NAME).all()
-    return JSONResponse(content=[{"id": p.FID, "code": p.PR_MDB_C, "name": p.PR_NAME} for p in provinces])
+    return JSONResponse(content=region_cache.data.province_names, headers={'ETag': etag})
 
 
 @router.get(
@@ -31,16 +44,17 @@ async def list_province_names(db: Session = Depends(get_db)):
     response_model=List[NamedItemModel],
     summary="List all districts within a given province"
 )
-async def list_districts_by_province(province_name: str, db: Session = Depends(get_db)):
+async def list_districts_by_province(province_name: str, etag: str = Depends(region_etag)):
     """
     Return all districts within a given province.
 
     Example:
       GET /names/districts/by_province/{province_name}
     """
-    districts = db.query(District).filter(District.PROVINCE == province_name).order_by(District.DISTRICT).all()
-    print(f"Querying districts for province: {province_name}")
-    return JSONResponse(content=[{"id": d.FID, "code": d.DISTRICT, "name": d.DISTRICT_N} for d in districts])
+    return JSONResponse(
+        content=region_cache.data.district_names_by_province.get(province_name, []),
+        headers={'ETag': etag},
+    )
 
 
 @router.get(
@@ -48,16 +62,17 @@ async def list_districts_by_province(province_name: str, db: Session = Depends(g
     response_model=List[NamedItemModel],
     summary="List all local districts within a given district"
 )
-async def list_local_districts_by_district(district_name: str, db: Session = Depends(get_db)):
+async def list_local_districts_by_district(district_name: str, etag: str = Depends(region_etag)):
     """
     Return all local districts within a given district.
 
     Example:
       GET /names/local_districts/by_district/{district_name}
     """
-    local_districts = db.query(LocalDistrict).filter(LocalDistrict.DISTRICT == district_name).order_by(
-        LocalDistrict.MUNICNAME).all()
-    return JSONResponse(content=[{"id": ld.FID, "code": ld.CAT_B, "name": ld.MUNICNAME} for ld in local_districts])
+    return JSONResponse(
+        content=region_cache.data.local_district_names_by_district.get(district_name, []),
+        headers={'ETag': etag},
+    )
 
 
 @router.get(
@@ -65,27 +80,171 @@ async def list_local_districts_by_district(district_name: str, db: Session = Dep
     response_model=List[NamedItemModel],
     summary="List all local districts within a given province"
 )
-async def list_local_districts_by_province(province_name: str, db: Session = Depends(get_db)):
+async def list_local_districts_by_province(province_name: str, etag: str = Depends(region_etag)):
     """
     Return all local districts within a given province.
 
     Example:
       GET /names/local_districts/by_province/{province_name}
     """
-    local_districts = db.query(LocalDistrict).filter(LocalDistrict.PROVINCE == province_name).order_by(
-        LocalDistrict.MUNICNAME).all()
-    return JSONResponse(content=[{"id": ld.FID, "code": ld.CAT_B, "name": ld.MUNICNAME} for ld in local_districts])
+    return JSONResponse(
+        content=region_cache.data.local_district_names_by_province.get(province_name, []),
+        headers={'ETag': etag},
+    )
 @router.get(
     "/names/countries",
     response_model=List[NamedItemModel],
     summary="List all countries"
 )
-async def list_countries(db: Session = Depends(get_db)):
+async def list_countries(etag: str = Depends(region_etag)):
     """
     Return all country names.
     
     Example:
       GET /names/countries
     """
-    countries = db.query(Country).order_by(Country.shape0).all()
-    return JSONResponse(content=[{"id": c.gid, "code": c.shapeiso, "name": c.shape0} for c in countries])
\ No newline at end of file
+    return JSONResponse(content=region_cache.data.country_names, headers={'ETag': etag})
+
+
+def _build_region_tree(data: RegionData) -> bytes:
+    """Build the serialized province -> district -> local district hierarchy,
+    following the `District.PROVINCE` and `LocalDistrict.DISTRICT` links."""
+    tree = []
+    for province in data.provinces:
+        # districts may refer to a province by either its name or its code
+        districts = data.district_names_by_province.get(province.PR_NAME) or \
+            data.district_names_by_province.get(province.PR_MDB_C, [])
+        tree.append({
+            "id": province.FID,
+            "code": province.PR_MDB_C,
+            "name": province.PR_NAME,
+            "districts": [
+                dict(district, local_districts=data.local_district_names_by_district.get(district["code"], []))
+                for district in districts
+            ],
+        })
+    return json.dumps(tree, separators=(',', ':')).encode()
+
+
+@router.get(
+    "/tree",
+    response_model=List[ProvinceNodeModel],
+    summary="Get the full province / district / local district hierarchy"
+)
+async def get_region_tree(etag: str = Depends(region_etag)):
+    """
+    Return all provinces, each with its districts, each with its local
+    districts, in a single response. The payload is built once per load
+    of the region cache.
+
+    Example:
+      GET /tree
+    """
+    return Response(
+        content=region_cache.derive('tree', _build_region_tree),
+        media_type='application/json',
+        headers={'ETag': etag},
+    )
+
+
+@router.get(
+    "/geometry/{layer}",
+    summary="Get the simplified geometry of a region layer as GeoJSON"
+)
+def get_region_geometry(
+        layer: RegionLayer,
+        zoom: Optional[int] = Query(None, ge=0, le=24, title='Web map zoom level'),
+        tolerance: Optional[float] = Query(None, ge=0, title='Simplification tolerance in degrees'),
+        etag: str = Depends(region_etag),
+):
+    """
+    Return a GeoJSON FeatureCollection of all districts, local districts or
+    the country boundary, simplified for display at the given `zoom` level
+    or to the given `tolerance`. The nearest of the served simplification
+    levels not coarser than requested is returned. If neither parameter is
+    given, the full-precision geometry is returned.
+
+    Example:
+      GET /geometry/district?zoom=6
+    """
+    if zoom is not None:
+        tolerance = tolerance_for_zoom(zoom)
+    return Response(
+        content=simplified_geojson(layer, tolerance or 0),
+        media_type='application/geo+json',
+        headers={'ETag': etag},
+    )
+
+
+@router.get(
+    "/tiles/{layer}/{z}/{x}/{y}.mvt",
+    response_class=Response,
+    summary="Get a Mapbox Vector Tile of a region layer"
+)
+def get_region_tile(
+        layer: RegionLayer,
+        z: int = Path(..., ge=0, le=22),
+        x: int = Path(..., ge=0),
+        y: int = Path(..., ge=0),
+        etag: str = Depends(region_etag),
+):
+    """
+    Return the XYZ tile `z/x/y` of the district, local district or country
+    layer, encoded as a Mapbox Vector Tile. Rendered tiles are kept in an
+    on-disk cache, which is invalidated when the region data is reloaded.
+
+    Example:
+      GET /tiles/local_district/7/72/73.mvt
+    """
+    if x >= 2 ** z or y >= 2 ** z:
+        raise HTTPException(status_code=404, detail="Tile not found")
+
+    return Response(
+        content=get_tile(layer, z, x, y),
+        media_type='application/vnd.mapbox-vector-tile',
+        headers={'ETag': etag},
+    )
+
+
+@router.get(
+    "/locate",
+    response_model=LocationModel,
+    summary="Find the regions containing a point"
+)
+def locate_point(
+        lon: float = Query(..., ge=-180, le=180, title='Longitude'),
+        lat: float = Query(..., ge=-90, le=90, title='Latitude'),
+):
+    """
+    Return the province, district and local district (municipality)
+    containing the given point; any of these may be null if the point
+    falls outside of all regions of that kind.
+
+    Example:
+      GET /locate?lon=30.374&lat=-27.936
+    """
+    return locate(lon, lat)
+
+
+@router.post(
+    "/reload",
+    summary="Reload the region cache of every API process",
+    dependencies=[Depends(Authorize(NCCRDScope.PROJECT_ADMIN))],
+)
+def reload_regions():
+    """
+    Re-read the province, district, local district and country tables
+    into the region cache of this process, and have every other API
+    process do the same within `REGION_POLL_SECONDS` seconds. API
+    processes pick up a reload by `migrate/systemdata.py` by themselves;
+    this forces a reload after the region tables have been changed by
+    other means.
+
+    Example:
+      POST /reload
+    """
+    with SessionFactory() as db:
+        bump_data_version(db, REGIONS)
+        db.commit()
+    data = region_cache.load()
+    return {"detail": "Region cache reloaded.", "version": data.version}
@@ -1,91 +1,452 @@
-from typing import List, Optional, Union
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
-from sqlalchemy.orm import Session
-from sqlalchemy import inspect
+from typing import Dict, List, Optional, Union
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Request, Response, UploadFile, File
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, joinedload, selectinload
+from sqlalchemy.orm.exc import StaleDataError
+from sqlalchemy import inspect, select
+from sqlalchemy.exc import SQLAlchemyError
+from starlette.status import HTTP_413_REQUEST_ENTITY_TOO_LARGE
 from nccrd.api.models import SubmissionModel, SubmissionCreate, SubmissionUpdate, SubmissionResponse, \
-    MitigationResponse, AdaptationResponse
+    SubmissionSearchResult, FacetsModel, FacetValueModel, \
+    FundingRollupModel
 from uuid import UUID
 
 from nccrd.const import NCCRDScope
-from nccrd.db import get_db
-from nccrd.db.models import Submission, Adaptaion, Mitigation
-from openpyxl import load_workbook
-from io import BytesIO
+from nccrd.db import get_async_db, get_db
+from nccrd.db.models import Submission, Adaptaion, InterventionType, Mitigation
+from nccrd.db.facets import facet_counts, facet_total
+from nccrd.db.region_cache import region_cache
+from nccrd.db.rollups import DIMENSIONS as FUNDING_DIMENSIONS, funding_rollup
+from nccrd.db.search import search_query, search_rank
+from nccrd.db.versions import SUBMISSIONS, get_data_version
 from datetime import datetime
+import asyncio
+import json
+import logging
+from itertools import islice
+import tempfile
 import traceback
 
 from nccrd.api.lib.auth import Authorize
+from nccrd.api.lib.export import ExportFormat, columnar_snapshots, stream_csv, stream_ndjson
+from nccrd.api.lib.etag import check_not_modified, etag_matches, version_etag
+from nccrd.api.lib.paging import Page, Paginator
+from nccrd.api.lib.response_cache import ANY_SUBMISSION, response_cache
+from nccrd.api.lib.geocoding import geo_location_geometry, locate_submission
+from nccrd.api.lib.ingest import BULK_BATCH_SIZE, BULK_MAX_BYTES, insert_submissions, intervention_error
+from nccrd.lib.templates import NCCRD_TEMPLATE, PROJECT_DETAILS, WorkbookTemplate, get_template
+from nccrd.api.lib.workbook import parse_upload, parse_workbook_file, spool_batch
+import shapely
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+SPATIAL_SEARCH_BATCH_SIZE = 500
+
+
+async def _submissions_version(db: AsyncSession) -> int:
+    # the submissions data version is part of the cache keys of lists, so
+    # that a change committed through any API process makes for new keys;
+    # within this process, the cached lists are also invalidated directly
+    return await db.run_sync(lambda session: get_data_version(session, SUBMISSIONS))
+
+
+def _list_query(submission_id: Optional[UUID], intervention_type: Optional[InterventionType]):
+    query = select(Submission)
+    if submission_id:
+        query = query.where(Submission.id == submission_id)
+    if intervention_type:
+        query = query.where(Submission.intervention_type == intervention_type)
+    return query
+
 
 @router.get(
     '/list_submission',
-    response_model=Union[SubmissionModel, List[SubmissionModel]],
+    response_model=List[SubmissionModel],
     summary='List all submissions or a specific submissions by its ID'
 )
 async def get_submissions_list(
-        submission_id: Optional[str] = None,
+        submission_id: Optional[UUID] = None,
+        intervention_type: Optional[InterventionType] = None,
+        db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Return all submissions, in creation order. Optionally, if a `submission_id`
+    query parameter is provided, filter the results to that specific submission.
+    An `intervention_type` filters the results to submissions of that type.
+
+    Use `/list_submission/paged` to fetch the submissions a page at a time.
+
+    Example:
+      GET /list_submission?submission_id=123
+    """
+    cache_key = ('list_submission', await _submissions_version(db), submission_id, intervention_type)
+    content, generation = response_cache.get(cache_key)
+    if content is not None:
+        return Response(content, media_type='application/json')
+
+    submissions = (await db.execute(
+        _list_query(submission_id, intervention_type).order_by(Submission._id)
+    )).scalars().all()
+    if submission_id and not submissions:
+        raise HTTPException(status_code=404, detail="Submission not found")
+
+    content = json.dumps(jsonable_encoder([SubmissionModel.from_orm(s) for s in submissions])).encode()
+    response_cache.put(cache_key, content, {ANY_SUBMISSION}, generation)
+    return Response(content, media_type='application/json')
+
+
+@router.get(
+    '/list_submission/paged',
+    response_model=Page[SubmissionModel],
+    summary='List submissions a page at a time'
+)
+async def get_submissions_page(
+        submission_id: Optional[UUID] = None,
+        intervention_type: Optional[InterventionType] = None,
+        paginator: Paginator = Depends(),
+        db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Return a page of submissions, in creation order, filtered as for
+    `/list_submission`.
+
+    Pages are fetched by cursor: pass the `next` value of a page as the `cursor`
+    of the following request.
+
+    Example:
+      GET /list_submission/paged?size=100&cursor=WzEwMF0
+    """
+    cache_key = ('list_submission/paged', await _submissions_version(db), submission_id, intervention_type,
+                 paginator.size, paginator.cursor, paginator.count)
+    content, generation = response_cache.get(cache_key)
+    if content is not None:
+        return Response(content, media_type='application/json')
+
+    page = await db.run_sync(lambda session: paginator.paginate(
+        _list_query(submission_id, intervention_type),
+        lambda row: SubmissionModel.from_orm(row.Submission),
+        db=session,
+        keyset=(Submission._id,),
+    ))
+    if submission_id and not page.items:
+        raise HTTPException(status_code=404, detail="Submission not found")
+
+    # new submissions are added at the end, so only a page that reports
+    # a total or is the last page can be affected by their creation
+    tags = {item.id for item in page.items}
+    if page.total is not None or not page.has_more:
+        tags.add(ANY_SUBMISSION)
+    content = page.json().encode()
+    response_cache.put(cache_key, content, tags, generation)
+    return Response(content, media_type='application/json')
+
+
+@router.get(
+    '/search',
+    response_model=List[SubmissionSearchResult],
+    summary='Full-text search over submissions'
+)
+def search_submissions(
+        q: str = Query(..., min_length=1, title='Search terms'),
+        prefix: bool = Query(True, title='Match the last term as a prefix'),
+        limit: int = Query(20, ge=1, le=100),
+        offset: int = Query(0, ge=0),
         db: Session = Depends(get_db)
 ):
     """
-    Return all submissions. Optionally, if a `submission_id` query parameter is provided,
-    filter the results to that specific submission.
+    Return the (non-deleted) submissions matching all the terms in `q`, most
+    relevant first. Titles weigh more than descriptions, which weigh more than
+    organizations and mitigation / adaptation details. By default the last
+    term is matched as a prefix, to support search-as-you-type.
 
     Example:
-      GET /all_submissions?submission_id=123
+      GET /search?q=solar%20ener
     """
-    if submission_id:
-        # Assuming submission_id corresponds to the string field, or you may need to cast if it's not a string.
-        submission = db.query(Submission).filter(Submission.id == submission_id).first()
-        if not submission:
-            raise HTTPException(status_code=404, detail="Submission not found")
-        return [submission]
-    else:
-        submissions = db.query(Submission).all()
-        print(submissions)
-        return submissions
+    tsquery = search_query(q, prefix)
+    if tsquery is None:
+        raise HTTPException(status_code=400, detail="The search query contains no searchable terms.")
+
+    rank = search_rank(tsquery).label('rank')
+    rows = db.execute(
+        select(Submission, rank).
+        where(Submission.search_vector.op('@@')(tsquery)).
+        where(Submission.deleted.isnot(True)).
+        order_by(rank.desc(), Submission._id).
+        limit(limit).
+        offset(offset)
+    ).all()
+    return [
+        SubmissionSearchResult(**SubmissionModel.from_orm(row.Submission).dict(), rank=row.rank)
+        for row in rows
+    ]
+
+
+@router.get(
+    '/facets',
+    response_model=FacetsModel,
+    summary='Count submissions by intervention, status, sector, funding type and province'
+)
+def get_submission_facets(
+        intervention_type: Optional[InterventionType] = None,
+        implementation_status: Optional[str] = None,
+        mitigation_sector: Optional[str] = None,
+        adaptation_sector: Optional[str] = None,
+        funding_type: Optional[str] = None,
+        province_id: Optional[int] = None,
+        db: Session = Depends(get_db)
+):
+    """
+    Return the number of (non-deleted) submissions per value of each facet,
+    optionally filtered by facet values. Each facet is counted over the
+    submissions matching the filters on the other facets.
+
+    Counts are read from summary tables that are kept up to date on every
+    write, so this does not scan the submissions.
+
+    Example:
+      GET /facets?province_id=3&funding_type=Grant
+    """
+    filters = {
+        facet: value for facet, value in (
+            ('intervention_type', intervention_type),
+            ('implementation_status', implementation_status),
+            ('mitigation_sector', mitigation_sector),
+            ('adaptation_sector', adaptation_sector),
+            ('funding_type', funding_type),
+            ('province_id', province_id),
+        ) if value is not None
+    }
+    province_names = {p["id"]: p["name"] for p in region_cache.data.province_names}
+    return FacetsModel(
+        total=facet_total(db, filters),
+        facets={
+            facet: [
+                FacetValueModel(
+                    value=value,
+                    name=province_names.get(value) if facet == 'province_id' else None,
+                    count=count,
+                )
+                for value, count in counts
+            ]
+            for facet, counts in facet_counts(db, filters).items()
+        },
+    )
+
+
+@router.get(
+    '/funding_rollup',
+    response_model=List[FundingRollupModel],
+    summary='Total and average funding by sector, start year, funder and/or intervention type'
+)
+def get_funding_rollup(
+        group_by: List[str] = Query(..., description=f"One or more of: {', '.join(FUNDING_DIMENSIONS)}"),
+        intervention_type: Optional[InterventionType] = None,
+        mitigation_sector: Optional[str] = None,
+        adaptation_sector: Optional[str] = None,
+        start_year: Optional[int] = None,
+        funding_organization: Optional[str] = None,
+        db: Session = Depends(get_db)
+):
+    """
+    Return the number of (non-deleted) submissions and the total and average
+    funding amount per combination of values of the `group_by` dimensions,
+    optionally filtered by dimension values. Averages are taken over the
+    submissions that have a funding amount.
+
+    Results are read from a precomputed rollup table that is kept up to date
+    on every write, so this does not scan the submissions.
+
+    Example:
+      GET /funding_rollup?group_by=mitigation_sector&group_by=start_year
+    """
+    if invalid := set(group_by) - set(FUNDING_DIMENSIONS):
+        raise HTTPException(status_code=400, detail=f"Invalid group_by dimension(s): {', '.join(sorted(invalid))}")
+
+    filters = {
+        dim: value for dim, value in (
+            ('intervention_type', intervention_type),
+            ('mitigation_sector', mitigation_sector),
+            ('adaptation_sector', adaptation_sector),
+            ('start_year', start_year),
+            ('funding_organization', funding_organization),
+        ) if value is not None
+    }
+    return funding_rollup(db, list(dict.fromkeys(group_by)), filters)
+
+
+def _submissions_intersecting(query, geometry, limit: int, offset: int) -> List[Submission]:
+    # the GiST index on the geo_location bounding box selects the candidates,
+    # which are then tested exactly against the search geometry; candidates
+    # are streamed until the requested page of matches has been found
+    minx, miny, maxx, maxy = geometry.bounds
+    shapely.prepare(geometry)
+    candidates = query.filter(Submission.geo_bbox_overlaps(minx, miny, maxx, maxy)). \
+        order_by(Submission._id). \
+        yield_per(SPATIAL_SEARCH_BATCH_SIZE)
+    matches = (
+        submission for submission in candidates
+        if (location := geo_location_geometry(submission.geo_location)) and geometry.intersects(location)
+    )
+    return list(islice(matches, offset, offset + limit))
+
+
+@router.get(
+    '/spatial_search',
+    response_model=List[SubmissionModel],
+    summary='List submissions within a bounding box and/or region'
+)
+def spatial_search_submissions(
+        bbox: Optional[str] = Query(None, title='Bounding box', description='minx,miny,maxx,maxy in degrees'),
+        province_id: Optional[int] = None,
+        district_id: Optional[int] = None,
+        local_district_id: Optional[int] = None,
+        limit: int = Query(100, ge=1, le=1000),
+        offset: int = Query(0, ge=0),
+        db: Session = Depends(get_db)
+):
+    """
+    Return the (non-deleted) submissions located within a bounding box, and/or
+    within the province, district or local district with the given FID, in
+    creation order. Use `limit` and `offset` to page through the results.
+
+    Example:
+      GET /spatial_search?bbox=29.5,-28.5,31,-27.5
+    """
+    if bbox is None and province_id is None and district_id is None and local_district_id is None:
+        raise HTTPException(status_code=400, detail="A bbox or region id must be provided.")
+
+    query = db.query(Submission).filter(Submission.deleted.isnot(True))
+    if province_id is not None:
+        query = query.filter(Submission.province_id == province_id)
+    if district_id is not None:
+        query = query.filter(Submission.district_id == district_id)
+    if local_district_id is not None:
+        query = query.filter(Submission.local_district_id == local_district_id)
+
+    if bbox is None:
+        return query.order_by(Submission._id).limit(limit).offset(offset).all()
+
+    try:
+        minx, miny, maxx, maxy = (float(v) for v in bbox.split(','))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="bbox must be of the form minx,miny,maxx,maxy.")
+    if minx > maxx or miny > maxy:
+        raise HTTPException(status_code=400, detail="Invalid bbox.")
+
+    return _submissions_intersecting(query, shapely.box(minx, miny, maxx, maxy), limit, offset)
+
+
+@router.post(
+    '/spatial_search',
+    response_model=List[SubmissionModel],
+    summary='List submissions within a GeoJSON polygon'
+)
+def spatial_search_submissions_in_polygon(
+        polygon: Dict = Body(..., example={
+            "type": "Polygon",
+            "coordinates": [[[29.5, -28.5], [31.0, -28.5], [31.0, -27.5], [29.5, -27.5], [29.5, -28.5]]]
+        }),
+        limit: int = Query(100, ge=1, le=1000),
+        offset: int = Query(0, ge=0),
+        db: Session = Depends(get_db)
+):
+    """
+    Return the (non-deleted) submissions located within a GeoJSON Polygon
+    or MultiPolygon, in creation order. Use `limit` and `offset` to page
+    through the results.
+    """
+    geometry = geo_location_geometry(polygon)
+    if geometry is None or geometry.geom_type not in ('Polygon', 'MultiPolygon'):
+        raise HTTPException(status_code=400, detail="A valid GeoJSON Polygon or MultiPolygon must be provided.")
+
+    query = db.query(Submission).filter(Submission.deleted.isnot(True))
+    return _submissions_intersecting(query, geometry, limit, offset)
+
+
+def _submission_response(submission: Submission) -> SubmissionResponse:
+    """Build the response for a submission, with its mitigation and/or
+    adaptation details attached according to its intervention type."""
+    response = SubmissionResponse.from_orm(submission)
+
+    # If intervention_measurement is set to an unexpected value,
+    # default to not adding any nested records.
+    intervention_type = submission.intervention_type
+    if not (intervention_type and intervention_type.has_mitigation):
+        response.mitigation = None
+    if not (intervention_type and intervention_type.has_adaptation):
+        response.adaptation = None
+
+    return response
+
+
+def _query_submissions_with_details(db: Session, *, eager_loader=selectinload):
+    return db.query(Submission).options(
+        eager_loader(Submission.mitigation),
+        eager_loader(Submission.adaptation),
+    )
 
 
 @router.get("/read_submission/{submission_uuid}",
             response_model=SubmissionResponse,
             dependencies=[Depends(Authorize(NCCRDScope.PROJECT_READ))],
             )
-def read_submission(submission_uuid: UUID, db: Session = Depends(get_db)):
-    # 1. Retrieve the submission using the auto-generated UUID.
-    submission = db.query(Submission).filter(Submission.id == submission_uuid).first()
+def read_submission(submission_uuid: UUID, request: Request, db: Session = Depends(get_db)):
+    # Check the client's cached copy, if any, against the submission's
+    # version only, before loading and serializing the record.
+    version = db.execute(
+        select(Submission.version).
+        where(Submission.id == submission_uuid)
+    ).scalar_one_or_none()
+    if version is None:
+        raise HTTPException(status_code=404, detail="Submission not found")
+
+    etag = version_etag(version)
+    check_not_modified(request, etag)
+
+    cache_key = ('read_submission', submission_uuid, etag)
+    content, generation = response_cache.get(cache_key)
+    if content is not None:
+        return Response(content, media_type='application/json', headers={'ETag': etag})
+
+    # Retrieve the submission together with its related records, in a single query.
+    submission = _query_submissions_with_details(db, eager_loader=joinedload).filter(
+        Submission.id == submission_uuid
+    ).first()
     if not submission:
         raise HTTPException(status_code=404, detail="Submission not found")
 
-    # 2. Retrieve related records.
-    mitigation = db.query(Mitigation).filter(Mitigation.submission_id == submission.id).first()
-    adaptation = db.query(Adaptaion).filter(Adaptaion.submission_id == submission.id).first()
-
-    # 3. Determine based on intervention_measurement which related data to attach.
-    # Normalize the intervention_measurement value.
-    im_value = submission.intervention_measurement.strip().lower() if submission.intervention_measurement else ""
-
-    print("Value:", im_value)
-    if im_value == "cross cutting":
-        # Both records are applicable.
-        submission.mitigation = mitigation
-        submission.adaptation = adaptation
-    elif im_value == "adaptation":
-        # Only adaptation data should be provided.
-        submission.mitigation = None
-        submission.adaptation = adaptation
-    elif im_value == "mitigation":
-        # Only mitigation data should be provided.
-        submission.mitigation = mitigation
-        submission.adaptation = None
-    else:
-        # If intervention_measurement is set to an unexpected value,
-        # default to not adding any nested records.
-        submission.mitigation = None
-        submission.adaptation = None
+    content = _submission_response(submission).json().encode()
+    response_cache.put(cache_key, content, {submission_uuid}, generation)
+    return Response(content, media_type='application/json', headers={'ETag': etag})
+
 
-    # 4. Return the submission with the nested related records.
-    return submission
+@router.post("/read_many",
+             response_model=List[SubmissionResponse],
+             dependencies=[Depends(Authorize(NCCRDScope.PROJECT_READ))],
+             summary="Read multiple submissions with their related records.",
+             )
+def read_submissions(submission_uuids: List[UUID] = Body(..., max_items=500), db: Session = Depends(get_db)):
+    """
+    Return the submissions with the given UUIDs, in the order requested,
+    with their mitigation and adaptation details. Unknown UUIDs are
+    omitted from the result. This takes a constant number of queries
+    regardless of the number of submissions.
+    """
+    submissions = {
+        submission.id: submission
+        for submission in _query_submissions_with_details(db).filter(Submission.id.in_(submission_uuids))
+    }
+    return [
+        _submission_response(submissions[submission_uuid])
+        for submission_uuid in dict.fromkeys(submission_uuids)
+        if submission_uuid in submissions
+    ]
 
 
 #######New Submission
@@ -119,7 +480,7 @@ def create_submission(submission: SubmissionCreate, db: Session = Depends(get_db
         issubmitted=True,
         platfrom=submission.platfrom,
         research=submission.research,
-        createdby='1',
+        createdby=1,
         createdate=datetime.utcnow(),
         # updatedate=submission.updatedate,
         # updatedby=submission.updatedby,
@@ -127,14 +488,15 @@ def create_submission(submission: SubmissionCreate, db: Session = Depends(get_db
         # deletedate=submission.deletedate,
         # deleted=submission.deleted,
     )
+    locate_submission(db_submission)
     db.add(db_submission)
     db.commit()
     db.refresh(db_submission)  # Now we have a valid submission UUID
 
-    im_value = submission.intervention_measurement.strip().lower()
+    intervention_type = db_submission.intervention_type
 
     # Create Mitigation record if needed.
-    if im_value in ("mitigation", "cross cutting"):
+    if intervention_type and intervention_type.has_mitigation:
         if not submission.mitigation_data:
             raise HTTPException(
                 status_code=400,
@@ -169,7 +531,7 @@ def create_submission(submission: SubmissionCreate, db: Session = Depends(get_db
         db.add(mitigation_record)
 
     # Create Adaptation record if needed.
-    if im_value in ("adaptation", "cross cutting"):
+    if intervention_type and intervention_type.has_adaptation:
         if not submission.adaptation_data:
             raise HTTPException(
                 status_code=400,
@@ -196,47 +558,210 @@ def create_submission(submission: SubmissionCreate, db: Session = Depends(get_db
     }
 
 
-@router.patch("/update_new_submission/{submission_uuid}")
+async def _bulk_payloads(request: Request):
+    """Yield the submission payloads of a bulk request body, which is either
+    a JSON array or (with content type application/x-ndjson) a stream of
+    newline-delimited JSON objects. Malformed items are yielded as
+    exceptions rather than raised.
+
+    A JSON array, and each NDJSON line, may be at most BULK_MAX_BYTES long.
+    """
+    if request.headers.get('content-type', '').startswith('application/x-ndjson'):
+        buffer = b''
+        async for chunk in request.stream():
+            buffer += chunk
+            *lines, buffer = buffer.split(b'\n')
+            if len(buffer) > BULK_MAX_BYTES:
+                raise HTTPException(
+                    status_code=HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                    detail=f"An NDJSON line exceeds the maximum size of {BULK_MAX_BYTES} bytes.",
+                )
+            for line in lines:
+                if line.strip():
+                    try:
+                        yield json.loads(line)
+                    except ValueError as e:
+                        yield e
+        if buffer.strip():
+            try:
+                yield json.loads(buffer)
+            except ValueError as e:
+                yield e
+    else:
+        body = bytearray()
+        async for chunk in request.stream():
+            body += chunk
+            if len(body) > BULK_MAX_BYTES:
+                raise HTTPException(
+                    status_code=HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                    detail=f"A JSON array body exceeds the maximum size of {BULK_MAX_BYTES} bytes; use NDJSON.",
+                )
+        try:
+            payloads = json.loads(body)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="The request body must be a JSON array or NDJSON.")
+        if not isinstance(payloads, list):
+            raise HTTPException(status_code=400, detail="The request body must be a JSON array or NDJSON.")
+        for payload in payloads:
+            yield payload
+
+
+def _insert_bulk_batch(db: Session, batch: List[tuple], results: List[dict]) -> None:
+    # batch is a list of (index, SubmissionCreate); insert them in one transaction
+    try:
+        submission_ids = insert_submissions(db, [submission for _, submission in batch])
+        db.commit()
+    except SQLAlchemyError:
+        db.rollback()
+        # don't report the database error, which may include SQL and parameters
+        logger.exception(f'Insert of a batch of {len(batch)} submissions failed')
+        results += [{"index": index, "error": "Batch insert failed."} for index, _ in batch]
+    else:
+        results += [{"index": index, "submission_id": str(submission_id)}
+                    for (index, _), submission_id in zip(batch, submission_ids)]
+
+
+@router.post("/bulk", summary="Create many submissions and related records.")
+async def create_submissions_bulk(request: Request, db: Session = Depends(get_db)):
+    """
+    Create submissions from a JSON array, or an NDJSON stream, of `SubmissionCreate`
+    payloads. Valid submissions are inserted in batches, using multi-row inserts in
+    one transaction per batch. The response reports, for each item (by its index in
+    the request), either the UUID of the new submission or the reason it was rejected.
+    A JSON array may be at most 20 MB; larger requests must be sent as NDJSON.
+    """
+    results = []
+    batch = []
+    index = 0
+    async for payload in _bulk_payloads(request):
+        try:
+            if isinstance(payload, Exception):
+                raise payload
+            submission = SubmissionCreate.parse_obj(payload)
+            if error := intervention_error(submission):
+                raise ValueError(error)
+            batch.append((index, submission))
+        except ValidationError as e:
+            results.append({"index": index, "error": e.errors()})
+        except ValueError as e:
+            results.append({"index": index, "error": str(e)})
+
+        index += 1
+        if len(batch) == BULK_BATCH_SIZE:
+            await run_in_threadpool(_insert_bulk_batch, db, batch, results)
+            batch = []
+
+    if batch:
+        await run_in_threadpool(_insert_bulk_batch, db, batch, results)
+
+    results.sort(key=lambda result: result["index"])
+    return {
+        "created": sum("submission_id" in result for result in results),
+        "failed": sum("error" in result for result in results),
+        "results": results,
+    }
+
+
+@router.get("/export", summary="Export all submissions as NDJSON, CSV, Parquet or Arrow.")
+def export_submissions(
+        format: ExportFormat = Query(ExportFormat.NDJSON),
+        include_deleted: bool = False,
+):
+    """
+    Export all submissions, with their mitigation and adaptation details
+    flattened into `mitigation_*` and `adaptation_*` columns.
+
+    NDJSON and CSV are streamed; rows are read from the database in
+    fixed-size batches through a server-side cursor.
+
+    Parquet and Arrow (IPC stream) exports are columnar, with categorical
+    columns dictionary-encoded, for loading into analysis tools. They are
+    built from the same batched reads, and the latest snapshot is cached
+    until the next change to a submission is committed by any API process.
+    Deleted submissions are not included in these formats.
+
+    Example:
+      GET /export?format=csv
+    """
+    if format in (ExportFormat.PARQUET, ExportFormat.ARROW):
+        return Response(
+            content=columnar_snapshots.get(format),
+            media_type='application/vnd.apache.parquet' if format == ExportFormat.PARQUET
+            else 'application/vnd.apache.arrow.stream',
+            headers={'Content-Disposition': f'attachment; filename="nccrd-submissions.{format.value}"'},
+        )
+
+    if format == ExportFormat.CSV:
+        content, media_type = stream_csv(include_deleted), 'text/csv'
+    else:
+        content, media_type = stream_ndjson(include_deleted), 'application/x-ndjson'
+
+    return StreamingResponse(
+        content,
+        media_type=media_type,
+        headers={'Content-Disposition': f'attachment; filename="nccrd-submissions.{format.value}"'},
+    )
+
+
+@router.patch("/update_new_submission/{submission_uuid}", response_model=SubmissionResponse)
 def update_submission(
         submission_uuid: UUID,
         update_data: SubmissionUpdate,
+        request: Request,
+        response: Response,
         db: Session = Depends(get_db)
 ):
-    # Retrieve the submission. If not found, return an error.
-    submission = db.query(Submission).filter(Submission.id == submission_uuid).first()
+    """
+    Update a submission and its related records.
+
+    The version of the submission being updated must be given, either as an
+    `If-Match` header (the ETag from `read_submission`) or as the `version`
+    field of the payload. If the submission has been changed since that
+    version, the update is rejected with 412 Precondition Failed.
+    """
+    if_match = request.headers.get('if-match')
+    if if_match is None and update_data.version is None:
+        raise HTTPException(status_code=428, detail="An If-Match header or version is required.")
+
+    # Retrieve the submission and its related records. If not found, return an error.
+    submission = _query_submissions_with_details(db).filter(Submission.id == submission_uuid).first()
     if not submission:
         raise HTTPException(status_code=404, detail="Submission not found")
 
+    if not (etag_matches(if_match, version_etag(submission.version)) if if_match is not None
+            else update_data.version == submission.version):
+        raise HTTPException(status_code=412, detail="The submission has been modified by another request.")
+
     # Prepare the update dictionary for the submission after excluding unset fields.
     data = update_data.dict(exclude_unset=True)
+    data.pop("version", None)
 
     # Extract nested update payloads (if any) and remove them from the main update dictionary.
     mitigation_update = data.pop("mitigation_data", None)
     adaptation_update = data.pop("adaptation_data", None)
 
-    # Determine the new intervention type.
-    # If the update payload provides a new intervention_measurement, use that; otherwise, keep the old type.
-    new_intervention = (
-        data.get("intervention_measurement", submission.intervention_measurement)
-        .strip()
-        .lower()
-    )
-
     # Update the primary submission fields.
     for key, value in data.items():
         setattr(submission, key, value)
+    submission.updatedate = datetime.utcnow()
+    if "geo_location" in data:
+        locate_submission(submission)
+
+    # The new intervention type: that of the new intervention_measurement, if
+    # the update payload provides one; otherwise, the old type.
+    new_intervention = submission.intervention_type
 
     # --- Handling Related Records Based on the New Intervention Type ---
     #
     # Option 1: new intervention is "mitigation" (only mitigation should exist)
-    if new_intervention == "mitigation":
+    if new_intervention == InterventionType.MITIGATION:
         # Remove adaptation record if it exists.
-        adaptation = db.query(Adaptaion).filter(Adaptaion.submission_id == submission.id).first()
+        adaptation = submission.adaptation
         if adaptation:
             db.delete(adaptation)
 
         # Process mitigation record.
-        mitigation = db.query(Mitigation).filter(Mitigation.submission_id == submission.id).first()
+        mitigation = submission.mitigation
         if mitigation_update is not None:
             if mitigation:
                 # Update the existing mitigation.
@@ -255,14 +780,14 @@ def update_submission(
             pass
 
     # Option 2: new intervention is "adaptation" (only adaptation should exist)
-    elif new_intervention == "adaptation":
+    elif new_intervention == InterventionType.ADAPTATION:
         # Remove mitigation record if it exists.
-        mitigation = db.query(Mitigation).filter(Mitigation.submission_id == submission.id).first()
+        mitigation = submission.mitigation
         if mitigation:
             db.delete(mitigation)
 
         # Process adaptation update.
-        adaptation = db.query(Adaptaion).filter(Adaptaion.submission_id == submission.id).first()
+        adaptation = submission.adaptation
         if adaptation_update is not None:
             if adaptation:
                 for key, value in adaptation_update.items():
@@ -277,10 +802,10 @@ def update_submission(
             pass
 
     # Option 3: new intervention is "cross cutting" (both records should exist)
-    elif new_intervention == "cross cutting":
+    elif new_intervention == InterventionType.CROSS_CUTTING:
         # Process mitigation data if provided.
         if mitigation_update is not None:
-            mitigation = db.query(Mitigation).filter(Mitigation.submission_id == submission.id).first()
+            mitigation = submission.mitigation
             if mitigation:
                 for key, value in mitigation_update.items():
                     setattr(mitigation, key, value)
@@ -292,7 +817,7 @@ def update_submission(
                 db.add(new_mitigation)
         # Process adaptation data if provided.
         if adaptation_update is not None:
-            adaptation = db.query(Adaptaion).filter(Adaptaion.submission_id == submission.id).first()
+            adaptation = submission.adaptation
             if adaptation:
                 for key, value in adaptation_update.items():
                     setattr(adaptation, key, value)
@@ -307,10 +832,17 @@ def update_submission(
         # or raise an error.
         raise HTTPException(status_code=400, detail="Invalid intervention_measurement type provided.")
 
-    # Commit all changes to the database.
-    db.commit()
+    # Commit all changes to the database. The submission is updated on condition
+    # that its version is still the one read above, so a concurrent update fails
+    # here rather than being silently overwritten.
+    try:
+        db.commit()
+    except StaleDataError:
+        db.rollback()
+        raise HTTPException(status_code=412, detail="The submission has been modified by another request.")
     db.refresh(submission)
-    return submission
+    response.headers['ETag'] = version_etag(submission.version)
+    return _submission_response(submission)
 
 
 @router.delete("/delete/{submission_uuid}")
@@ -327,236 +859,118 @@ def soft_delete_submission(submission_uuid: UUID, db: Session = Depends(get_db))
     return {"detail": "Submission marked as deleted."}
 
 
+def _workbook_template(name: str, version: Optional[int]) -> WorkbookTemplate:
+    try:
+        return get_template(name, version)
+    except KeyError:
+        if version is None:
+            raise HTTPException(status_code=400, detail=f"Unknown template: {name}")
+        raise HTTPException(status_code=400, detail=f"Unknown version {version} of template: {name}")
+
+
 @router.post("/create_submission_upload-xlsx/")
-async def create_submission_upload_xlsm(file: UploadFile = File(...), db: Session = Depends(get_db)):
+async def create_submission_upload_xlsm(
+        file: UploadFile = File(...),
+        template_version: Optional[int] = Query(None, title='Template version; defaults to the latest'),
+        db: Session = Depends(get_db)
+):
+    """
+    Create a submission from the general project details of an uploaded
+    (macro-enabled) workbook. The workbook is parsed in a worker process;
+    the response reports its size, parse time and peak parse memory use.
+    """
+    template = _workbook_template(PROJECT_DETAILS, template_version)
     try:
-        contents = await file.read()  # Read file as bytes
-        wb = load_workbook(BytesIO(contents), keep_vba=True)  # Load workbook with macros
-
-        sheet = wb['General project details']
-        submission_data = {}
-        for row in sheet.iter_rows(values_only=True):
-            title = row[0]
-            field_value = next((value for value in row[1:] if value is not None), None)
-            if field_value is not None:
-                # Mapping the data
-
-                if title == 'Title':
-                    submission_data['title'] = field_value
-                elif title == 'Indicate the type of measure':
-                    submission_data['intervention_measurement'] = field_value
-                elif title == 'Description':
-                    submission_data['description'] = field_value
-                elif title == 'Implementation status':
-                    submission_data['implementation_status'] = field_value
-                elif title == 'Implementing organization':
-                    submission_data['implementation_organization'] = field_value
-                elif title == 'Other implementing partners':
-                    submission_data['implementation_partners_other'] = field_value
-                elif title == 'Start year':
-                    submission_data['start_date'] = field_value
-                elif title == 'End year':
-                    submission_data['end_date'] = field_value
-                elif title == 'Link to project website':
-                    submission_data['link'] = field_value
-                elif title == 'Funding organization':
-                    submission_data['funding_organization'] = field_value
-                elif title == 'Type of funding':
-                    submission_data['funding_type'] = field_value
-                    # elif title == 'Type of funding (other)':
-                    #     submission_data['funding_type_other'] = field_value
-                elif title == 'Actual budget':
-                    submission_data['funding_amount'] = float(field_value)
-                elif title == 'Estimated budget range':
-                    submission_data['estimated_budget_cost'] = field_value
-                elif title == 'Name':
-                    submission_data['project_manager_name'] = field_value
-                elif title == 'Company/organization':
-                    submission_data['project_manager_organization'] = field_value
-                elif title == 'Position':
-                    submission_data['project_manager_position'] = field_value
-                elif title == 'Email address':
-                    submission_data['project_manager_email'] = field_value
-                elif title == 'Mobile number':
-                    submission_data['project_manager_mobile'] = field_value
-                # Continue for other relevant fields...
-
-                # Optionally, add geo_location data if provided
-        submission_data['geo_location'] = {
-            "type": "Point",
-            "coordinates": [30.374, -27.936]  # You can replace this with actual coordinates if available
-        }
-        print("submission data:", submission_data)
+        submission_data, stats = await parse_upload(template, file)
         # Convert extracted data into SubmissionCreate model
         submission_create = SubmissionCreate(**submission_data)
-        print(submission_create)
         # Call the create_submission function
-        data = create_submission(submission_create, db)
-        return {"Submission Created": data}
+        data = await run_in_threadpool(create_submission, submission_create, db)
+        return {"Submission Created": data, "upload": stats}
 
     except Exception as e:
+        if isinstance(e, HTTPException) and e.status_code == HTTP_413_REQUEST_ENTITY_TOO_LARGE:
+            raise
         return {"error": str(e)}
 
 
 @router.post("/create_submission_upload-test-xlsx/")
-async def create_submission_upload_test_xlsx(file: UploadFile = File(...), db: Session = Depends(get_db)):
+async def create_submission_upload_test_xlsx(
+        file: UploadFile = File(...),
+        template_version: Optional[int] = Query(None, title='Template version; defaults to the latest'),
+        db: Session = Depends(get_db)
+):
+    """
+    Create a submission from an uploaded, filled NCCRD template. The workbook
+    is parsed in a worker process; the response reports its size, parse time
+    and peak parse memory use.
+    """
+    template = _workbook_template(NCCRD_TEMPLATE, template_version)
     try:
-        contents = await file.read()
-        wb = load_workbook(BytesIO(contents), keep_vba=True, read_only=True, data_only=True)
-
-        # === Step 1: General Project Details ===
-        sheet = wb['General project details']
-        submission_data = {}
-        for row in sheet.iter_rows(values_only=True):
-            title = row[0]
-            value = next((v for v in row[1:] if v is not None), None)
-            if value is not None and title:
-                title = str(title).strip()
-                if title == 'Title':
-                    submission_data['title'] = value
-                elif title == 'Indicate the type of measure':
-                    val = value.lower()
-                    if "mitigation" in val:
-                        submission_data['intervention_measurement'] = "Mitigation"
-                    elif "adaptation" in val:
-                        submission_data['intervention_measurement'] = "Adaptation"
-                    elif "cross" in val:
-                        submission_data['intervention_measurement'] = "Cross Cutting"
-                elif title == 'Description':
-                    submission_data['description'] = value
-                elif title == 'Implementation status':
-                    submission_data['implementation_status'] = value
-                elif title == 'Implementing organization':
-                    submission_data['implementation_organization'] = value
-                elif title == 'Other implementing partners':
-                    submission_data['implementation_partners_other'] = value
-                elif title == 'Start year':
-                    submission_data['start_date'] = value
-                elif title == 'End year':
-                    submission_data['end_date'] = value
-                elif title == 'Link to project website':
-                    submission_data['link'] = value
-                elif title == 'Funding organization':
-                    submission_data['funding_organization'] = value
-                elif title == 'Type of funding':
-                    submission_data['funding_type'] = value
-                elif title == 'Actual budget':
-                    submission_data['funding_amount'] = float(value)
-                elif title == 'Estimated budget range':
-                    submission_data['estimated_budget_cost'] = value
-                elif title == 'Name':
-                    submission_data['project_manager_name'] = value
-                elif title == 'Company/organization':
-                    submission_data['project_manager_organization'] = value
-                elif title == 'Position':
-                    submission_data['project_manager_position'] = value
-                elif title == 'Email address':
-                    submission_data['project_manager_email'] = value
-                elif title == 'Mobile number':
-                    submission_data['project_manager_mobile'] = value
-
-        submission_data['geo_location'] = {
-            "type": "Point",
-            "coordinates": [30.374, -27.936]  # Replace with real values if needed
-        }
-
-        im_type = submission_data.get("intervention_measurement", "").lower()
-
-        # === Step 2: Adaptation ===
-        if im_type in ("adaptation", "cross cutting"):
-            adap_sheet = wb["Adaptation details"]
-            adaptation_fields = {}
-            for row in adap_sheet.iter_rows(values_only=True):
-                label = str(row[0]).strip() if row[0] else None
-                value = next((v for v in row[1:] if v is not None), None)
-                if label and value:
-                    if label == "Adaptation sector":
-                        adaptation_fields["sector"] = value
-                    elif label == "National policy":
-                        adaptation_fields["national_policy"] = value
-                    elif label == "Overall adaptation intervention goal":
-                        adaptation_fields["intervention_goal"] = value
-                    elif label == "Provincial / municipal policy / framework":
-                        adaptation_fields["provincial_municipal"] = value
-                    elif label == "Hazard":
-                        adaptation_fields["hazard"] = value
-                    elif label == "Progress calculator / explanation":
-                        adaptation_fields["progress_calculator"] = value
-                    elif label == "Observed and projected climate change impacts":
-                        adaptation_fields["climate_impact"] = value
-                    elif label == "How the intervention addresses the climate impact":
-                        adaptation_fields["address_climate_impact"] = value
-                    elif label == "Adaptation impact response":
-                        adaptation_fields["impact_response"] = value
-
-            if "sector" not in adaptation_fields:
-                raise HTTPException(status_code=400, detail="Adaptation sector is required.")
-            submission_data["adaptation_data"] = AdaptationResponse(**adaptation_fields)
-
-        # === Step 3: Mitigation ===
-        if im_type in ("mitigation", "cross cutting"):
-            mit_sheet = wb["Mitigation details"]
-            mitigation_fields = {}
-            for row in mit_sheet.iter_rows(values_only=True):
-                label = str(row[0]).strip() if row[0] else None
-                value = next((v for v in row[1:] if v is not None), None)
-                if label and value is not None:
-                    if label == "Mitigation sector":
-                        mitigation_fields["sector"] = value
-                    elif label == "Subsector":
-                        mitigation_fields["subsector"] = value
-                    elif label == "Secondary sector":
-                        mitigation_fields["secondary"] = value
-                    elif label == "Project type":
-                        mitigation_fields["project_type"] = value
-                    elif label == "Project subtype":
-                        mitigation_fields["project_subtype"] = value
-                    elif label == "Mitigation programme":
-                        mitigation_fields["mitigation_program"] = value
-                    elif label == "National policy":
-                        mitigation_fields["national_policy"] = value
-                    elif label == "Provincial / municipal policy / framework":
-                        mitigation_fields["provincial_municipal"] = value
-                    elif label == "Primary intended mitigation outcome":
-                        mitigation_fields["primary_intended_outcome"] = value
-                    elif label == "Progress calculator / explanation":
-                        mitigation_fields["progress_calculator"] = value
-                    elif label == "Environmental co-benefit":
-                        mitigation_fields["enviromental_co_benefit"] = value
-                    elif label == "Environmental co-benefit description":
-                        mitigation_fields["enviromental_co_benefit_description"] = value
-                    elif label == "Social co-benefit":
-                        mitigation_fields["social_co_benefit"] = value
-                    elif label == "Social co-benefit description":
-                        mitigation_fields["social_co_benefit_description"] = value
-                    elif label == "Economic co-benefit":
-                        mitigation_fields["economic_co_benefit"] = value
-                    elif label == "Economic co-benefit description":
-                        mitigation_fields["economic_co_benefit_description"] = value
-                    elif label == "Are carbon credits issued?":
-                        mitigation_fields["carbon_credit"] = value in ["Yes", "yes", "TRUE", True]
-                    elif label == "CDM / Voluntary":
-                        mitigation_fields["cdm_voluntary"] = value
-                    elif label == "CDM Executive Board status":
-                        mitigation_fields["cdm_executive_board_status"] = value
-                    elif label == "CDM methodology":
-                        mitigation_fields["cdm_methodology"] = value
-                    elif label == "Organisation issuing carbon credits":
-                        mitigation_fields["organization_issuing_credits"] = value
-                    elif label == "Voluntary methodology":
-                        mitigation_fields["voluntary_methodology"] = value
-                    elif label == "CDM project number":
-                        mitigation_fields["cdm_project_number"] = value
-
-            if "sector" not in mitigation_fields:
-                raise HTTPException(status_code=400, detail="Mitigation sector is required.")
-            submission_data["mitigation_data"] = MitigationResponse(**mitigation_fields)
-
-        # === Step 4: Submit to DB ===
+        submission_data, stats = await parse_upload(template, file)
         submission_create = SubmissionCreate(**submission_data)
-        data = create_submission(submission_create, db)
-        return {"Submission Created": data}
+        data = await run_in_threadpool(create_submission, submission_create, db)
+        return {"Submission Created": data, "upload": stats}
 
     except Exception as e:
+        if isinstance(e, HTTPException) and e.status_code == HTTP_413_REQUEST_ENTITY_TOO_LARGE:
+            raise
         traceback.print_exc()
         return {"error": str(e)}
+
+
+@router.post("/upload_batch", summary="Create submissions from many filled templates.")
+async def create_submissions_upload_batch(
+        files: List[UploadFile] = File(...),
+        template_version: Optional[int] = Query(None, title='Template version; defaults to the latest'),
+        db: Session = Depends(get_db)
+):
+    """
+    Create submissions from filled NCCRD templates, uploaded as any number of
+    workbook files and/or zip archives of workbooks. The workbooks are parsed
+    in parallel in worker processes and validated, and the valid ones are
+    inserted together in one transaction. The response reports, for each
+    workbook, either the UUID of the new submission or the reason it was
+    rejected, together with its parse time and peak parse memory use.
+    """
+    template = _workbook_template(NCCRD_TEMPLATE, template_version)
+    with tempfile.TemporaryDirectory(prefix='nccrd-batch-') as directory:
+        workbooks = await spool_batch(files, directory)
+        parsed = await asyncio.gather(*(
+            parse_workbook_file(template, workbook.path)
+            for workbook in workbooks if workbook.path
+        ), return_exceptions=True)
+
+    results = []
+    batch = []
+    parsed = iter(parsed)
+    for index, workbook in enumerate(workbooks):
+        result = {"index": index, "file": workbook.name}
+        try:
+            if workbook.error:
+                raise ValueError(workbook.error)
+            if isinstance(outcome := next(parsed), Exception):
+                raise ValueError(f"Could not read the workbook: {outcome}")
+            submission_data, result["upload"] = outcome
+            submission = SubmissionCreate.parse_obj(submission_data)
+            if error := intervention_error(submission):
+                raise ValueError(error)
+            batch.append((index, submission))
+        except ValidationError as e:
+            results.append(dict(result, error=e.errors()))
+        except ValueError as e:
+            results.append(dict(result, error=str(e)))
+        else:
+            results.append(result)
+
+    inserted = []
+    if batch:
+        await run_in_threadpool(_insert_bulk_batch, db, batch, inserted)
+    for outcome in inserted:
+        results[outcome["index"]].update(outcome)
+
+    return {
+        "created": sum("submission_id" in result for result in results),
+        "failed": sum("error" in result for result in results),
+        "results": results,
+    }
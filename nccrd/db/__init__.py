@@ -1,33 +1,90 @@
-from fileinput import close
+from pydantic import BaseSettings
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import declarative_base, scoped_session, sessionmaker
 
 from nccrd.config import nccrd_config
+from nccrd.db.pool import PoolMetrics, TimedAsyncAdaptedQueuePool, TimedQueuePool
 
 
+
+class PoolSettings(BaseSettings):
+    """Connection pool settings, from NCCRD_DB_POOL_SIZE etc. These are
+    not part of the ODP config; the defaults are those of SQLAlchemy."""
+    POOL_SIZE: int = 5
+    MAX_OVERFLOW: int = 10
+    POOL_TIMEOUT: float = 30
+    POOL_RECYCLE: int = -1
+    POOL_PRE_PING: bool = False
+
+    class Config:
+        env_prefix = 'NCCRD_DB_'
+        env_file = '.env'
+
+
+pool_settings = PoolSettings()
+
+_pool_options = dict(
+    pool_size=pool_settings.POOL_SIZE,
+    max_overflow=pool_settings.MAX_OVERFLOW,
+    pool_timeout=pool_settings.POOL_TIMEOUT,
+    pool_recycle=pool_settings.POOL_RECYCLE,
+    pool_pre_ping=pool_settings.POOL_PRE_PING,
+)
+
 engine = create_engine(
     nccrd_config.NCCRD.DB.URL,
     echo=nccrd_config.NCCRD.DB.ECHO,
     isolation_level=nccrd_config.NCCRD.DB.ISOLATION_LEVEL,
     future=True,
+    poolclass=TimedQueuePool,
+    **_pool_options,
 )
 
-Session = scoped_session(
-    sessionmaker(
-        bind=engine,
-        autocommit=False,
-        autoflush=False,
-        future=True,
-    )
+SessionFactory = sessionmaker(
+    bind=engine,
+    autocommit=False,
+    autoflush=False,
+    future=True,
 )
 
+# Thread-local session, for use outside of API requests
+Session = scoped_session(SessionFactory)
+
+# Async engine and session factory, for use by async route handlers; this
+# connects to the same database as `engine`, using the asyncpg driver
+async_engine = create_async_engine(
+    make_url(nccrd_config.NCCRD.DB.URL).set(drivername='postgresql+asyncpg'),
+    echo=nccrd_config.NCCRD.DB.ECHO,
+    isolation_level=nccrd_config.NCCRD.DB.ISOLATION_LEVEL,
+    poolclass=TimedAsyncAdaptedQueuePool,
+    **_pool_options,
+)
+
+async_session = async_sessionmaker(
+    bind=async_engine,
+    autoflush=False,
+    expire_on_commit=False,
+)
+
+pool_metrics = PoolMetrics(engine)
+async_pool_metrics = PoolMetrics(async_engine.sync_engine)
+
 
 def get_db():
-    db = Session()
-    try:
-        yield  db
-    finally:
-        close()
+    """Provide a session for the duration of an API request. The session
+    is closed when the request completes, rolling back anything that was
+    not committed and returning its connection to the pool."""
+    with SessionFactory() as db:
+        yield db
+
+
+async def get_async_db():
+    """Provide an async session for the duration of an API request."""
+    async with async_session() as db:
+        yield db
+
 
 class _Base:
     __table_args__ = {"schema": "nccrd"}
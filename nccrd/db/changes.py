@@ -0,0 +1,96 @@
+"""Notification of changes to submissions.
+
+Changes made through the ORM to submissions and their mitigation and
+adaptation records are collected from each flush. Changes made with Core
+statements (e.g. bulk inserts) must be reported with
+:func:`mark_submissions_changed`.
+
+The ids of the affected submissions are passed to two kinds of hooks:
+
+- transaction hooks, registered with :func:`before_submissions_commit`,
+  run inside the transaction just before it commits, and may write to
+  the database (e.g. to maintain derived columns or tables)
+- listeners, registered with :func:`on_submissions_committed`, are called
+  after the transaction has committed (e.g. to invalidate caches); they
+  are called within this process only
+"""
+import logging
+from itertools import chain
+from typing import Callable, Iterable, List, Set
+from uuid import UUID
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from nccrd.db.models import Adaptaion, Mitigation, Submission
+
+logger = logging.getLogger(__name__)
+
+SubmissionListener = Callable[[Set[UUID]], None]
+TransactionHook = Callable[[Session, Set[UUID]], None]
+
+_INFO_KEY = 'nccrd_changed_submissions'
+_listeners: List[SubmissionListener] = []
+_transaction_hooks: List[TransactionHook] = []
+
+
+def before_submissions_commit(hook: TransactionHook) -> TransactionHook:
+    """Register a hook to be called, within the transaction, with the
+    session and the set of ids of the submissions changed by the
+    transaction, just before it commits. May be used as a decorator."""
+    _transaction_hooks.append(hook)
+    return hook
+
+
+def on_submissions_committed(listener: SubmissionListener) -> SubmissionListener:
+    """Register a listener to be called with the set of ids of the
+    submissions affected by each committed transaction. May be used
+    as a decorator."""
+    _listeners.append(listener)
+    return listener
+
+
+def mark_submissions_changed(session: Session, submission_ids: Iterable[UUID]) -> None:
+    """Record that the current transaction of `session` has changed the
+    given submissions."""
+    session.info.setdefault(_INFO_KEY, set()).update(submission_ids)
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_changes(session, flush_context):
+    changed = set()
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, Submission):
+            changed.add(obj.id)
+        elif isinstance(obj, (Mitigation, Adaptaion)):
+            changed.add(obj.submission_id)
+    changed.discard(None)
+    if changed:
+        mark_submissions_changed(session, changed)
+
+
+@event.listens_for(Session, 'before_commit')
+def _run_transaction_hooks(session):
+    if not _transaction_hooks:
+        return
+    # before_commit precedes the final flush, so flush
+    # now in order to collect all pending changes
+    session.flush()
+    if changed := session.info.get(_INFO_KEY):
+        for hook in _transaction_hooks:
+            hook(session, changed)
+
+
+@event.listens_for(Session, 'after_commit')
+def _notify_changes(session):
+    if changed := session.info.pop(_INFO_KEY, None):
+        for listener in _listeners:
+            try:
+                listener(changed)
+            except Exception:
+                logger.exception(f'Error in submission change listener {listener!r}')
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changes(session):
+    session.info.pop(_INFO_KEY, None)
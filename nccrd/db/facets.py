@@ -0,0 +1,125 @@
+"""Faceted counts of submissions.
+
+The facet values of every non-deleted submission are recorded in the
+`submission_facets` table, and the number of submissions per combination
+of facet values in the `facet_count` table. Both are updated within the
+transaction of any change to a submission or its mitigation / adaptation
+records, by the difference between the previously recorded and the
+current facet values of the changed submissions only. Facet counts, with
+or without filters, are then sums over the (small) `facet_count` table.
+See nccrd.db.summary.
+"""
+from collections import Counter
+from typing import Dict, Iterable, List
+from uuid import UUID
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.orm import Session
+
+from nccrd.db.changes import before_submissions_commit
+from nccrd.db.models import Adaptaion, FacetCount, Mitigation, Submission, SubmissionFacets
+from nccrd.db.summary import (
+    NO_NUMBER, NO_VALUE, add_deltas, decode_value, encode_value, first_sector, intervention_type,
+    replace_submission_rows,
+)
+
+FACETS = (
+    'intervention_type',
+    'implementation_status',
+    'mitigation_sector',
+    'adaptation_sector',
+    'funding_type',
+    'province_id',
+)
+
+
+def _facet_values_query():
+    return select(
+        Submission.id.label('submission_id'),
+        intervention_type().label('intervention_type'),
+        func.coalesce(Submission.implementation_status, NO_VALUE).label('implementation_status'),
+        func.coalesce(first_sector(Mitigation), NO_VALUE).label('mitigation_sector'),
+        func.coalesce(first_sector(Adaptaion), NO_VALUE).label('adaptation_sector'),
+        func.coalesce(Submission.funding_type, NO_VALUE).label('funding_type'),
+        func.coalesce(Submission.province_id, NO_NUMBER).label('province_id'),
+    ).where(Submission.deleted.isnot(True))
+
+
+def _key(row) -> tuple:
+    return tuple(getattr(row, facet) for facet in FACETS)
+
+
+def refresh_facets(db, submission_ids: Iterable[UUID]) -> None:
+    """Bring the facet tables up to date for the given submissions.
+
+    :param db: a session or connection
+    """
+    old_rows, new_rows = replace_submission_rows(
+        db, SubmissionFacets, _facet_values_query(), submission_ids, FACETS
+    )
+    deltas = Counter(_key(row) for row in new_rows)
+    deltas.subtract(_key(row) for row in old_rows)
+    add_deltas(db, FacetCount, FACETS, {
+        key: {'count': delta} for key, delta in deltas.items() if delta
+    }, 'count')
+
+
+def rebuild_facets(db) -> None:
+    """Recompute the facet tables from scratch.
+
+    :param db: a session or connection
+    """
+    db.execute(delete(FacetCount))
+    db.execute(delete(SubmissionFacets))
+    values = _facet_values_query().subquery()
+    db.execute(insert(SubmissionFacets).from_select(values.c.keys(), select(values)))
+    facet_cols = [getattr(SubmissionFacets, facet) for facet in FACETS]
+    db.execute(insert(FacetCount).from_select(
+        FACETS + ('count',),
+        select(*facet_cols, func.count()).group_by(*facet_cols),
+    ))
+
+
+@before_submissions_commit
+def _refresh_changed(session: Session, submission_ids) -> None:
+    refresh_facets(session, submission_ids)
+
+
+def facet_counts(db: Session, filters: Dict[str, object]) -> Dict[str, List[tuple]]:
+    """Return the counts of non-deleted submissions per value of each facet,
+    as lists of (value, count) sorted by descending count. Missing values
+    are reported as None.
+
+    Each facet is counted over the submissions matching the filters on all
+    the other facets, so that the alternatives to a selected value remain
+    visible.
+
+    :param filters: facet values to filter by, keyed by facet name; an
+        intervention type is given as an InterventionType
+    """
+    result = {}
+    for facet in FACETS:
+        col = getattr(FacetCount, facet)
+        rows = db.execute(
+            select(col, func.sum(FacetCount.count)).
+            where(*_conditions(filters, exclude=facet)).
+            group_by(col).
+            order_by(func.sum(FacetCount.count).desc(), col)
+        ).all()
+        result[facet] = [(decode_value(facet, value), int(count)) for value, count in rows]
+    return result
+
+
+def facet_total(db: Session, filters: Dict[str, object]) -> int:
+    """Return the number of non-deleted submissions matching all the filters."""
+    return int(db.execute(
+        select(func.coalesce(func.sum(FacetCount.count), 0)).
+        where(*_conditions(filters))
+    ).scalar_one())
+
+
+def _conditions(filters: Dict[str, object], exclude: str = None) -> list:
+    return [
+        getattr(FacetCount, facet) == encode_value(facet, value)
+        for facet, value in filters.items() if facet != exclude
+    ]
@@ -0,0 +1,56 @@
+"""The managed set of database indexes.
+
+All indexes declared on the ORM tables are managed: :func:`ensure_indexes`
+creates any that are missing, and :func:`missing_indexes` reports them.
+`create_all` only creates indexes together with their tables, so this is
+needed both for existing databases and for the region tables, which are
+dropped and recreated whenever the region data is reloaded.
+"""
+import logging
+from typing import Iterable, List
+
+from sqlalchemy import Index, Table, inspect
+
+from nccrd.db import Base, engine
+
+logger = logging.getLogger(__name__)
+
+
+def managed_indexes(tables: Iterable[Table] = None) -> List[Index]:
+    """Return the indexes declared on the given tables, or on all tables."""
+    if tables is None:
+        tables = Base.metadata.sorted_tables
+    return [index for table in tables for index in sorted(table.indexes, key=lambda index: index.name)]
+
+
+def missing_indexes(connection, tables: Iterable[Table] = None) -> List[Index]:
+    """Return the managed indexes that do not exist in the database."""
+    inspector = inspect(connection)
+    existing = {}
+    missing = []
+    for index in managed_indexes(tables):
+        table = index.table
+        if table.key not in existing:
+            existing[table.key] = {
+                i['name'] for i in inspector.get_indexes(table.name, schema=table.schema)
+            } if inspector.has_table(table.name, schema=table.schema) else None
+        if existing[table.key] is not None and index.name not in existing[table.key]:
+            missing.append(index)
+    return missing
+
+
+def ensure_indexes(connection, tables: Iterable[Table] = None) -> None:
+    """Create any missing managed indexes on the given tables, or on all tables."""
+    for index in missing_indexes(connection, tables):
+        index.create(connection)
+        logger.info(f'Created index {index.name}.')
+
+
+def check_indexes() -> None:
+    """Log a warning listing any missing managed indexes."""
+    with engine.connect() as connection:
+        if missing := missing_indexes(connection):
+            logger.warning(
+                'Missing database indexes: ' +
+                ', '.join(f'{index.name} on {index.table.fullname}' for index in missing)
+            )
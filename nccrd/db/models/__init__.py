@@ -1,2 +1,4 @@
-from .submission import Submission,Adaptaion,Mitigation
-from .region import Country, Province, District, LocalDistrict
\ No newline at end of file
+from .submission import Submission,Adaptaion,Mitigation,InterventionType
+from .region import Country, Province, District, LocalDistrict
+from .summary import SubmissionFacets, FacetCount, SubmissionFunding, FundingRollup
+from .version import DataVersion
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime
+from sqlalchemy import Column, Integer, String, Float, DateTime, Index
 from nccrd.db import Base
 
 class Province(Base):
@@ -29,6 +29,10 @@ class District(Base):
     CATEGORY = Column(String)
     geometry = Column(String)
 
+# Region filter columns; these tables are replaced on reload
+# (see migrate/systemdata.py), which recreates the indexes
+Index('ix_district_province', District.PROVINCE)
+
 class LocalDistrict(Base):
     __tablename__ = "local_district"
     __table_args__ = {"schema": "nccrd"}
@@ -47,6 +51,9 @@ class LocalDistrict(Base):
     DATE = Column(Integer)
     geometry = Column(String)
 
+Index('ix_local_district_district', LocalDistrict.DISTRICT)
+Index('ix_local_district_province', LocalDistrict.PROVINCE)
+
 class Country(Base):
     __tablename__ = "country"
     __table_args__ = {"schema": "nccrd"}
@@ -1,8 +1,12 @@
-from sqlalchemy import Column, Integer, String, JSON,DateTime,Float,Boolean,ForeignKey
+from sqlalchemy import Column, Integer, String, JSON,DateTime,Float,Boolean,ForeignKey,Index,func,Enum
+from sqlalchemy.orm import relationship, validates
 from nccrd.db import Base
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.dialects.postgresql import TSVECTOR, UUID
 import uuid
 
+from nccrd.lib.intervention import InterventionType
+
+
 class Submission(Base):
 
     __tablename__ = "submission"
@@ -13,6 +17,8 @@ class Submission(Base):
     # Project Overview
     title = Column(String)
     intervention_measurement = Column(String)
+    # Derived from intervention_measurement; see set_intervention_type
+    intervention_type = Column(Enum(InterventionType, native_enum=False, length=16), index=True)
     description = Column(String)
     implementation_status = Column(String)
     implementation_organization = Column(String)
@@ -30,6 +36,16 @@ class Submission(Base):
 
     # Geographic location(s)
     geo_location = Column(JSON)
+    # Regions containing the geo_location, as assigned by reverse geocoding;
+    # these refer to the FIDs of the province, district and local_district tables
+    province_id = Column(Integer, index=True)
+    district_id = Column(Integer, index=True)
+    local_district_id = Column(Integer, index=True)
+    # Bounding box of the geo_location, for indexed spatial search
+    geo_xmin = Column(Float)
+    geo_ymin = Column(Float)
+    geo_xmax = Column(Float)
+    geo_ymax = Column(Float)
 
     # Project Manager
     project_manager_name = Column(String)
@@ -56,6 +72,41 @@ class Submission(Base):
     deletedby = Column(Integer)
     deletedate = Column(DateTime)
     deleted = Column(Boolean)
+    # Incremented on every update; updates are conditional on the version
+    # that was read (optimistic concurrency control)
+    version = Column(Integer, nullable=False, server_default='1')
+    __mapper_args__ = {"version_id_col": version}
+
+    # Full-text search document; maintained by nccrd.db.search
+    search_vector = Column(TSVECTOR)
+
+    # Related intervention details; at most one of each per submission
+    mitigation = relationship('Mitigation', uselist=False)
+    adaptation = relationship('Adaptaion', uselist=False)
+
+    @validates('intervention_measurement')
+    def set_intervention_type(self, key, value):
+        self.intervention_type = InterventionType.parse(value)
+        return value
+
+    @classmethod
+    def geo_bbox(cls):
+        """SQL expression for the geo_location bounding box, as a postgres
+        `box`; this matches the expression of the GiST bounding box index."""
+        return func.box(func.point(cls.geo_xmin, cls.geo_ymin), func.point(cls.geo_xmax, cls.geo_ymax))
+
+    @classmethod
+    def geo_bbox_overlaps(cls, minx, miny, maxx, maxy):
+        """SQL expression that is true if the geo_location bounding box
+        overlaps the given box."""
+        return cls.geo_bbox().op('&&')(func.box(func.point(minx, miny), func.point(maxx, maxy)))
+
+
+Index('ix_submission_geo_bbox', Submission.geo_bbox(), postgresql_using='gist')
+Index('ix_submission_search_vector', Submission.search_vector, postgresql_using='gin')
+# Searches and exports are over non-deleted submissions only
+Index('ix_submission_not_deleted', Submission._id, postgresql_where=Submission.deleted.isnot(True))
+
 
 class Adaptaion(Base):
     __tablename__ = "adaptaion"
@@ -81,6 +132,9 @@ class Adaptaion(Base):
     #progress reports
 
 
+Index('ix_adaptaion_submission_id', Adaptaion.submission_id)
+
+
 class Mitigation(Base):
     __tablename__ = "mitigation"
     __table_args__ = {"schema": "nccrd"}
@@ -122,4 +176,7 @@ class Mitigation(Base):
     cdm_methodology = Column(String)
     organization_issuing_credits =  Column(String)
     voluntary_methodology = Column(String)
-    cdm_project_number = Column(String)
\ No newline at end of file
+    cdm_project_number = Column(String)
+
+
+Index('ix_mitigation_submission_id', Mitigation.submission_id)
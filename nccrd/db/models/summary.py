@@ -0,0 +1,69 @@
+from sqlalchemy import Column, Float, Integer, String
+from sqlalchemy.dialects.postgresql import UUID
+from nccrd.db import Base
+
+# Summary tables, derived from the submission tables and maintained
+# incrementally on write; see nccrd.db.summary, nccrd.db.facets and
+# nccrd.db.rollups. Missing values are stored as '' (strings) or -1 (ids
+# and years), since the dimension columns form a unique key; intervention
+# types are stored as InterventionType member names.
+
+
+class SubmissionFacets(Base):
+    """The facet values of each non-deleted submission, as last counted."""
+    __tablename__ = "submission_facets"
+    __table_args__ = {"schema": "nccrd"}
+
+    submission_id = Column(UUID(as_uuid=True), primary_key=True)
+    intervention_type = Column(String, nullable=False)
+    implementation_status = Column(String, nullable=False)
+    mitigation_sector = Column(String, nullable=False)
+    adaptation_sector = Column(String, nullable=False)
+    funding_type = Column(String, nullable=False)
+    province_id = Column(Integer, nullable=False)
+
+
+class FacetCount(Base):
+    """The number of non-deleted submissions having each combination of
+    facet values."""
+    __tablename__ = "facet_count"
+    __table_args__ = {"schema": "nccrd"}
+
+    intervention_type = Column(String, primary_key=True)
+    implementation_status = Column(String, primary_key=True)
+    mitigation_sector = Column(String, primary_key=True)
+    adaptation_sector = Column(String, primary_key=True)
+    funding_type = Column(String, primary_key=True)
+    province_id = Column(Integer, primary_key=True)
+    count = Column(Integer, nullable=False)
+
+
+class SubmissionFunding(Base):
+    """The rollup dimensions and funding amount of each non-deleted
+    submission, as last rolled up."""
+    __tablename__ = "submission_funding"
+    __table_args__ = {"schema": "nccrd"}
+
+    submission_id = Column(UUID(as_uuid=True), primary_key=True)
+    intervention_type = Column(String, nullable=False)
+    mitigation_sector = Column(String, nullable=False)
+    adaptation_sector = Column(String, nullable=False)
+    start_year = Column(Integer, nullable=False)
+    funding_organization = Column(String, nullable=False)
+    funding_amount = Column(Float)
+
+
+class FundingRollup(Base):
+    """Funding totals of non-deleted submissions per combination of
+    rollup dimensions."""
+    __tablename__ = "funding_rollup"
+    __table_args__ = {"schema": "nccrd"}
+
+    intervention_type = Column(String, primary_key=True)
+    mitigation_sector = Column(String, primary_key=True)
+    adaptation_sector = Column(String, primary_key=True)
+    start_year = Column(Integer, primary_key=True)
+    funding_organization = Column(String, primary_key=True)
+    submissions = Column(Integer, nullable=False)
+    funded_submissions = Column(Integer, nullable=False)
+    funding_total = Column(Float, nullable=False)
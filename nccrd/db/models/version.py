@@ -0,0 +1,12 @@
+from sqlalchemy import BigInteger, Column, String
+from nccrd.db import Base
+
+
+class DataVersion(Base):
+    """A counter per kind of data, incremented within every transaction
+    that changes that data; see nccrd.db.versions."""
+    __tablename__ = "data_version"
+    __table_args__ = {"schema": "nccrd"}
+
+    name = Column(String, primary_key=True)
+    version = Column(BigInteger, nullable=False)
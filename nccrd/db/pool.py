@@ -0,0 +1,77 @@
+import threading
+import time
+from contextlib import contextmanager
+
+from sqlalchemy.exc import TimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+
+class _TimedPool:
+    # reports the time spent in each checkout from the pool - including any
+    # wait for a connection to be returned - to the pool's PoolMetrics;
+    # the pool events only fire once a connection has been obtained
+    metrics = None
+
+    def _do_get(self):
+        if self.metrics is None:
+            return super()._do_get()
+        with self.metrics.timed_acquisition():
+            return super()._do_get()
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+
+class TimedQueuePool(_TimedPool, QueuePool):
+    pass
+
+
+class TimedAsyncAdaptedQueuePool(_TimedPool, AsyncAdaptedQueuePool):
+    pass
+
+
+class PoolMetrics:
+    """Live statistics for the connection pool of an engine, together with
+    the time spent waiting to obtain a connection from it. The engine must
+    use a TimedQueuePool or TimedAsyncAdaptedQueuePool."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        engine.pool.metrics = self
+        self._lock = threading.Lock()
+        self.acquisitions = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    @contextmanager
+    def timed_acquisition(self):
+        """Context manager wrapping the acquisition of a pooled connection."""
+        start = time.perf_counter()
+        try:
+            yield
+        except TimeoutError:
+            with self._lock:
+                self.timeouts += 1
+            raise
+        wait = time.perf_counter() - start
+        with self._lock:
+            self.acquisitions += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+
+    def snapshot(self) -> dict:
+        pool = self.engine.pool
+        with self._lock:
+            return {
+                'size': pool.size(),
+                'checked_in': pool.checkedin(),
+                'checked_out': pool.checkedout(),
+                'overflow': pool.overflow(),
+                'acquisitions': self.acquisitions,
+                'timeouts': self.timeouts,
+                'mean_wait_ms': 1000 * self.total_wait / self.acquisitions if self.acquisitions else 0.0,
+                'max_wait_ms': 1000 * self.max_wait,
+            }
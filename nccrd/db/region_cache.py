@@ -0,0 +1,218 @@
+import hashlib
+import logging
+import threading
+from dataclasses import dataclass, field
+from itertools import count
+from typing import Any, Callable, Dict, List, Optional, TypeVar
+
+from sqlalchemy.orm import Session
+
+from nccrd.db import engine
+from nccrd.db.models import Country, District, LocalDistrict, Province
+from nccrd.db.versions import REGIONS, get_data_version
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+RegionWarmer = Callable[['RegionData'], None]
+
+
+def _sort_key(attr: str):
+    # mimic ORDER BY <attr> in postgres, which sorts nulls last
+    return lambda row: (getattr(row, attr) is None, getattr(row, attr) or '')
+
+
+def _group_by(rows: list, attr: str) -> Dict[Any, list]:
+    groups = {}
+    for row in rows:
+        groups.setdefault(getattr(row, attr), []).append(row)
+    return groups
+
+
+def _province_item(p: Province) -> dict:
+    return {"id": p.FID, "code": p.PR_MDB_C, "name": p.PR_NAME}
+
+
+def _district_item(d: District) -> dict:
+    return {"id": d.FID, "code": d.DISTRICT, "name": d.DISTRICT_N}
+
+
+def _local_district_item(ld: LocalDistrict) -> dict:
+    return {"id": ld.FID, "code": ld.CAT_B, "name": ld.MUNICNAME}
+
+
+def _country_item(c: Country) -> dict:
+    return {"id": c.gid, "code": c.shapeiso, "name": c.shape0}
+
+
+@dataclass
+class RegionData:
+    """A snapshot of the region tables, together with the name lookups
+    served by the /region/names endpoints.
+
+    `version` increases with every load in this process, while `fingerprint`
+    is a digest of the table contents, which is the same across processes
+    and changes only when the region data itself changes.
+    """
+    version: int
+    provinces: List[Province]
+    districts: List[District]
+    local_districts: List[LocalDistrict]
+    countries: List[Country]
+
+    fingerprint: str = field(init=False)
+
+    province_names: List[dict] = field(init=False)
+    country_names: List[dict] = field(init=False)
+    district_names_by_province: Dict[str, List[dict]] = field(init=False)
+    local_district_names_by_district: Dict[str, List[dict]] = field(init=False)
+    local_district_names_by_province: Dict[str, List[dict]] = field(init=False)
+
+    _derived: Dict[str, Any] = field(init=False, default_factory=dict, repr=False)
+    _lock: threading.RLock = field(init=False, default_factory=threading.RLock, repr=False)
+
+    def __post_init__(self):
+        self.provinces.sort(key=_sort_key('PR_NAME'))
+        self.districts.sort(key=_sort_key('DISTRICT'))
+        self.local_districts.sort(key=_sort_key('MUNICNAME'))
+        self.countries.sort(key=_sort_key('shape0'))
+
+        digest = hashlib.sha1()
+        for rows in (self.provinces, self.districts, self.local_districts, self.countries):
+            for row in rows:
+                digest.update(repr([getattr(row, attr.key) for attr in row.__mapper__.column_attrs]).encode())
+        self.fingerprint = digest.hexdigest()
+
+        self.province_names = [_province_item(p) for p in self.provinces]
+        self.country_names = [_country_item(c) for c in self.countries]
+        self.district_names_by_province = {
+            province: [_district_item(d) for d in districts]
+            for province, districts in _group_by(self.districts, 'PROVINCE').items()
+        }
+        self.local_district_names_by_district = {
+            district: [_local_district_item(ld) for ld in local_districts]
+            for district, local_districts in _group_by(self.local_districts, 'DISTRICT').items()
+        }
+        self.local_district_names_by_province = {
+            province: [_local_district_item(ld) for ld in local_districts]
+            for province, local_districts in _group_by(self.local_districts, 'PROVINCE').items()
+        }
+
+    def derive(self, key: str, builder: Callable[['RegionData'], T]) -> T:
+        """Return a value computed from this snapshot, building it with
+        `builder` only once.
+
+        :param key: a name identifying the derived value
+        :param builder: a callable that takes this snapshot and produces
+            the derived value
+        """
+        try:
+            return self._derived[key]
+        except KeyError:
+            with self._lock:
+                if key not in self._derived:
+                    self._derived[key] = builder(self)
+                return self._derived[key]
+
+
+class RegionCache:
+    """In-process cache of the province, district, local district and
+    country tables.
+
+    These tables only change when ``migrate/systemdata.py`` reloads them,
+    so they are read once (at application startup, or on first use) and
+    all lookups are served from memory. A reload of the region tables
+    increments the `regions` data version (see nccrd.db.versions);
+    :meth:`reload_if_changed` reloads the cache if that version has changed
+    since the cache was loaded, and the API calls it periodically, so that
+    every worker process picks up the new data.
+
+    Functions registered with :meth:`on_load` are run on every newly
+    loaded snapshot before it replaces the current one, which remains in
+    use until then.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._data: Optional[RegionData] = None
+        self._data_version: Optional[int] = None
+        self._versions = count(1)
+        self._warmers: List[RegionWarmer] = []
+
+    def on_load(self, warmer: RegionWarmer) -> RegionWarmer:
+        """Register a function to be called with each newly loaded snapshot,
+        e.g. to build derived values (see :meth:`RegionData.derive`) ahead of
+        the requests that use them. May be used as a decorator."""
+        self._warmers.append(warmer)
+        return warmer
+
+    @property
+    def data(self) -> RegionData:
+        """The current region snapshot, loading it if necessary."""
+        if (data := self._data) is None:
+            with self._lock:
+                if (data := self._data) is None:
+                    data = self.load()
+        return data
+
+    @property
+    def version(self) -> int:
+        """The version of the current snapshot; this increases on every load."""
+        return self.data.version
+
+    def load(self) -> RegionData:
+        """(Re)load the region tables into memory and return the new snapshot."""
+        with self._lock:
+            with Session(engine) as db:
+                data_version = get_data_version(db, REGIONS)
+                data = self._read(db)
+
+            for warmer in self._warmers:
+                try:
+                    warmer(data)
+                except Exception:
+                    # the value is then built on first use instead
+                    logger.exception(f'Error in region cache warmer {warmer!r}')
+
+            self._data = data
+            self._data_version = data_version
+            logger.info(f'Region cache loaded (version {data.version}).')
+            return data
+
+    def reload_if_changed(self) -> bool:
+        """Reload the region tables if they have been reloaded in the
+        database since the cache was loaded.
+
+        :return: whether the cache was reloaded
+        """
+        with Session(engine) as db:
+            data_version = get_data_version(db, REGIONS)
+        with self._lock:
+            if self._data is None or data_version == self._data_version:
+                return False
+            self.load()
+            return True
+
+    def invalidate(self) -> None:
+        """Discard the current snapshot; it will be reloaded on next use."""
+        with self._lock:
+            self._data = None
+
+    def derive(self, key: str, builder: Callable[[RegionData], T]) -> T:
+        """Return a value computed from the current snapshot, building it
+        with `builder` only once per load. See :meth:`RegionData.derive`."""
+        return self.data.derive(key, builder)
+
+    def _read(self, db: Session) -> RegionData:
+        data = RegionData(
+            version=next(self._versions),
+            provinces=db.query(Province).all(),
+            districts=db.query(District).all(),
+            local_districts=db.query(LocalDistrict).all(),
+            countries=db.query(Country).all(),
+        )
+        db.expunge_all()
+        return data
+
+
+region_cache = RegionCache()
@@ -0,0 +1,132 @@
+"""Funding rollups of submissions.
+
+Like the facet counts (see nccrd.db.facets), funding totals are kept in a
+`funding_rollup` table at the finest grain of the rollup dimensions, and
+updated within the transaction of any change to a submission by the
+difference between its previously recorded (`submission_funding`) and
+current values (see nccrd.db.summary). Rollups over any subset of the
+dimensions are then sums over this table.
+
+Incremental updates of the float totals may accumulate rounding error;
+:func:`rebuild_funding_rollups` recomputes the tables from scratch, and
+may be run on a schedule.
+"""
+from collections import defaultdict
+from typing import Dict, Iterable, List, Sequence
+from uuid import UUID
+
+from sqlalchemy import Integer, cast, delete, extract, func, insert, select
+from sqlalchemy.orm import Session
+
+from nccrd.db.changes import before_submissions_commit
+from nccrd.db.models import Adaptaion, FundingRollup, Mitigation, Submission, SubmissionFunding
+from nccrd.db.summary import (
+    NO_NUMBER, NO_VALUE, add_deltas, decode_value, encode_value, first_sector, intervention_type,
+    replace_submission_rows,
+)
+
+DIMENSIONS = (
+    'intervention_type',
+    'mitigation_sector',
+    'adaptation_sector',
+    'start_year',
+    'funding_organization',
+)
+
+
+def _funding_values_query():
+    return select(
+        Submission.id.label('submission_id'),
+        intervention_type().label('intervention_type'),
+        func.coalesce(first_sector(Mitigation), NO_VALUE).label('mitigation_sector'),
+        func.coalesce(first_sector(Adaptaion), NO_VALUE).label('adaptation_sector'),
+        func.coalesce(cast(extract('year', Submission.start_date), Integer), NO_NUMBER).label('start_year'),
+        func.coalesce(Submission.funding_organization, NO_VALUE).label('funding_organization'),
+        Submission.funding_amount,
+    ).where(Submission.deleted.isnot(True))
+
+
+def refresh_funding_rollups(db, submission_ids: Iterable[UUID]) -> None:
+    """Bring the rollup tables up to date for the given submissions.
+
+    :param db: a session or connection
+    """
+    old_rows, new_rows = replace_submission_rows(
+        db, SubmissionFunding, _funding_values_query(), submission_ids, DIMENSIONS + ('funding_amount',)
+    )
+
+    deltas = defaultdict(lambda: dict(submissions=0, funded_submissions=0, funding_total=0.0))
+    for rows, sign in ((new_rows, 1), (old_rows, -1)):
+        for row in rows:
+            delta = deltas[tuple(getattr(row, dim) for dim in DIMENSIONS)]
+            delta['submissions'] += sign
+            if row.funding_amount is not None:
+                delta['funded_submissions'] += sign
+                delta['funding_total'] += sign * row.funding_amount
+
+    add_deltas(db, FundingRollup, DIMENSIONS, {
+        key: delta for key, delta in deltas.items() if any(delta.values())
+    }, 'submissions')
+
+
+def rebuild_funding_rollups(db) -> None:
+    """Recompute the rollup tables from scratch.
+
+    :param db: a session or connection
+    """
+    db.execute(delete(FundingRollup))
+    db.execute(delete(SubmissionFunding))
+    values = _funding_values_query().subquery()
+    db.execute(insert(SubmissionFunding).from_select(values.c.keys(), select(values)))
+    dim_cols = [getattr(SubmissionFunding, dim) for dim in DIMENSIONS]
+    db.execute(insert(FundingRollup).from_select(
+        DIMENSIONS + ('submissions', 'funded_submissions', 'funding_total'),
+        select(
+            *dim_cols,
+            func.count(),
+            func.count(SubmissionFunding.funding_amount),
+            func.coalesce(func.sum(SubmissionFunding.funding_amount), 0),
+        ).group_by(*dim_cols),
+    ))
+
+
+@before_submissions_commit
+def _refresh_changed(session: Session, submission_ids) -> None:
+    refresh_funding_rollups(session, submission_ids)
+
+
+def funding_rollup(db: Session, group_by: Sequence[str], filters: Dict[str, object]) -> List[dict]:
+    """Return the number of (non-deleted) submissions, and the total and
+    average funding amount of those with one, per combination of values of
+    the `group_by` dimensions, sorted by descending total. Missing values
+    are reported as None.
+
+    :param group_by: dimension names
+    :param filters: dimension values to filter by, keyed by dimension name;
+        an intervention type is given as an InterventionType
+    """
+    group_cols = [getattr(FundingRollup, dim) for dim in group_by]
+    funded = func.sum(FundingRollup.funded_submissions)
+    total = func.sum(FundingRollup.funding_total)
+    rows = db.execute(
+        select(
+            *group_cols,
+            func.sum(FundingRollup.submissions).label('submissions'),
+            funded.label('funded_submissions'),
+            total.label('funding_total'),
+        ).
+        where(*(getattr(FundingRollup, dim) == encode_value(dim, value) for dim, value in filters.items())).
+        group_by(*group_cols).
+        order_by(total.desc(), *group_cols)
+    ).all()
+    return [
+        dict(
+            group={dim: decode_value(dim, value) for dim, value in zip(group_by, row)},
+            submissions=int(row.submissions),
+            funded_submissions=int(row.funded_submissions),
+            funding_total=row.funding_total,
+            funding_average=row.funding_total / row.funded_submissions if row.funded_submissions else None,
+        )
+        for row in rows
+        if row.submissions
+    ]
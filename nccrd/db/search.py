@@ -0,0 +1,93 @@
+"""Full-text search over submissions.
+
+Each submission has a `search_vector` (with a GIN index) built from its
+title, description and organizations and from the text fields of its
+mitigation and adaptation records. The vector is refreshed within the
+transaction of any change to the submission or its records.
+"""
+import re
+from typing import Iterable, Optional
+from uuid import UUID
+
+from sqlalchemy import func, literal, select, update
+from sqlalchemy.orm import Session
+
+from nccrd.db.changes import before_submissions_commit
+from nccrd.db.models import Adaptaion, Mitigation, Submission
+
+SEARCH_CONFIG = 'english'
+
+_MITIGATION_TEXT = (
+    Mitigation.sector, Mitigation.subsector, Mitigation.secondary,
+    Mitigation.project_type, Mitigation.project_subtype, Mitigation.mitigation_program,
+    Mitigation.national_policy, Mitigation.provincial_municipal, Mitigation.primary_intended_outcome,
+    Mitigation.enviromental_co_benefit_description, Mitigation.social_co_benefit_description,
+    Mitigation.economic_co_benefit_description,
+)
+_ADAPTATION_TEXT = (
+    Adaptaion.sector, Adaptaion.national_policy, Adaptaion.intervention_goal,
+    Adaptaion.provincial_municipal, Adaptaion.hazard, Adaptaion.climate_impact,
+    Adaptaion.address_climate_impact, Adaptaion.impact_response,
+)
+
+
+def _weighted(text, weight: str):
+    return func.setweight(func.to_tsvector(SEARCH_CONFIG, func.coalesce(text, '')), weight)
+
+
+def _child_text(model, columns):
+    return (
+        select(func.string_agg(func.concat_ws(' ', *columns), ' ')).
+        where(model.submission_id == Submission.id).
+        scalar_subquery()
+    )
+
+
+def search_vector_expression():
+    """SQL expression computing the search vector of a submission row;
+    title matches rank highest, then description, then organizations,
+    then mitigation / adaptation details."""
+    return (
+        _weighted(Submission.title, 'A').op('||')(
+            _weighted(Submission.description, 'B')).op('||')(
+            _weighted(func.concat_ws(' ', Submission.implementation_organization,
+                                     Submission.funding_organization), 'C')).op('||')(
+            _weighted(func.concat_ws(' ', _child_text(Mitigation, _MITIGATION_TEXT),
+                                     _child_text(Adaptaion, _ADAPTATION_TEXT)), 'D'))
+    )
+
+
+def refresh_search_vectors(db, submission_ids: Iterable[UUID] = None) -> None:
+    """Recompute the search vectors of the given submissions or, if
+    `submission_ids` is None, of all submissions that don't have one.
+
+    :param db: a session or connection
+    """
+    stmt = update(Submission).values(search_vector=search_vector_expression())
+    if submission_ids is None:
+        stmt = stmt.where(Submission.search_vector.is_(None))
+    else:
+        stmt = stmt.where(Submission.id.in_(list(submission_ids)))
+    db.execute(stmt)
+
+
+@before_submissions_commit
+def _refresh_changed(session: Session, submission_ids) -> None:
+    refresh_search_vectors(session, submission_ids)
+
+
+def search_query(q: str, prefix: bool = True):
+    """Return a tsquery matching all the words in `q`; if `prefix`, the
+    last word is matched as a prefix, for type-ahead search. Returns None
+    if `q` contains no searchable words."""
+    words = re.findall(r'\w+', q)
+    if not words:
+        return None
+    terms = [f"'{word}'" for word in words]
+    if prefix:
+        terms[-1] += ':*'
+    return func.to_tsquery(SEARCH_CONFIG, literal(' & '.join(terms)))
+
+
+def search_rank(query):
+    return func.ts_rank_cd(Submission.search_vector, query)
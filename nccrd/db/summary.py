@@ -0,0 +1,118 @@
+"""Incremental maintenance of summary tables.
+
+A summary (see nccrd.db.facets and nccrd.db.rollups) is kept in two tables:
+one recording, for every non-deleted submission, its values of the summary
+dimensions as last summarized; and one of aggregates per combination of
+dimension values, at the finest grain. On a change to submissions, the
+recorded rows of the changed submissions are replaced by their current
+values, and the difference between the aggregates of the old and the new
+rows is added to the aggregate table.
+
+Dimension columns form the key of the aggregate table, so missing values
+are stored as '' (strings) or -1 (ids and years); intervention types are
+stored as InterventionType member names.
+"""
+from typing import Dict, Iterable, List, Sequence, Tuple
+from uuid import UUID
+
+from sqlalchemy import String, cast, delete, func, insert, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.engine import Row
+
+from nccrd.db.models import InterventionType, Submission
+
+NO_VALUE = ''
+NO_NUMBER = -1
+
+
+def first_sector(model):
+    """SQL expression for the sector of the first mitigation or
+    adaptation record (`model`) of a submission."""
+    return (
+        select(model.sector).
+        where(model.submission_id == Submission.id).
+        order_by(model.id).
+        limit(1).
+        scalar_subquery()
+    )
+
+
+def intervention_type():
+    """SQL expression for the stored intervention type of a submission."""
+    return func.coalesce(cast(Submission.intervention_type, String), NO_VALUE)
+
+
+def encode_value(dimension: str, value):
+    """Return the stored form of a dimension value given as a filter."""
+    if dimension == 'intervention_type':
+        return InterventionType(value).name
+    return value
+
+
+def decode_value(dimension: str, value):
+    """Return a stored dimension value as reported by the API; None if missing."""
+    if value in (NO_VALUE, NO_NUMBER):
+        return None
+    if dimension == 'intervention_type':
+        return InterventionType[value]
+    return value
+
+
+def replace_submission_rows(
+        db,
+        model,
+        values_query,
+        submission_ids: Iterable[UUID],
+        columns: Sequence[str],
+) -> Tuple[List[Row], List[Row]]:
+    """Replace the recorded rows of the given submissions in the
+    per-submission table `model` with their current values.
+
+    :param db: a session or connection
+    :param values_query: a select of the current values of every column of
+        `model`, for non-deleted submissions
+    :param columns: the columns to return from the old and new rows
+    :return: the old and the new rows
+    """
+    submission_ids = list(submission_ids)
+    old_rows = db.execute(
+        delete(model).
+        where(model.submission_id.in_(submission_ids)).
+        returning(*(getattr(model, col) for col in columns))
+    ).all()
+    new_rows = db.execute(
+        values_query.where(Submission.id.in_(submission_ids))
+    ).all()
+    if new_rows:
+        db.execute(insert(model), [row._asdict() for row in new_rows])
+    return old_rows, new_rows
+
+
+def add_deltas(
+        db,
+        model,
+        dimensions: Sequence[str],
+        deltas: Dict[tuple, Dict[str, object]],
+        count_column: str,
+) -> None:
+    """Add deltas to the aggregates of the aggregate table `model`, and
+    remove the rows left without submissions.
+
+    :param db: a session or connection
+    :param dimensions: the dimension (key) columns
+    :param deltas: the amounts to add to each aggregate column, keyed by
+        tuples of dimension values
+    :param count_column: the column holding the number of submissions
+    """
+    if not deltas:
+        return
+    # sorted, so that concurrent transactions lock rows in the same order
+    stmt = pg_insert(model).values([
+        dict(zip(dimensions, key), **delta) for key, delta in sorted(deltas.items())
+    ])
+    aggregates = next(iter(deltas.values())).keys()
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=dimensions,
+        set_={col: getattr(model, col) + stmt.excluded[col] for col in aggregates},
+    ))
+    db.execute(delete(model).where(getattr(model, count_column) <= 0))
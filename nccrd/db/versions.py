@@ -0,0 +1,49 @@
+"""Database-wide data versions.
+
+Each API worker process keeps its own in-memory caches, so a change made
+through one process (or by ``migrate/systemdata.py``) is not otherwise
+seen by the others. A transaction that changes a kind of data increments
+its counter in the `data_version` table, which makes the new version
+visible to every process exactly when the change commits. Processes read
+the counter to tell whether what they have cached is still current.
+
+A reader must read the version *before* the data that it caches under
+that version, so that the cached data is never older than its version.
+"""
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from nccrd.db.changes import before_submissions_commit
+from nccrd.db.models import DataVersion
+
+REGIONS = 'regions'
+SUBMISSIONS = 'submissions'
+
+
+def get_data_version(db, name: str) -> int:
+    """Return the current version of the named data; 0 if it has never
+    been changed.
+
+    :param db: a session or connection
+    """
+    return db.execute(
+        select(DataVersion.version).where(DataVersion.name == name)
+    ).scalar() or 0
+
+
+def bump_data_version(db, name: str) -> None:
+    """Increment the version of the named data, within the current
+    transaction of `db`.
+
+    :param db: a session or connection
+    """
+    stmt = pg_insert(DataVersion).values(name=name, version=1)
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[DataVersion.name],
+        set_=dict(version=DataVersion.version + 1),
+    ))
+
+
+@before_submissions_commit
+def _bump_submissions_version(session, submission_ids):
+    bump_data_version(session, SUBMISSIONS)
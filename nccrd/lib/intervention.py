@@ -0,0 +1,26 @@
+from enum import Enum
+from typing import Optional
+
+
+class InterventionType(str, Enum):
+    """The normalized intervention_measurement of a submission."""
+    MITIGATION = 'mitigation'
+    ADAPTATION = 'adaptation'
+    CROSS_CUTTING = 'cross cutting'
+
+    @classmethod
+    def parse(cls, intervention_measurement: Optional[str]) -> Optional['InterventionType']:
+        """Return the type for a free-text intervention_measurement
+        (e.g. 'Cross Cutting'), or None if it is missing or unrecognized."""
+        try:
+            return cls(intervention_measurement.strip().lower())
+        except (AttributeError, ValueError):
+            return None
+
+    @property
+    def has_mitigation(self) -> bool:
+        return self in (InterventionType.MITIGATION, InterventionType.CROSS_CUTTING)
+
+    @property
+    def has_adaptation(self) -> bool:
+        return self in (InterventionType.ADAPTATION, InterventionType.CROSS_CUTTING)
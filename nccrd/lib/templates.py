@@ -0,0 +1,201 @@
+"""Registry of the spreadsheet templates from which submissions are imported.
+
+A template declares, for each sheet it reads, the label (in the first
+column) of each row that holds a field value, and the field it maps to.
+Each revision of a template is registered under the template's name and
+a new version number, so that workbooks filled in on an older revision
+can still be imported by asking for that version.
+
+Templates are parsed by :func:`nccrd.lib.workbook.parse_workbook`, in
+worker processes. Converters and other functions of a template must
+therefore be module-level functions, and this module must not depend on
+the API or the database.
+"""
+from dataclasses import dataclass, field
+from typing import Any, Callable, Collection, Dict, Optional, Tuple
+
+from nccrd.lib.intervention import InterventionType
+
+PROJECT_DETAILS = 'project_details'
+NCCRD_TEMPLATE = 'nccrd'
+
+DEFAULT_GEO_LOCATION = {
+    "type": "Point",
+    "coordinates": [30.374, -27.936],  # Replace with real values if needed
+}
+
+
+@dataclass(frozen=True)
+class FieldSpec:
+    name: str
+    """The name of the SubmissionCreate (or mitigation / adaptation) field."""
+    convert: Optional[Callable[[Any], Any]] = None
+    """Converts the cell value; a result of None leaves the field unset."""
+
+
+@dataclass(frozen=True)
+class SheetTemplate:
+    sheet: str
+    """The name of the worksheet."""
+    fields: Dict[str, FieldSpec]
+    """Field specs, keyed by row label."""
+    details: Optional[str] = None
+    """For a mitigation / adaptation details sheet: 'mitigation' or
+    'adaptation'; the sheet is read, into the `<details>_data` field, only if
+    the template's `details_for` selects it."""
+    required: Tuple[str, ...] = ()
+    """Labels of the rows that must have a value."""
+    unique_labels: bool = False
+    """Whether each label occurs on one row of the sheet at most; if so, the
+    sheet is read only up to the last of its labelled rows. Otherwise, the
+    whole sheet is read, and the last value of a repeated label is used."""
+
+
+@dataclass(frozen=True)
+class WorkbookTemplate:
+    name: str
+    version: int
+    sheets: Tuple[SheetTemplate, ...]
+    """The general sheet first, followed by any details sheets."""
+    data_only: bool = False
+    """Whether to read the cached values of formula cells, rather than
+    the formulas."""
+    defaults: Dict[str, Any] = field(default_factory=dict)
+    """Values for fields that the workbook does not provide."""
+    details_for: Optional[Callable[[dict], Collection[str]]] = None
+    """Returns, given the values read from the general sheet, the kinds of
+    details sheets ('mitigation' and/or 'adaptation') to read."""
+
+
+def to_float(value) -> float:
+    return float(value)
+
+
+def intervention_measurement(value) -> Optional[str]:
+    # the template's options are descriptive, e.g. 'Adaptation intervention'
+    value = str(value).lower()
+    if "mitigation" in value:
+        return "Mitigation"
+    if "adaptation" in value:
+        return "Adaptation"
+    if "cross" in value:
+        return "Cross Cutting"
+
+
+def yes_no(value) -> bool:
+    return value in ["Yes", "yes", "TRUE", True]
+
+
+def intervention_details(values: dict) -> Tuple[str, ...]:
+    # the details of the submission's intervention type
+    im_type = InterventionType.parse(values.get("intervention_measurement"))
+    if im_type is None:
+        return ()
+    return tuple(details for details in ('mitigation', 'adaptation') if getattr(im_type, f'has_{details}'))
+
+
+_GENERAL_FIELDS = {
+    'Title': FieldSpec('title'),
+    'Indicate the type of measure': FieldSpec('intervention_measurement'),
+    'Description': FieldSpec('description'),
+    'Implementation status': FieldSpec('implementation_status'),
+    'Implementing organization': FieldSpec('implementation_organization'),
+    'Other implementing partners': FieldSpec('implementation_partners_other'),
+    'Start year': FieldSpec('start_date'),
+    'End year': FieldSpec('end_date'),
+    'Link to project website': FieldSpec('link'),
+    'Funding organization': FieldSpec('funding_organization'),
+    'Type of funding': FieldSpec('funding_type'),
+    'Actual budget': FieldSpec('funding_amount', to_float),
+    'Estimated budget range': FieldSpec('estimated_budget_cost'),
+    'Name': FieldSpec('project_manager_name'),
+    'Company/organization': FieldSpec('project_manager_organization'),
+    'Position': FieldSpec('project_manager_position'),
+    'Email address': FieldSpec('project_manager_email'),
+    'Mobile number': FieldSpec('project_manager_mobile'),
+}
+
+_ADAPTATION_FIELDS = {
+    'Adaptation sector': FieldSpec('sector'),
+    'National policy': FieldSpec('national_policy'),
+    'Overall adaptation intervention goal': FieldSpec('intervention_goal'),
+    'Provincial / municipal policy / framework': FieldSpec('provincial_municipal'),
+    'Hazard': FieldSpec('hazard'),
+    'Progress calculator / explanation': FieldSpec('progress_calculator'),
+    'Observed and projected climate change impacts': FieldSpec('climate_impact'),
+    'How the intervention addresses the climate impact': FieldSpec('address_climate_impact'),
+    'Adaptation impact response': FieldSpec('impact_response'),
+}
+
+_MITIGATION_FIELDS = {
+    'Mitigation sector': FieldSpec('sector'),
+    'Subsector': FieldSpec('subsector'),
+    'Secondary sector': FieldSpec('secondary'),
+    'Project type': FieldSpec('project_type'),
+    'Project subtype': FieldSpec('project_subtype'),
+    'Mitigation programme': FieldSpec('mitigation_program'),
+    'National policy': FieldSpec('national_policy'),
+    'Provincial / municipal policy / framework': FieldSpec('provincial_municipal'),
+    'Primary intended mitigation outcome': FieldSpec('primary_intended_outcome'),
+    'Progress calculator / explanation': FieldSpec('progress_calculator'),
+    'Environmental co-benefit': FieldSpec('enviromental_co_benefit'),
+    'Environmental co-benefit description': FieldSpec('enviromental_co_benefit_description'),
+    'Social co-benefit': FieldSpec('social_co_benefit'),
+    'Social co-benefit description': FieldSpec('social_co_benefit_description'),
+    'Economic co-benefit': FieldSpec('economic_co_benefit'),
+    'Economic co-benefit description': FieldSpec('economic_co_benefit_description'),
+    'Are carbon credits issued?': FieldSpec('carbon_credit', yes_no),
+    'CDM / Voluntary': FieldSpec('cdm_voluntary'),
+    'CDM Executive Board status': FieldSpec('cdm_executive_board_status'),
+    'CDM methodology': FieldSpec('cdm_methodology'),
+    'Organisation issuing carbon credits': FieldSpec('organization_issuing_credits'),
+    'Voluntary methodology': FieldSpec('voluntary_methodology'),
+    'CDM project number': FieldSpec('cdm_project_number'),
+}
+
+_templates: Dict[Tuple[str, int], WorkbookTemplate] = {}
+
+
+def register_template(template: WorkbookTemplate) -> WorkbookTemplate:
+    _templates[template.name, template.version] = template
+    return template
+
+
+def get_template(name: str, version: int = None) -> WorkbookTemplate:
+    """Return the given version of a template, or its latest version.
+
+    :raises KeyError: if there is no such template or version
+    """
+    if version is None:
+        version = max((v for n, v in _templates if n == name), default=None)
+    return _templates[name, version]
+
+
+# The general project details of a (macro-enabled) project workbook
+register_template(WorkbookTemplate(
+    name=PROJECT_DETAILS,
+    version=1,
+    sheets=(
+        SheetTemplate('General project details', _GENERAL_FIELDS),
+    ),
+    defaults={'geo_location': DEFAULT_GEO_LOCATION},
+))
+
+# The NCCRD submission template
+register_template(WorkbookTemplate(
+    name=NCCRD_TEMPLATE,
+    version=1,
+    sheets=(
+        SheetTemplate('General project details', dict(
+            _GENERAL_FIELDS,
+            **{'Indicate the type of measure': FieldSpec('intervention_measurement', intervention_measurement)},
+        )),
+        SheetTemplate('Adaptation details', _ADAPTATION_FIELDS,
+                      details='adaptation', required=('Adaptation sector',), unique_labels=True),
+        SheetTemplate('Mitigation details', _MITIGATION_FIELDS,
+                      details='mitigation', required=('Mitigation sector',), unique_labels=True),
+    ),
+    data_only=True,
+    defaults={'geo_location': DEFAULT_GEO_LOCATION},
+    details_for=intervention_details,
+))
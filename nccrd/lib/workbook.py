@@ -0,0 +1,95 @@
+"""Parsing of workbooks according to the registered templates (see
+nccrd.lib.templates).
+
+The API runs these functions in worker processes, which import only this
+module and its dependencies; it must not depend on the API or the database.
+"""
+import time
+import tracemalloc
+from typing import Tuple
+
+from openpyxl import load_workbook
+
+from nccrd.lib.templates import SheetTemplate, get_template
+
+
+class WorkbookError(ValueError):
+    """Raised when a workbook does not match the expected template."""
+
+
+def _sheet_values(worksheet, sheet: SheetTemplate) -> dict:
+    # Stream the rows of the worksheet, looking up each row label in the
+    # template. As in the per-template parsers that this replaces, the last
+    # value found for a field is used, since a label may appear more than
+    # once on a sheet; so every row is read, unless the template declares
+    # the sheet's labels to be unique.
+    values = {}
+    seen = set()
+    for row in worksheet.iter_rows(values_only=True):
+        if not row or row[0] is None:
+            continue
+        label = str(row[0]).strip()
+        spec = sheet.fields.get(label)
+        if spec is None:
+            continue
+        value = next((v for v in row[1:] if v is not None), None)
+        if value is not None and spec.convert:
+            value = spec.convert(value)
+        if value is not None:
+            values[spec.name] = value
+        if sheet.unique_labels:
+            seen.add(label)
+            if len(seen) == len(sheet.fields):
+                break
+
+    for label in sheet.required:
+        if sheet.fields[label].name not in values:
+            raise WorkbookError(f"{label} is required.")
+    return values
+
+
+def parse_workbook(path: str, template_name: str, template_version: int) -> dict:
+    """Read the SubmissionCreate payload from a workbook file, according
+    to a registered template.
+
+    :raises WorkbookError: if the workbook does not match the template
+    """
+    template = get_template(template_name, template_version)
+    wb = load_workbook(path, read_only=True, data_only=template.data_only)
+    try:
+        general, *details = template.sheets
+        submission_data = dict(template.defaults, **_sheet_values(_worksheet(wb, general), general))
+
+        selected = template.details_for(submission_data) if template.details_for else ()
+        for sheet in details:
+            if sheet.details in selected:
+                submission_data[f'{sheet.details}_data'] = _sheet_values(_worksheet(wb, sheet), sheet)
+
+        return submission_data
+    finally:
+        wb.close()
+
+
+def _worksheet(wb, sheet: SheetTemplate):
+    try:
+        return wb[sheet.sheet]
+    except KeyError:
+        raise WorkbookError(f"The workbook has no '{sheet.sheet}' sheet.")
+
+
+def parse_workbook_measured(path: str, template_name: str, template_version: int) -> Tuple[dict, dict]:
+    """Parse a workbook file as :func:`parse_workbook`, measuring the parse.
+
+    :return: the parsed payload, and the parse time and peak memory use
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        submission_data = parse_workbook(path, template_name, template_version)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return submission_data, {
+        "parse_seconds": round(time.perf_counter() - start, 3),
+        "peak_memory_bytes": peak,
+    }
@@ -1,3 +1,4 @@
+from sqlalchemy import select
 from sqlalchemy.orm import scoped_session, sessionmaker
 
 import nccrd.db
@@ -9,3 +10,25 @@ TestSession = scoped_session(sessionmaker(
     autoflush=False,
     future=True
 ))
+
+
+def table_rows(model) -> list:
+    """Return the rows of a table, as sorted tuples."""
+    return sorted(tuple(row) for row in TestSession.execute(select(*model.__table__.c)).all())
+
+
+def assert_summary_matches_rebuild(rebuild, aggregate_model, submission_model, count_column: str):
+    """Check that incrementally maintained summary tables (see nccrd.db.summary)
+    match the tables as recomputed from scratch by `rebuild`, and that no
+    aggregate row is left without submissions."""
+    aggregate_rows, submission_rows = table_rows(aggregate_model), table_rows(submission_model)
+    assert all(
+        getattr(row, count_column) > 0
+        for row in TestSession.execute(select(aggregate_model)).scalars()
+    )
+    try:
+        rebuild(TestSession)
+        assert table_rows(aggregate_model) == aggregate_rows
+        assert table_rows(submission_model) == submission_rows
+    finally:
+        TestSession.rollback()
@@ -1,4 +1,7 @@
 import nccrd.api
+from nccrd.db.models import Country, District, LocalDistrict, Province
+from nccrd.db.region_cache import RegionData, region_cache
+from nccrd.api.lib.response_cache import response_cache
 from random import randint, choice
 from collections import namedtuple
 
@@ -13,6 +16,17 @@ import pytest
 MockToken = namedtuple('MockToken', ('active', 'client_id', 'sub'))
 
 
+@pytest.fixture(autouse=True)
+def clear_response_cache():
+    """An auto-use, per-test fixture that empties the API response cache
+    after every test, since table data is deleted without going through
+    the ORM."""
+    try:
+        yield
+    finally:
+        response_cache.clear()
+
+
 @pytest.fixture(params=['client_credentials', 'authorization_code'])
 def api(request, monkeypatch):
     """Fixture returning an API test client constructor. Example usages::
@@ -82,3 +96,36 @@ def scopes(request):
         return [scope]
     elif request.param == 'scope_mismatch':
         return all_scopes_excluding(scope)
+
+
+def _square(minx, miny, size=1):
+    maxx, maxy = minx + size, miny + size
+    return f'POLYGON (({minx} {miny}, {maxx} {miny}, {maxx} {maxy}, {minx} {maxy}, {minx} {miny}))'
+
+
+@pytest.fixture
+def region_data():
+    """A small region snapshot: a province of two adjoining square
+    districts, each consisting of one local district, within the country."""
+    return RegionData(
+        version=1,
+        provinces=[Province(FID=1, PR_MDB_C='KZN', PR_NAME='KwaZulu-Natal')],
+        districts=[
+            District(FID=1, PROVINCE='KZN', DISTRICT='DC1', DISTRICT_N='West', geometry=_square(30, -28)),
+            District(FID=2, PROVINCE='KZN', DISTRICT='DC2', DISTRICT_N='East', geometry=_square(31, -28)),
+        ],
+        local_districts=[
+            LocalDistrict(FID=1, PROVINCE='KZN', DISTRICT='DC1', CAT_B='LM1', MUNICNAME='West Local',
+                          geometry=_square(30, -28)),
+            LocalDistrict(FID=2, PROVINCE='KZN', DISTRICT='DC2', CAT_B='LM2', MUNICNAME='East Local',
+                          geometry=_square(31, -28)),
+        ],
+        countries=[Country(gid=1, shape0='South Africa', shapeiso='ZAF', geometry=_square(29, -29, 4))],
+    )
+
+
+@pytest.fixture
+def regions(region_data, monkeypatch):
+    """Fixture that serves `region_data` from the region cache."""
+    monkeypatch.setattr(region_cache, '_data', region_data)
+    return region_data
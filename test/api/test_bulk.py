@@ -0,0 +1,76 @@
+import json
+
+import pytest
+from sqlalchemy import select
+
+from nccrd.db.models import Submission
+from test import TestSession
+
+
+def payload(title):
+    return dict(title=title, intervention_measurement='Mitigation', mitigation_data=dict(sector='Energy'))
+
+
+# good, invalid (no mitigation data), good
+PAYLOADS = [payload('One'), dict(title='Two', intervention_measurement='Mitigation'), payload('Three')]
+
+
+def assert_db_titles(*titles):
+    assert sorted(TestSession.execute(select(Submission.title)).scalars()) == sorted(titles)
+
+
+def post_bulk(api, body, content_type):
+    return api([]).post('/submission/bulk', content=body, headers={'Content-Type': content_type})
+
+
+def assert_results(r, *errors):
+    """Check a bulk response, given the expected error (or None) per item."""
+    assert r.status_code == 200
+    result = r.json()
+    assert result['created'] == errors.count(None)
+    assert result['failed'] == len(errors) - errors.count(None)
+    assert [item['index'] for item in result['results']] == list(range(len(errors)))
+    for item, error in zip(result['results'], errors):
+        if error is None:
+            assert 'submission_id' in item and 'error' not in item
+        else:
+            assert error in str(item['error'])
+
+
+def test_bulk_json(api):
+    r = post_bulk(api, json.dumps(PAYLOADS), 'application/json')
+    assert_results(r, None, 'Mitigation data must be provided', None)
+    assert_db_titles('One', 'Three')
+
+
+def test_bulk_ndjson(api):
+    lines = [json.dumps(p) for p in PAYLOADS]
+    lines.insert(1, '{"title": "Malformed",')
+    lines.insert(2, '')
+    # the last line need not be terminated
+    r = post_bulk(api, '\n'.join(lines), 'application/x-ndjson')
+    assert_results(r, None, 'Expecting', 'Mitigation data must be provided', None)
+    assert_db_titles('One', 'Three')
+
+
+@pytest.mark.parametrize('body', ['{"title": "Not an array"}', '[{"title": "Malformed",'])
+def test_bulk_json_invalid(api, body):
+    r = post_bulk(api, body, 'application/json')
+    assert r.status_code == 400
+    assert r.json() == {'detail': 'The request body must be a JSON array or NDJSON.'}
+    assert_db_titles()
+
+
+@pytest.mark.parametrize('content_type', ['application/json', 'application/x-ndjson'])
+def test_bulk_too_large(api, monkeypatch, content_type):
+    monkeypatch.setattr('nccrd.api.routers.submission.BULK_MAX_BYTES', 150)
+    body = json.dumps([payload('x' * 150)]) if content_type == 'application/json' else json.dumps(payload('x' * 150))
+    r = post_bulk(api, body, content_type)
+    assert r.status_code == 413
+    assert_db_titles()
+
+    # NDJSON bodies are limited by line, not in total
+    if content_type == 'application/x-ndjson':
+        r = post_bulk(api, '\n'.join(json.dumps(payload(f'Title {i}')) for i in range(10)), content_type)
+        assert r.status_code == 200
+        assert r.json()['created'] == 10
@@ -0,0 +1,36 @@
+import csv
+import io
+import json
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from nccrd.api.lib.export import columnar_snapshots
+from test.factories import SubmissionFactory
+
+
+def export_rows(content, format):
+    if format == 'ndjson':
+        return [json.loads(line) for line in content.decode().splitlines()]
+    if format == 'csv':
+        return list(csv.DictReader(io.StringIO(content.decode())))
+    if format == 'parquet':
+        return pq.read_table(io.BytesIO(content)).to_pylist()
+    return pa.ipc.open_stream(content).read_all().to_pylist()
+
+
+@pytest.mark.parametrize('format', ['ndjson', 'csv', 'parquet', 'arrow'])
+def test_export_intervention_type(api, monkeypatch, format):
+    # columnar snapshots are labelled with a data version, which
+    # starts over when the test data is deleted
+    monkeypatch.setattr(columnar_snapshots, '_snapshots', {})
+    submissions = [
+        SubmissionFactory(intervention_measurement=intervention_measurement)
+        for intervention_measurement in ('Mitigation', 'Adaptation', 'Cross Cutting')
+    ]
+    r = api([]).get('/submission/export', params=dict(format=format))
+    assert r.status_code == 200
+    rows = export_rows(r.content, format)
+    assert [row['id'] for row in rows] == [str(s.id) for s in submissions]
+    assert [row['intervention_type'] for row in rows] == ['mitigation', 'adaptation', 'cross cutting']
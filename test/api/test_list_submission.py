@@ -0,0 +1,74 @@
+from datetime import date, datetime
+from uuid import uuid4
+
+import pytest
+
+from nccrd.api.lib.paging import decode_cursor, encode_cursor
+from test.factories import SubmissionFactory
+
+
+@pytest.fixture
+def submissions():
+    """Submissions in creation order."""
+    return [SubmissionFactory() for _ in range(5)]
+
+
+def test_cursor_round_trip():
+    values = [42, 'text', None, datetime(2024, 5, 17, 13, 30), date(2024, 5, 17), uuid4()]
+    assert decode_cursor(encode_cursor(values)) == values
+
+
+def test_list_submission(api, submissions):
+    r = api([]).get('/submission/list_submission')
+    assert r.status_code == 200
+    assert [item['id'] for item in r.json()] == [str(s.id) for s in submissions]
+
+
+def test_list_submission_paged(api, submissions):
+    client = api([])
+    ids = []
+    cursor = None
+    while True:
+        r = client.get('/submission/list_submission/paged', params=dict(size=2, cursor=cursor))
+        assert r.status_code == 200
+        page = r.json()
+        assert len(page['items']) <= 2
+        ids += [item['id'] for item in page['items']]
+        if not page['has_more']:
+            assert page['next'] is None
+            break
+        cursor = page['next']
+
+    assert ids == [str(s.id) for s in submissions]
+
+
+def test_list_submission_paged_invalid_cursor(api, submissions):
+    r = api([]).get('/submission/list_submission/paged', params=dict(cursor='not a cursor'))
+    assert r.status_code == 422
+    assert r.json() == {'detail': 'Invalid cursor'}
+
+
+@pytest.mark.parametrize('count', ['exact', 'estimate', 'none', 'window'])
+def test_list_submission_paged_count(api, submissions, count):
+    client = api([])
+    r = client.get('/submission/list_submission/paged', params=dict(size=2, count=count))
+    assert r.status_code == 200
+    first = r.json()
+    assert first['has_more'] is True
+    assert first['estimated'] is (count == 'estimate')
+    if count in ('exact', 'window'):
+        assert first['total'] == 5
+    elif count == 'estimate':
+        assert isinstance(first['total'], int)
+    else:
+        assert first['total'] is None
+
+    r = client.get('/submission/list_submission/paged', params=dict(size=2, count=count, cursor=first['next']))
+    assert r.status_code == 200
+    second = r.json()
+    assert [item['id'] for item in second['items']] == [str(s.id) for s in submissions[2:4]]
+    if count == 'exact':
+        assert second['total'] == 5
+    elif count in ('none', 'window'):
+        # a window count only covers the rows following the cursor
+        assert second['total'] is None
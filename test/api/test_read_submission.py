@@ -0,0 +1,52 @@
+import pytest
+
+from nccrd.const import NCCRDScope
+from test.api import assert_forbidden
+from test.factories import FactorySession, SubmissionFactory
+
+
+@pytest.mark.require_scope(NCCRDScope.PROJECT_READ)
+def test_read_submission_etag(api, scopes):
+    submission = SubmissionFactory()
+    authorized = NCCRDScope.PROJECT_READ in scopes
+    client = api(scopes)
+    url = f'/submission/read_submission/{submission.id}'
+
+    r = client.get(url)
+    if not authorized:
+        assert_forbidden(r)
+        return
+
+    assert r.status_code == 200
+    assert r.json()['id'] == str(submission.id)
+    etag = r.headers['ETag']
+    assert etag == f'"{submission.version}"'
+
+    for if_none_match in (etag, f'W/{etag}', f'"0", {etag}', '*'):
+        r = client.get(url, headers={'If-None-Match': if_none_match})
+        assert r.status_code == 304
+        assert r.headers['ETag'] == etag
+        assert not r.content
+
+    r = client.get(url, headers={'If-None-Match': '"0"'})
+    assert r.status_code == 200
+    assert r.headers['ETag'] == etag
+
+    submission.title = 'Updated title'
+    FactorySession.commit()
+
+    r = client.get(url, headers={'If-None-Match': etag})
+    assert r.status_code == 200
+    assert r.json()['title'] == 'Updated title'
+    assert r.headers['ETag'] == f'"{submission.version}"' != etag
+
+
+@pytest.mark.require_scope(NCCRDScope.PROJECT_READ)
+def test_read_submission_not_found(api, scopes):
+    SubmissionFactory()
+    authorized = NCCRDScope.PROJECT_READ in scopes
+    r = api(scopes).get('/submission/read_submission/00000000-0000-0000-0000-000000000000')
+    if authorized:
+        assert r.status_code == 404
+    else:
+        assert_forbidden(r)
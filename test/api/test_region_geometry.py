@@ -0,0 +1,41 @@
+import json
+
+import pytest
+
+from nccrd.api.lib.geometry import SIMPLIFY_TOLERANCES, RegionLayer, build_geojson_levels, simplified_geojson
+from nccrd.db.region_cache import RegionCache
+
+
+def test_geojson_levels_built_on_load(region_data, monkeypatch):
+    cache = RegionCache()
+    cache.on_load(build_geojson_levels)
+    monkeypatch.setattr(cache, '_read', lambda db: region_data)
+    cache.load()
+    assert {key for key in region_data._derived if key.startswith('geojson:')} == {
+        f'geojson:{layer.value}:{level}' for layer in RegionLayer for level in SIMPLIFY_TOLERANCES
+    }
+
+    # requests are served the prebuilt levels, without building them
+    def builder(layer, level):
+        def build(data):
+            assert False, 'GeoJSON built on request'
+        return build
+
+    monkeypatch.setattr('nccrd.api.lib.geometry.region_cache', cache)
+    monkeypatch.setattr('nccrd.api.lib.geometry._geojson_builder', builder)
+    for layer in RegionLayer:
+        geojson = json.loads(simplified_geojson(layer, 0.001))
+        assert geojson['type'] == 'FeatureCollection'
+        assert geojson['features']
+
+
+@pytest.mark.parametrize('layer, names', [
+    ('district', ['West', 'East']),
+    ('local_district', ['West Local', 'East Local']),
+    ('country', ['South Africa']),
+])
+def test_get_region_geometry(api, regions, layer, names):
+    r = api([]).get(f'/region/geometry/{layer}', params=dict(zoom=6))
+    assert r.status_code == 200
+    assert r.headers['ETag'] == f'"{regions.fingerprint}"'
+    assert [feature['properties']['name'] for feature in r.json()['features']] == names
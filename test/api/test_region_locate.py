@@ -0,0 +1,25 @@
+import pytest
+
+from nccrd.api.lib.geocoding import build_spatial_indexes
+
+WEST = {'province': 'KwaZulu-Natal', 'district': 'West', 'local_district': 'West Local'}
+EAST = {'province': 'KwaZulu-Natal', 'district': 'East', 'local_district': 'East Local'}
+NOWHERE = {'province': None, 'district': None, 'local_district': None}
+
+
+def test_spatial_indexes_built_on_load(region_data):
+    build_spatial_indexes(region_data)
+    assert {'index:district', 'index:local_district'} <= region_data._derived.keys()
+
+
+@pytest.mark.parametrize('lon, lat, location', [
+    (30.5, -27.5, WEST),
+    (31.5, -27.5, EAST),
+    (20.0, -20.0, NOWHERE),
+])
+def test_locate_point(api, regions, lon, lat, location):
+    r = api([]).get('/region/locate', params=dict(lon=lon, lat=lat))
+    assert r.status_code == 200
+    assert {
+        kind: region and region['name'] for kind, region in r.json().items()
+    } == location
@@ -0,0 +1,77 @@
+import math
+import os
+
+import mapbox_vector_tile
+import pytest
+
+import nccrd.api.lib.tiles
+from nccrd.api.lib.geometry import RegionLayer
+from nccrd.api.lib.tiles import TileCache, render_tile
+
+
+def tile_for(lon, lat, z):
+    """Return the XYZ tile x, y containing a point."""
+    n = 2 ** z
+    lat = math.radians(lat)
+    return int((lon + 180) / 360 * n), int((1 - math.asinh(math.tan(lat)) / math.pi) / 2 * n)
+
+
+def feature_names(content, layer):
+    features = mapbox_vector_tile.decode(content).get(layer, {}).get('features', [])
+    return sorted(feature['properties']['name'] for feature in features)
+
+
+@pytest.mark.parametrize('layer, names', [
+    (RegionLayer.DISTRICT, ['East', 'West']),
+    (RegionLayer.LOCAL_DISTRICT, ['East Local', 'West Local']),
+    (RegionLayer.COUNTRY, ['South Africa']),
+])
+def test_render_tile(region_data, layer, names):
+    x, y = tile_for(31, -27.5, 6)
+    assert feature_names(render_tile(layer, 6, x, y, region_data), layer.value) == names
+    assert feature_names(render_tile(layer, 6, 0, 0, region_data), layer.value) == []
+
+
+def test_get_region_tile(api, regions, tmp_path, monkeypatch):
+    monkeypatch.setattr(nccrd.api.lib.tiles, 'tile_cache', TileCache(str(tmp_path), 1024 * 1024))
+    x, y = tile_for(30.5, -27.5, 8)
+    url = f'/region/tiles/district/8/{x}/{y}.mvt'
+    client = api([])
+
+    r = client.get(url)
+    assert r.status_code == 200
+    assert r.headers['ETag'] == f'"{regions.fingerprint}"'
+    assert feature_names(r.content, 'district') == ['West']
+    with open(tmp_path / regions.fingerprint / 'district' / '8' / str(x) / f'{y}.mvt', 'rb') as f:
+        assert f.read() == r.content
+
+    def render_tile(*args):
+        assert False, 'Cached tile rendered'
+
+    monkeypatch.setattr(nccrd.api.lib.tiles, 'render_tile', render_tile)
+    assert client.get(url).content == r.content
+
+    r = client.get('/region/tiles/district/2/4/0.mvt')
+    assert r.status_code == 404
+
+
+def test_tile_cache_eviction(tmp_path):
+    # cache size is checked after every 100 bytes written
+    cache = TileCache(str(tmp_path), 1600)
+    content = b'x' * 200
+
+    def put(i):
+        cache.put('fingerprint', f'{i}.mvt', content)
+
+    for i in range(8):
+        put(i)
+        os.utime(tmp_path / 'fingerprint' / f'{i}.mvt', (i, i))
+
+    # a tile that is read is the most recently used
+    assert cache.get('fingerprint', '0.mvt') == content
+    # exceeds the cache size, evicting the least recently used tiles down to 90%
+    put(8)
+    put(9)
+
+    assert sorted(os.listdir(tmp_path / 'fingerprint')) == sorted(f'{i}.mvt' for i in (0, 3, 4, 5, 6, 7, 8, 9))
+    assert cache.get('fingerprint', '1.mvt') is None
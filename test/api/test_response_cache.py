@@ -0,0 +1,101 @@
+from datetime import datetime
+from uuid import uuid4
+
+from sqlalchemy import insert
+
+from nccrd.api.lib.response_cache import ANY_SUBMISSION, ResponseCache, response_cache
+from nccrd.db.models import Submission
+from nccrd.db.versions import SUBMISSIONS, bump_data_version
+from test import TestSession
+from test.factories import FactorySession, SubmissionFactory
+
+
+def cache_put(cache, key, content, tags=()):
+    _, generation = cache.get(key)
+    cache.put(key, content, tags, generation)
+
+
+def test_hits_and_misses():
+    cache = ResponseCache(1000)
+    assert cache.get('a') == (None, 0)
+    cache_put(cache, 'a', b'content')
+    assert cache.get('a') == (b'content', 0)
+    assert cache.get('b') == (None, 0)
+    assert cache.stats() == dict(
+        entries=1, bytes=7, max_bytes=1000,
+        hits=1, misses=3, hit_ratio=0.25,
+        evictions=0, invalidations=0,
+    )
+
+
+def test_tag_invalidation():
+    cache = ResponseCache(1000)
+    id1, id2 = uuid4(), uuid4()
+    cache_put(cache, 'one', b'1', {id1})
+    cache_put(cache, 'two', b'2', {id2})
+    cache_put(cache, 'list', b'12', {ANY_SUBMISSION})
+
+    cache.invalidate({id1})
+    assert cache.get('one')[0] is None
+    assert cache.get('two')[0] == b'2'
+    # responses tagged with ANY_SUBMISSION are discarded on any change
+    assert cache.get('list')[0] is None
+    assert cache.stats()['invalidations'] == 2
+    assert cache.stats()['bytes'] == 1
+
+
+def test_generation():
+    cache = ResponseCache(1000)
+    id1 = uuid4()
+    content, generation = cache.get('one')
+    # a write committed while the response is being built
+    cache.invalidate({uuid4()})
+    cache.put('one', b'stale', {id1}, generation)
+    assert cache.get('one')[0] is None
+
+    content, generation = cache.get('one')
+    cache.put('one', b'fresh', {id1}, generation)
+    assert cache.get('one')[0] == b'fresh'
+
+
+def test_lru_eviction():
+    cache = ResponseCache(10)
+    cache_put(cache, 'a', b'aaaa')
+    cache_put(cache, 'b', b'bbbb')
+    # a read makes 'a' the most recently used
+    assert cache.get('a')[0] == b'aaaa'
+    cache_put(cache, 'c', b'cccc')
+    assert cache.get('b')[0] is None
+    assert cache.get('a')[0] == b'aaaa'
+    assert cache.get('c')[0] == b'cccc'
+    # a response larger than the cache is not cached
+    cache_put(cache, 'd', b'd' * 11)
+    assert cache.get('d')[0] is None
+    assert cache.stats()['evictions'] == 1
+    assert cache.stats()['bytes'] == 8
+
+
+def test_invalidated_on_commit():
+    submission = SubmissionFactory()
+    cache_put(response_cache, 'read', b'submission', {submission.id})
+    cache_put(response_cache, 'other', b'other', {uuid4()})
+    submission.title = 'Updated title'
+    FactorySession.commit()
+    assert response_cache.get('read')[0] is None
+    assert response_cache.get('other')[0] == b'other'
+
+
+def test_list_keyed_on_data_version(api):
+    SubmissionFactory()
+    client = api([])
+    assert len(client.get('/submission/list_submission').json()) == 1
+
+    # a submission created through another API process: this process's
+    # cache is not invalidated, but the submissions data version changes
+    TestSession.execute(insert(Submission).values(
+        id=uuid4(), title='Elsewhere', createdate=datetime.utcnow(),
+    ))
+    bump_data_version(TestSession, SUBMISSIONS)
+    TestSession.commit()
+
+    assert len(client.get('/submission/list_submission').json()) == 2
@@ -0,0 +1,61 @@
+import pytest
+from sqlalchemy import select
+
+from nccrd.db.models import Submission
+from test import TestSession
+from test.factories import SubmissionFactory
+
+
+@pytest.fixture
+def submission():
+    return SubmissionFactory(intervention_measurement='Mitigation', title='Original title')
+
+
+def assert_db_state(submission, title, version):
+    result = TestSession.execute(
+        select(Submission.title, Submission.version).where(Submission.id == submission.id)
+    ).one()
+    assert (result.title, result.version) == (title, version)
+
+
+def test_update_submission_requires_version(api, submission):
+    r = api([]).patch(f'/submission/update_new_submission/{submission.id}', json=dict(title='New title'))
+    assert r.status_code == 428
+    assert_db_state(submission, 'Original title', 1)
+
+
+@pytest.mark.parametrize('precondition', ['if_match', 'version'])
+def test_update_submission_stale(api, submission, precondition):
+    stale = submission.version - 1
+    r = api([]).patch(
+        f'/submission/update_new_submission/{submission.id}',
+        json=dict(title='New title', **({'version': stale} if precondition == 'version' else {})),
+        headers={'If-Match': f'"{stale}"'} if precondition == 'if_match' else {},
+    )
+    assert r.status_code == 412
+    assert r.json() == {'detail': 'The submission has been modified by another request.'}
+    assert_db_state(submission, 'Original title', 1)
+
+
+@pytest.mark.parametrize('precondition', ['if_match', 'version'])
+def test_update_submission(api, submission, precondition):
+    version = submission.version
+    r = api([]).patch(
+        f'/submission/update_new_submission/{submission.id}',
+        json=dict(title='New title', **({'version': version} if precondition == 'version' else {})),
+        headers={'If-Match': f'"{version}"'} if precondition == 'if_match' else {},
+    )
+    assert r.status_code == 200
+    assert r.json()['title'] == 'New title'
+    assert r.json()['version'] == version + 1
+    assert r.headers['ETag'] == f'"{version + 1}"'
+    assert_db_state(submission, 'New title', version + 1)
+
+
+def test_update_submission_not_found(api, submission):
+    r = api([]).patch(
+        '/submission/update_new_submission/00000000-0000-0000-0000-000000000000',
+        json=dict(title='New title'),
+        headers={'If-Match': '"1"'},
+    )
+    assert r.status_code == 404
@@ -0,0 +1,133 @@
+import io
+import zipfile
+
+import pytest
+from openpyxl import Workbook
+from sqlalchemy import func, select
+
+import nccrd.api.lib.workbook
+from nccrd.db.models import Mitigation, Submission
+from test import TestSession
+
+XLSX = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+
+def workbook_bytes(title, mitigation_sector='Energy'):
+    wb = Workbook()
+    wb.remove(wb.active)
+    general = wb.create_sheet('General project details')
+    general.append(('Title', title))
+    general.append(('Indicate the type of measure', 'Mitigation intervention'))
+    mitigation = wb.create_sheet('Mitigation details')
+    mitigation.append(('Mitigation sector', mitigation_sector))
+    f = io.BytesIO()
+    wb.save(f)
+    return f.getvalue()
+
+
+def zip_bytes(members):
+    f = io.BytesIO()
+    with zipfile.ZipFile(f, 'w') as archive:
+        for name, content in members.items():
+            archive.writestr(name, content)
+    return f.getvalue()
+
+
+def upload(api, *files):
+    return api([]).post('/submission/upload_batch', files=[('files', file) for file in files])
+
+
+def assert_db_titles(*titles):
+    assert sorted(TestSession.execute(select(Submission.title)).scalars()) == sorted(titles)
+    assert TestSession.execute(select(func.count()).select_from(Mitigation)).scalar_one() == len(titles)
+
+
+def test_upload_batch(api):
+    r = upload(
+        api,
+        ('good.xlsx', workbook_bytes('Good'), XLSX),
+        ('bad.xlsx', workbook_bytes('Bad', mitigation_sector=None), XLSX),
+        ('notes.txt', b'not a workbook', 'text/plain'),
+        ('corrupt.xlsx', b'not a workbook', XLSX),
+        ('archive.zip', zip_bytes({
+            'a/one.xlsx': workbook_bytes('One'),
+            'a/~$one.xlsx': b'lock file',
+            'readme.txt': b'skipped',
+            'two.xlsx': workbook_bytes('Two'),
+        }), 'application/zip'),
+    )
+    assert r.status_code == 200
+    result = r.json()
+    assert (result['created'], result['failed']) == (3, 3)
+
+    results = result['results']
+    assert [r['file'] for r in results] == [
+        'good.xlsx', 'bad.xlsx', 'notes.txt', 'corrupt.xlsx', 'a/one.xlsx', 'two.xlsx'
+    ]
+    assert [r['index'] for r in results] == list(range(6))
+    for r in results[:1] + results[4:]:
+        assert 'submission_id' in r and 'error' not in r
+        assert r['upload'].keys() == {'parse_seconds', 'peak_memory_bytes'}
+    assert 'Mitigation sector is required.' in results[1]['error']
+    assert results[2]['error'] == 'Not a workbook (.xlsx / .xlsm) or zip archive.'
+    assert results[3]['error'].startswith('Could not read the workbook')
+
+    assert_db_titles('Good', 'One', 'Two')
+
+
+def test_upload_batch_bad_zip(api):
+    r = upload(
+        api,
+        ('broken.zip', b'not a zip archive', 'application/zip'),
+        ('good.xlsx', workbook_bytes('Good'), XLSX),
+    )
+    assert r.status_code == 200
+    result = r.json()
+    assert (result['created'], result['failed']) == (1, 1)
+    assert result['results'][0]['file'] == 'broken.zip'
+    assert result['results'][0]['error'].startswith('Invalid zip archive')
+    assert_db_titles('Good')
+
+
+def test_upload_batch_too_large(api, monkeypatch):
+    content = workbook_bytes('Good')
+    monkeypatch.setattr(nccrd.api.lib.workbook, 'BATCH_MAX_BYTES', len(content) * 3 // 2)
+    r = upload(
+        api,
+        ('one.xlsx', content, XLSX),
+        ('two.xlsx', content, XLSX),
+    )
+    assert r.status_code == 413
+    assert r.json() == {'detail': f'The batch exceeds the maximum size of {len(content) * 3 // 2} bytes.'}
+    assert_db_titles()
+
+
+def test_upload_batch_zip_too_large(api, monkeypatch):
+    content = workbook_bytes('Good')
+    archive = zip_bytes({'one.xlsx': content, 'two.xlsx': content})
+    # the archive fits, but its extracted workbooks do not
+    monkeypatch.setattr(nccrd.api.lib.workbook, 'BATCH_MAX_BYTES', len(archive) + len(content))
+    r = upload(api, ('archive.zip', archive, 'application/zip'))
+    assert r.status_code == 200
+    result = r.json()
+    assert (result['created'], result['failed']) == (0, 1)
+    assert result['results'][0]['error'].startswith('The archive holds more than')
+    assert_db_titles()
+
+
+@pytest.mark.parametrize('zipped', [False, True])
+def test_upload_batch_too_many_files(api, monkeypatch, zipped):
+    monkeypatch.setattr(nccrd.api.lib.workbook, 'BATCH_MAX_FILES', 2)
+    content = workbook_bytes('Good')
+    if zipped:
+        files = [('archive.zip', zip_bytes({f'{i}.xlsx': content for i in range(3)}), 'application/zip')]
+    else:
+        files = [(f'{i}.xlsx', content, XLSX) for i in range(3)]
+    r = upload(api, *files)
+    if zipped:
+        assert r.status_code == 200
+        assert r.json()['results'][0]['error'] == 'The archive holds more than 2 workbooks.'
+    else:
+        assert r.status_code == 400
+        assert r.json() == {'detail': 'A batch may hold at most 2 workbooks.'}
+    assert_db_titles()
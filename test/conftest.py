@@ -7,7 +7,7 @@ import migrate.systemdata
 import nccrd.db
 from nccrd.config import nccrd_config
 from test import TestSession
-from test.factories import FactorySession
+from test.factories import AdaptationFactory, FactorySession, MitigationFactory, SubmissionFactory
 
 
 @pytest.fixture(scope='session', autouse=True)
@@ -46,3 +46,46 @@ def delete_all_data():
                 conn.execute(text(f'ALTER TABLE {table} DISABLE TRIGGER ALL'))
                 conn.execute(text(f'DELETE FROM {table}'))
                 conn.execute(text(f'ALTER TABLE {table} ENABLE TRIGGER ALL'))
+
+
+@pytest.fixture(params=['insert', 'update', 'delete'])
+def submission_changes(request):
+    """Fixture that makes a series of changes to submissions and their
+    mitigation and adaptation records, up to and including the parameterized
+    step, and returns the name of that step. For testing the summary tables
+    that are maintained on every change.
+
+    - insert: creates three submissions, of each intervention type
+    - update: changes the intervention type, status and funding amount
+      of one submission, and the sector of a mitigation record
+    - delete: deletes a submission, and an adaptation record
+    """
+    s1 = SubmissionFactory(
+        intervention_measurement='Mitigation', implementation_status='Planned', funding_type='Grant',
+        funding_organization='DFFE', funding_amount=1000.0,
+    )
+    mitigation = MitigationFactory(submission_id=s1.id, sector='Energy')
+    s2 = SubmissionFactory(
+        intervention_measurement='Adaptation', implementation_status='Planned', funding_type='Loan',
+        funding_organization='DFFE', funding_amount=None,
+    )
+    adaptation = AdaptationFactory(submission_id=s2.id, sector='Water')
+    SubmissionFactory(
+        intervention_measurement='Cross Cutting', implementation_status='Completed', funding_type='Grant',
+        funding_organization='GCF', funding_amount=500.0,
+    )
+    if request.param == 'insert':
+        return request.param
+
+    s2.intervention_measurement = 'Mitigation'
+    s2.implementation_status = 'Completed'
+    s2.funding_amount = 250.0
+    mitigation.sector = 'Transport'
+    FactorySession.commit()
+    if request.param == 'update':
+        return request.param
+
+    s1.deleted = True
+    FactorySession.delete(adaptation)
+    FactorySession.commit()
+    return request.param
@@ -1,3 +1,4 @@
+from datetime import datetime
 from random import randint, choice
 
 import factory
@@ -6,6 +7,7 @@ from faker import Faker
 from sqlalchemy.orm import scoped_session, sessionmaker
 
 import nccrd.db
+from nccrd.db.models import Adaptaion, Mitigation, Submission
 
 FactorySession = scoped_session(sessionmaker(
     bind=nccrd.db.engine,
@@ -21,3 +23,40 @@ class NCCRDModelFactory(SQLAlchemyModelFactory):
     class Meta:
         sqlalchemy_session = FactorySession
         sqlalchemy_session_persistence = 'commit'
+
+
+class SubmissionFactory(NCCRDModelFactory):
+    class Meta:
+        model = Submission
+
+    title = factory.Faker('sentence')
+    intervention_measurement = factory.LazyFunction(lambda: choice(('Mitigation', 'Adaptation', 'Cross Cutting')))
+    description = factory.Faker('paragraph')
+    implementation_status = factory.LazyFunction(lambda: choice(('Planned', 'Underway', 'Completed')))
+    funding_organization = factory.Faker('company')
+    funding_type = factory.LazyFunction(lambda: choice(('Grant', 'Loan', 'Equity')))
+    funding_amount = factory.LazyFunction(lambda: float(randint(1000, 1000000)))
+    start_date = factory.Faker('date_time_between', start_date='-10y', end_date='now')
+    project_manager_name = factory.Faker('name')
+    project_manager_email = factory.Faker('email')
+    submission_status = 'Pending'
+    issubmitted = True
+    deleted = False
+    createdby = 1
+    createdate = factory.LazyFunction(datetime.utcnow)
+
+
+class MitigationFactory(NCCRDModelFactory):
+    class Meta:
+        model = Mitigation
+
+    sector = factory.LazyFunction(lambda: choice(('Energy', 'Transport', 'Waste')))
+    subsector = factory.Faker('word')
+
+
+class AdaptationFactory(NCCRDModelFactory):
+    class Meta:
+        model = Adaptaion
+
+    sector = factory.LazyFunction(lambda: choice(('Water', 'Agriculture', 'Health')))
+    hazard = factory.Faker('word')
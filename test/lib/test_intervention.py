@@ -0,0 +1,36 @@
+import pytest
+
+from nccrd.db.models import Submission
+from nccrd.lib.intervention import InterventionType
+
+
+@pytest.mark.parametrize('intervention_measurement, intervention_type', [
+    ('Mitigation', InterventionType.MITIGATION),
+    ('adaptation', InterventionType.ADAPTATION),
+    ('  Cross Cutting ', InterventionType.CROSS_CUTTING),
+    ('CROSS CUTTING', InterventionType.CROSS_CUTTING),
+    ('Cross-cutting', None),
+    ('Mitigation intervention', None),
+    ('', None),
+    (None, None),
+    (42, None),
+])
+def test_parse(intervention_measurement, intervention_type):
+    assert InterventionType.parse(intervention_measurement) is intervention_type
+
+
+@pytest.mark.parametrize('intervention_type, has_mitigation, has_adaptation', [
+    (InterventionType.MITIGATION, True, False),
+    (InterventionType.ADAPTATION, False, True),
+    (InterventionType.CROSS_CUTTING, True, True),
+])
+def test_details(intervention_type, has_mitigation, has_adaptation):
+    assert intervention_type.has_mitigation is has_mitigation
+    assert intervention_type.has_adaptation is has_adaptation
+
+
+def test_submission_intervention_type():
+    submission = Submission(intervention_measurement='Adaptation')
+    assert submission.intervention_type is InterventionType.ADAPTATION
+    submission.intervention_measurement = 'unknown'
+    assert submission.intervention_type is None
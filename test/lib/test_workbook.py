@@ -0,0 +1,148 @@
+import pytest
+from openpyxl import Workbook
+
+from nccrd.lib.templates import DEFAULT_GEO_LOCATION, NCCRD_TEMPLATE, PROJECT_DETAILS, get_template
+from nccrd.lib.workbook import WorkbookError, _sheet_values, parse_workbook, parse_workbook_measured
+
+GENERAL_ROWS = [
+    ('General project details',),
+    ('Title', 'Mpu Barbeton'),
+    ('Indicate the type of measure', 'Mitigation intervention'),
+    ('Description', None, 'Solar water heaters'),
+    ('Actual budget', '1500.5'),
+    ('Unmapped label', 'ignored'),
+    ('Name', 'Jane Doe'),
+    (None, 'no label'),
+]
+
+MITIGATION_ROWS = [
+    ('Mitigation sector', 'Energy'),
+    ('Are carbon credits issued?', 'Yes'),
+]
+
+ADAPTATION_ROWS = [
+    ('Adaptation sector', 'Water'),
+]
+
+
+@pytest.fixture
+def write_workbook(tmp_path):
+    def write(**sheets):
+        wb = Workbook()
+        wb.remove(wb.active)
+        for sheet, rows in sheets.items():
+            ws = wb.create_sheet(sheet)
+            for row in rows:
+                ws.append(row)
+        path = str(tmp_path / 'workbook.xlsx')
+        wb.save(path)
+        return path
+
+    return write
+
+
+def test_project_details(write_workbook):
+    path = write_workbook(**{'General project details': GENERAL_ROWS})
+    assert parse_workbook(path, PROJECT_DETAILS, None) == dict(
+        title='Mpu Barbeton',
+        intervention_measurement='Mitigation intervention',
+        description='Solar water heaters',
+        funding_amount=1500.5,
+        project_manager_name='Jane Doe',
+        geo_location=DEFAULT_GEO_LOCATION,
+    )
+
+
+def test_repeated_label(write_workbook):
+    # the last value of a repeated label is used, and a row without a value is skipped
+    path = write_workbook(**{'General project details': GENERAL_ROWS + [
+        ('Name', 'John Doe'),
+        ('Name', None),
+    ]})
+    assert parse_workbook(path, PROJECT_DETAILS, None)['project_manager_name'] == 'John Doe'
+
+
+class Worksheet:
+    """A worksheet stub that fails if a row past `last_row` is read."""
+
+    def __init__(self, rows, last_row=None):
+        self.rows = rows
+        self.last_row = len(rows) - 1 if last_row is None else last_row
+
+    def iter_rows(self, values_only):
+        for i, row in enumerate(self.rows):
+            assert i <= self.last_row, f'Row {i} was read'
+            yield row
+
+
+def test_unique_labels_early_stop():
+    sheet = next(sheet for sheet in get_template(NCCRD_TEMPLATE).sheets if sheet.details == 'mitigation')
+    assert sheet.unique_labels
+    rows = [('Mitigation details',), ('Mitigation sector', 'Energy')] + [
+        (label, 'Yes') for label in sheet.fields if label != 'Mitigation sector'
+    ]
+    trailing = [('Mitigation sector', 'Transport'), ('Notes', 'trailing')]
+    values = _sheet_values(Worksheet(rows + trailing, last_row=len(rows) - 1), sheet)
+    assert values['sector'] == 'Energy'
+    assert values['carbon_credit'] is True
+
+
+def test_repeated_labels_read_to_end():
+    sheet = get_template(NCCRD_TEMPLATE).sheets[0]
+    assert not sheet.unique_labels
+    rows = [(label, 'Value') for label in sheet.fields if not sheet.fields[label].convert] + [
+        ('Title', 'Last title'),
+        ('Notes', 'trailing'),
+    ]
+    assert _sheet_values(Worksheet(rows), sheet)['title'] == 'Last title'
+
+
+@pytest.mark.parametrize('measure, details', [
+    ('Mitigation intervention', {'mitigation'}),
+    ('Adaptation intervention', {'adaptation'}),
+    ('Cross cutting intervention', {'mitigation', 'adaptation'}),
+    ('Something else', set()),
+])
+def test_nccrd_template(write_workbook, measure, details):
+    path = write_workbook(**{
+        'General project details': [
+            row for row in GENERAL_ROWS if row[0] != 'Indicate the type of measure'
+        ] + [('Indicate the type of measure', measure)],
+        'Adaptation details': ADAPTATION_ROWS,
+        'Mitigation details': MITIGATION_ROWS,
+    })
+    submission_data = parse_workbook(path, NCCRD_TEMPLATE, None)
+    assert {key.removesuffix('_data') for key in submission_data if key.endswith('_data')} == details
+    if 'mitigation' in details:
+        assert submission_data['mitigation_data'] == dict(sector='Energy', carbon_credit=True)
+    if 'adaptation' in details:
+        assert submission_data['adaptation_data'] == dict(sector='Water')
+
+
+def test_required_field(write_workbook):
+    path = write_workbook(**{
+        'General project details': GENERAL_ROWS,
+        'Mitigation details': [('Mitigation sector', None), ('Subsector', 'Solar')],
+    })
+    with pytest.raises(WorkbookError, match='Mitigation sector is required.'):
+        parse_workbook(path, NCCRD_TEMPLATE, None)
+
+
+def test_missing_sheet(write_workbook):
+    path = write_workbook(**{'General project details': GENERAL_ROWS})
+    with pytest.raises(WorkbookError, match="The workbook has no 'Mitigation details' sheet."):
+        parse_workbook(path, NCCRD_TEMPLATE, None)
+
+
+def test_parse_workbook_measured(write_workbook):
+    path = write_workbook(**{'General project details': GENERAL_ROWS})
+    submission_data, stats = parse_workbook_measured(path, PROJECT_DETAILS, None)
+    assert submission_data['title'] == 'Mpu Barbeton'
+    assert stats.keys() == {'parse_seconds', 'peak_memory_bytes'}
+
+
+def test_unknown_template():
+    with pytest.raises(KeyError):
+        get_template('unknown')
+    with pytest.raises(KeyError):
+        get_template(NCCRD_TEMPLATE, 0)
@@ -0,0 +1,25 @@
+import pytest
+
+import nccrd.db
+from nccrd.db import PoolSettings
+
+
+@pytest.mark.parametrize('engine', [nccrd.db.engine, nccrd.db.async_engine.sync_engine])
+def test_pool_options(engine):
+    # as set in .env.test
+    pool = engine.pool
+    assert pool.size() == 4
+    assert pool._max_overflow == 6
+    assert pool._timeout == 20
+    assert pool._recycle == 1800
+    assert pool._pre_ping is True
+    assert pool.metrics is not None
+
+
+def test_pool_settings(monkeypatch):
+    monkeypatch.setenv('NCCRD_DB_POOL_SIZE', '12')
+    monkeypatch.setenv('NCCRD_DB_POOL_PRE_PING', 'false')
+    settings = PoolSettings(_env_file=None)
+    assert settings.POOL_SIZE == 12
+    assert settings.POOL_PRE_PING is False
+    assert settings.MAX_OVERFLOW == 10
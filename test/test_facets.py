@@ -0,0 +1,49 @@
+import pytest
+
+from nccrd.db.facets import facet_counts, facet_total, rebuild_facets
+from nccrd.db.models import FacetCount, InterventionType, SubmissionFacets
+from test import TestSession, assert_summary_matches_rebuild
+
+M, A, X = InterventionType.MITIGATION, InterventionType.ADAPTATION, InterventionType.CROSS_CUTTING
+
+# expected totals and facet counts after each step of the submission_changes fixture
+EXPECTED = {
+    'insert': (3, dict(
+        intervention_type={M: 1, A: 1, X: 1},
+        implementation_status={'Planned': 2, 'Completed': 1},
+        mitigation_sector={'Energy': 1, None: 2},
+        adaptation_sector={'Water': 1, None: 2},
+    )),
+    'update': (3, dict(
+        intervention_type={M: 2, X: 1},
+        implementation_status={'Planned': 1, 'Completed': 2},
+        mitigation_sector={'Transport': 1, None: 2},
+        adaptation_sector={'Water': 1, None: 2},
+    )),
+    'delete': (2, dict(
+        intervention_type={M: 1, X: 1},
+        implementation_status={'Completed': 2},
+        mitigation_sector={None: 2},
+        adaptation_sector={None: 2},
+    )),
+}
+
+
+def counts(facet, **filters):
+    return dict(facet_counts(TestSession, filters)[facet])
+
+
+def test_facet_deltas(submission_changes):
+    total, expected_counts = EXPECTED[submission_changes]
+    assert facet_total(TestSession, {}) == total
+    for facet, expected in expected_counts.items():
+        assert counts(facet) == expected
+    assert_summary_matches_rebuild(rebuild_facets, FacetCount, SubmissionFacets, 'count')
+
+
+@pytest.mark.parametrize('submission_changes', ['insert'], indirect=True)
+def test_facet_filters(submission_changes):
+    assert facet_total(TestSession, {'intervention_type': M}) == 1
+    # a facet is counted over the filters on the other facets only
+    assert counts('implementation_status', funding_type='Grant') == {'Planned': 1, 'Completed': 1}
+    assert counts('funding_type', funding_type='Grant') == {'Grant': 2, 'Loan': 1}
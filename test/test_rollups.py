@@ -0,0 +1,83 @@
+import pytest
+
+from nccrd.db.models import FundingRollup, InterventionType, SubmissionFunding
+from nccrd.db.rollups import funding_rollup, rebuild_funding_rollups
+from test import TestSession, assert_summary_matches_rebuild
+
+M, A, X = InterventionType.MITIGATION, InterventionType.ADAPTATION, InterventionType.CROSS_CUTTING
+
+# expected (submissions, funded submissions, total, average) per group after
+# each step of the submission_changes fixture
+EXPECTED = {
+    'insert': dict(
+        intervention_type={
+            (M,): (1, 1, 1000.0, 1000.0),
+            (X,): (1, 1, 500.0, 500.0),
+            (A,): (1, 0, 0.0, None),
+        },
+        mitigation_sector={
+            ('Energy',): (1, 1, 1000.0, 1000.0),
+            (None,): (2, 1, 500.0, 500.0),
+        },
+        funding_organization={
+            ('DFFE',): (2, 1, 1000.0, 1000.0),
+            ('GCF',): (1, 1, 500.0, 500.0),
+        },
+    ),
+    'update': dict(
+        intervention_type={
+            (M,): (2, 2, 1250.0, 625.0),
+            (X,): (1, 1, 500.0, 500.0),
+        },
+        mitigation_sector={
+            ('Transport',): (1, 1, 1000.0, 1000.0),
+            (None,): (2, 2, 750.0, 375.0),
+        },
+        funding_organization={
+            ('DFFE',): (2, 2, 1250.0, 625.0),
+            ('GCF',): (1, 1, 500.0, 500.0),
+        },
+    ),
+    'delete': dict(
+        intervention_type={
+            (M,): (1, 1, 250.0, 250.0),
+            (X,): (1, 1, 500.0, 500.0),
+        },
+        mitigation_sector={
+            (None,): (2, 2, 750.0, 375.0),
+        },
+        funding_organization={
+            ('GCF',): (1, 1, 500.0, 500.0),
+            ('DFFE',): (1, 1, 250.0, 250.0),
+        },
+    ),
+}
+
+
+def rollup(*group_by, **filters):
+    return {
+        tuple(result['group'].values()): (
+            result['submissions'],
+            result['funded_submissions'],
+            result['funding_total'],
+            result['funding_average'],
+        )
+        for result in funding_rollup(TestSession, list(group_by), filters)
+    }
+
+
+def test_funding_rollup_deltas(submission_changes):
+    for dimension, expected in EXPECTED[submission_changes].items():
+        assert rollup(dimension) == expected
+    assert_summary_matches_rebuild(rebuild_funding_rollups, FundingRollup, SubmissionFunding, 'submissions')
+
+
+@pytest.mark.parametrize('submission_changes', ['insert'], indirect=True)
+def test_funding_rollup_filters(submission_changes):
+    assert rollup('mitigation_sector', funding_organization='DFFE') == {
+        ('Energy',): (1, 1, 1000.0, 1000.0),
+        (None,): (1, 0, 0.0, None),
+    }
+    assert rollup('funding_organization', intervention_type=M) == {
+        ('DFFE',): (1, 1, 1000.0, 1000.0),
+    }